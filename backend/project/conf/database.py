@@ -0,0 +1,69 @@
+"""DATABASES built from environment variables."""
+
+ENGINES = {
+    "sqlite": "django.db.backends.sqlite3",
+    "postgresql": "django.db.backends.postgresql",
+}
+
+
+def _flag(value):
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _split(value):
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+def databases_from_env(environ, base_dir):
+    """
+    Return DATABASES with a "default" primary and one alias per replica.
+
+    DB_ENGINE is "sqlite" (the default) or "postgresql". SQLite reads DB_NAME
+    as a file relative to base_dir; PostgreSQL reads DB_NAME, DB_USER,
+    DB_PASSWORD, DB_HOST and DB_PORT. DB_REPLICAS is a comma-separated list of
+    replica hosts (host or host:port) for PostgreSQL, or of database files for
+    SQLite, which lets a copy or the primary file itself stand in for a
+    replica. Replicas share every other setting with the primary and are
+    named "replica_1", "replica_2", ...
+
+    DB_CONN_MAX_AGE (seconds, default 60, "none" for unlimited) keeps
+    connections open between requests and DB_CONN_HEALTH_CHECKS (default on)
+    checks a reused connection before each request. Django's own connection
+    pool needs the psycopg 3 driver, while requirements.txt pins psycopg2, so
+    pooling is left to persistent connections or an external pooler such as
+    PgBouncer.
+    """
+    engine = environ.get("DB_ENGINE", "sqlite")
+    if engine not in ENGINES:
+        raise ValueError(f"DB_ENGINE must be one of {', '.join(ENGINES)}")
+
+    max_age = environ.get("DB_CONN_MAX_AGE", "60")
+    primary = {
+        "ENGINE": ENGINES[engine],
+        "CONN_MAX_AGE": None if max_age.lower() == "none" else int(max_age),
+        "CONN_HEALTH_CHECKS": _flag(environ.get("DB_CONN_HEALTH_CHECKS", "true")),
+    }
+    if engine == "sqlite":
+        primary["NAME"] = base_dir / environ.get("DB_NAME", "db.sqlite3")
+    else:
+        primary.update(
+            NAME=environ.get("DB_NAME", "core"),
+            USER=environ.get("DB_USER", ""),
+            PASSWORD=environ.get("DB_PASSWORD", ""),
+            HOST=environ.get("DB_HOST", ""),
+            PORT=environ.get("DB_PORT", ""),
+        )
+
+    databases = {"default": primary}
+    for i, location in enumerate(_split(environ.get("DB_REPLICAS", "")), 1):
+        replica = dict(primary)
+        if engine == "sqlite":
+            replica["NAME"] = base_dir / location
+        else:
+            host, _, port = location.partition(":")
+            replica["HOST"] = host
+            replica["PORT"] = port or primary["PORT"]
+        # Tests run against the primary's test database only.
+        replica["TEST"] = {"MIRROR": "default"}
+        databases[f"replica_{i}"] = replica
+    return databases
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .database import databases_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.RequestTimingMiddleware",
+    "core.routers.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -74,13 +79,11 @@ WSGI_APPLICATION = "conf.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# Configured from DB_* environment variables, see conf/database.py
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
-}
+DATABASES = databases_from_env(os.environ, BASE_DIR)
+
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
 
 
 # Password validation
@@ -119,7 +122,190 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Uploaded files, such as instrument files waiting to be imported
+
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", BASE_DIR / "media")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    "DEFAULT_PAGINATION_CLASS": "core.pagination.CreatedAtCursorPagination",
+    "DEFAULT_FILTER_BACKENDS": [
+        "core.filters.JSONPathFilterBackend",
+        "core.filters.UpdatedAfterFilterBackend",
+    ],
+    "PAGE_SIZE": 100,
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+# Hard upper bound for the ?page_size= query parameter
+
+MAX_PAGE_SIZE = 1000
+
+
+# Fast read path
+# Serve list endpoints from QuerySet.values() instead of the serializers
+
+FAST_READ_PATH = True
+
+
+# Schema validation
+# Maximum number of compiled jsonschema validators kept per process
+
+SCHEMA_VALIDATOR_CACHE_SIZE = 256
+
+# Django cache alias sharing MetaSchema rows between processes (None keeps the
+# cache per process) and how long shared entries live (None means forever).
+# Like RESPONSE_CACHE_ALIAS, the alias must name Redis or Memcached.
+
+METASCHEMA_CACHE_ALIAS = None
+
+METASCHEMA_CACHE_TIMEOUT = None
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# "shared" is seen by every worker process and only exists when REDIS_URL is
+# set (needs the redis package).
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+if os.environ.get("REDIS_URL"):
+    CACHES["shared"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["REDIS_URL"],
+    }
+
+
+# Response caching
+# Django cache alias holding generation counters and cached list/detail
+# responses (None disables both) and how long responses are kept in seconds.
+# Writes in one process must invalidate the responses of all, so the counters
+# need a shared cache that increments atomically; anything but Redis or
+# Memcached fails the core.E001 system check.
+
+RESPONSE_CACHE_ALIAS = "shared" if "shared" in CACHES else None
+
+RESPONSE_CACHE_TIMEOUT = 60
+
+
+# Schema migrations
+# Worker processes, rows per chunk and errors kept per run, seconds without a
+# heartbeat after which another migrate_schema worker takes a running run over,
+# and seconds an idle migrate_schema worker waits before polling the queue
+# again. Transforms that may be requested through the API are registered here
+# by name.
+
+SCHEMA_MIGRATION_WORKERS = 4
+
+SCHEMA_MIGRATION_CHUNK_SIZE = 1000
+
+SCHEMA_MIGRATION_MAX_ERRORS = 1000
+
+SCHEMA_MIGRATION_STALE_SECONDS = 300
+
+SCHEMA_MIGRATION_POLL_SECONDS = 2
+
+SCHEMA_MIGRATION_TRANSFORMS = {}
+
+
+# Instrument file imports
+# Rows per chunk and errors kept per job, seconds without a heartbeat after
+# which another worker takes a running job over, and seconds an idle worker
+# waits before polling the queue again
+
+IMPORT_CHUNK_SIZE = 1000
+
+IMPORT_MAX_ERRORS = 1000
+
+IMPORT_STALE_SECONDS = 300
+
+IMPORT_POLL_SECONDS = 2
+
+
+# Bulk ingestion
+# Rows per INSERT statement and maximum rows per bulk request
+
+BULK_CREATE_BATCH_SIZE = 500
+
+BULK_MAX_ROWS = 10000
+
+
+# Exports
+# Rows fetched per round trip by the server-side cursor of streaming exports
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+# Request instrumentation
+# Requests slower than this many seconds are logged to "core.requests" with
+# their SQL (None disables the log), listing at most this many statements
+
+SLOW_REQUEST_THRESHOLD = None
+
+SLOW_REQUEST_MAX_STATEMENTS = 100
+
+
+# Aggregation
+# Maximum number of groups returned by the results aggregate endpoint
+
+AGGREGATE_MAX_GROUPS = 10000
+
+
+# Read replicas
+# Aliases that safe ViewSet requests read from, and how many seconds a client
+# keeps reading from the primary after a write. The latter relies on a cookie,
+# so clients that do not keep cookies may not read their own writes. Cached
+# responses may outlive replication lag by up to RESPONSE_CACHE_TIMEOUT.
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+
+REPLICA_STICKY_SECONDS = 5
+
+
+# Change feed
+# Seconds a change must be old before /changes/ serves it, so writers that took
+# lower ids have committed. Must exceed the time writers stay open after
+# recording a change; PostgreSQL additionally waits for older transactions.
+# Days entries are kept before prune_changes deletes them; clients must sync
+# more often than that.
+
+CHANGE_FEED_SETTLE_SECONDS = 2
+
+CHANGE_FEED_RETENTION_DAYS = 30
+
+
+# Barcodes
+# Maximum number of barcodes resolved per request
+
+BARCODE_RESOLVE_MAX = 1000
+
+
+# Binary arrays
+# Bytes read from the memory map per streamed chunk of an array slice
+
+ARRAY_STREAM_CHUNK_SIZE = 1 << 20
+
+
+# Search
+# Upper bound on hits returned by the search endpoint
+
+SEARCH_MAX_RESULTS = 200
+
+
+# Lineage
+# Upper bound on nodes returned by a lineage graph
+
+LINEAGE_MAX_NODES = 10000
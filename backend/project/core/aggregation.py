@@ -0,0 +1,127 @@
+"""Database-side aggregates over numeric values inside Result.data."""
+
+from django.db.models import Avg, Count, F, FloatField, Func, Max, Min, StdDev, Sum
+from django.db.models.fields.json import KeyTextTransform, compile_json_path
+from django.db.models.functions import Cast
+
+from .indexes import key_transform
+
+SQLITE_STDDEV_FUNCTION = "CORE_STDDEV_SAMP"
+
+
+class SQLiteSampleStdDev:
+    """
+    Sample standard deviation aggregate for SQLite (Welford's algorithm).
+
+    Django's STDDEV_SAMP on SQLite fails for groups of one value; this one
+    returns NULL like PostgreSQL. Registered on new connections by a signal.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value):
+        if value is None:
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def finalize(self):
+        if self.count < 2:
+            return None
+        return (self.m2 / (self.count - 1)) ** 0.5
+
+
+class SampleStdDev(StdDev):
+    """Sample standard deviation, NULL for fewer than two values"""
+
+    def __init__(self, expression, **extra):
+        super().__init__(expression, sample=True, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, function=SQLITE_STDDEV_FUNCTION, **extra_context
+        )
+
+
+AGGREGATES = {
+    "count": Count,
+    "sum": Sum,
+    "avg": Avg,
+    "min": Min,
+    "max": Max,
+    "stddev": SampleStdDev,
+}
+
+DEFAULT_AGGREGATES = ("count", "avg", "min", "max")
+
+GROUP_BY = (
+    "analysis",
+    "sample",
+    "sample__batch",
+    "sample__batch__projects",
+    "schema",
+)
+
+
+class JSONNumber(Func):
+    """
+    The number at a path inside a JSON column, or NULL where the value there
+    is missing or not a number (strings are not cast to 0).
+    """
+
+    output_field = FloatField()
+
+    def __init__(self, field, keys):
+        super().__init__(F(field))
+        self.keys = list(keys)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        text = KeyTextTransform(
+            self.keys[-1], key_transform(self.source_expressions[0], self.keys[:-1])
+        )
+        return compiler.compile(Cast(text, FloatField()))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        column, params = compiler.compile(self.source_expressions[0])
+        path = compile_json_path(self.keys)
+        return (
+            f"CASE WHEN JSON_TYPE({column}, %s) IN ('integer', 'real') "
+            f"THEN JSON_EXTRACT({column}, %s) END",
+            (*params, path, *params, path),
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        column, params = compiler.compile(self.source_expressions[0])
+        return (
+            f"CASE WHEN jsonb_typeof({column} #> %s) = 'number' "
+            f"THEN ({column} #>> %s)::double precision END",
+            (*params, self.keys, *params, self.keys),
+        )
+
+
+def aggregate_json_path(
+    queryset, field, keys, group_by=(), aggregates=DEFAULT_AGGREGATES, limit=None
+):
+    """
+    Aggregate the numbers at a JSON path of queryset per group.
+
+    Returns one dict per group holding the group_by values and the requested
+    aggregates, computed in a single GROUP BY query. Rows where the path is
+    not a number are left out of every aggregate.
+    """
+    value = JSONNumber(field, keys)
+    annotations = {name: AGGREGATES[name](value) for name in aggregates}
+    if group_by:
+        rows = (
+            queryset.order_by()
+            .values(*group_by)
+            .annotate(**annotations)
+            .order_by(*group_by)
+        )
+        return list(rows[:limit] if limit else rows)
+    return [queryset.aggregate(**annotations)]
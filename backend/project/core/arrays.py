@@ -0,0 +1,192 @@
+"""Binary arrays stored as .npy files and read through memory maps."""
+
+import ast
+import json
+import math
+import mmap
+import struct
+import sys
+from array import array
+
+from django.conf import settings
+
+MAGIC = b"\x93NUMPY"
+
+# Supported NumPy dtypes (little-endian) and their array module typecodes
+DTYPES = {
+    descr: typecode
+    for descr, typecode in (
+        ("|i1", "b"),
+        ("|u1", "B"),
+        ("<i2", "h"),
+        ("<u2", "H"),
+        ("<i4", "i"),
+        ("<u4", "I"),
+        ("<i8", "q"),
+        ("<u8", "Q"),
+        ("<f4", "f"),
+        ("<f8", "d"),
+    )
+    if array(typecode).itemsize == int(descr[2:])
+}
+
+
+def itemsize(dtype):
+    """Return the number of bytes of one element of a dtype"""
+    return int(dtype[2:])
+
+
+def npy_header(dtype, shape):
+    """Return a version 1.0 .npy header for a C-ordered array"""
+    shape_text = f"({', '.join(map(str, shape))}{',' if len(shape) == 1 else ''})"
+    header = f"{{'descr': '{dtype}', 'fortran_order': False, 'shape': {shape_text}, }}"
+    # Pad with spaces so the data starts at a multiple of 64 bytes
+    padding = -(len(MAGIC) + 4 + len(header) + 1) % 64
+    header = (header + " " * padding + "\n").encode("latin1")
+    return MAGIC + b"\x01\x00" + struct.pack("<H", len(header)) + header
+
+
+def read_header(handle):
+    """
+    Read the header of a .npy file from a binary file object.
+
+    Returns `(dtype, shape, offset)` with offset the position of the data.
+    Raises ValueError for files this store cannot memory map.
+    """
+    start = handle.read(8)
+    if len(start) < 8 or start[:6] != MAGIC:
+        raise ValueError("Not a .npy file.")
+    major = start[6]
+    if major == 1:
+        (length,), size = struct.unpack("<H", handle.read(2)), 10
+    elif major in (2, 3):
+        (length,), size = struct.unpack("<I", handle.read(4)), 12
+    else:
+        raise ValueError(f"Unsupported .npy version {major}.")
+    try:
+        header = ast.literal_eval(
+            handle.read(length).decode("utf8" if major == 3 else "latin1")
+        )
+        dtype, fortran_order, shape = (
+            header["descr"],
+            header["fortran_order"],
+            header["shape"],
+        )
+    except (SyntaxError, ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid .npy header.") from e
+
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported dtype {dtype}; expected one of {list(DTYPES)}.")
+    if fortran_order:
+        raise ValueError("Only C-ordered arrays are supported.")
+    if not shape or not all(isinstance(n, int) and n >= 0 for n in shape):
+        raise ValueError("Expected an array with at least one dimension.")
+    return dtype, list(shape), size + length
+
+
+def pack_values(values, dtype):
+    """
+    Pack nested lists of numbers into the bytes of a C-ordered array.
+
+    Returns `(data, shape)`; raises ValueError for ragged lists or values
+    that do not fit the dtype.
+    """
+    shape = []
+    level = values
+    while isinstance(level, list):
+        shape.append(len(level))
+        level = level[0] if level else None
+    if not shape:
+        raise ValueError("Expected a list of numbers.")
+
+    flat = values
+    for _ in shape[1:]:
+        if any(not isinstance(row, list) or len(row) != len(flat[0]) for row in flat):
+            raise ValueError("Rows must all have the same length.")
+        flat = [value for row in flat for value in row]
+    try:
+        packed = array(DTYPES[dtype], flat)
+    except (TypeError, OverflowError) as e:
+        raise ValueError(f"Values do not fit {dtype}: {e}") from e
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes(), shape
+
+
+def row_range(shape, start, stop, step):
+    """Resolve Python slice bounds on the first axis to `range` of rows"""
+    return range(*slice(start, stop, step).indices(shape[0]))
+
+
+def _chunks(view, offset, row_bytes, rows, chunk_size):
+    """Yield the bytes of the selected rows in chunks of about chunk_size"""
+    if rows.step == 1:
+        begin = offset + rows.start * row_bytes
+        end = offset + rows.stop * row_bytes
+        for position in range(begin, end, chunk_size):
+            yield bytes(view[position : min(position + chunk_size, end)])
+        return
+
+    per_chunk = chunk_size // row_bytes
+    for first in range(0, len(rows), per_chunk):
+        yield b"".join(
+            view[offset + row * row_bytes : offset + (row + 1) * row_bytes]
+            for row in rows[first : first + per_chunk]
+        )
+
+
+def iter_slice(stored, rows, chunk_size=None):
+    """
+    Yield the bytes of rows of a stored array, read through a memory map so
+    only the pages of the selected rows are loaded.
+    """
+    chunk_size = chunk_size or getattr(settings, "ARRAY_STREAM_CHUNK_SIZE", 1 << 20)
+    row_bytes = itemsize(stored.dtype) * math.prod(stored.shape[1:])
+    if not rows or not row_bytes:
+        return
+    # Whole rows per chunk, so every chunk decodes on its own
+    chunk_size = max(row_bytes, chunk_size - chunk_size % row_bytes)
+    with open(stored.file.path, "rb") as handle:
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                yield from _chunks(view, stored.offset, row_bytes, rows, chunk_size)
+
+
+def stream_npy(stored, rows):
+    """Stream selected rows as a .npy file"""
+    yield npy_header(stored.dtype, [len(rows), *stored.shape[1:]])
+    yield from iter_slice(stored, rows)
+
+
+def _encode_values(chunk, dtype):
+    values = array(DTYPES[dtype], chunk)
+    if sys.byteorder == "big":
+        values.byteswap()
+    text = json.dumps(values.tolist())[1:-1]
+    if dtype[1] == "f":
+        # Strict JSON has no NaN or infinity
+        text = text.replace("-Infinity", "null").replace("Infinity", "null")
+        text = text.replace("NaN", "null")
+    return text
+
+
+def stream_json(stored, rows):
+    """
+    Stream selected rows as `{"dtype", "shape", "start", "stop", "step",
+    "values"}`, values flattened in C order.
+    """
+    head = {
+        "dtype": stored.dtype,
+        "shape": [len(rows), *stored.shape[1:]],
+        "start": rows.start,
+        "stop": rows.stop,
+        "step": rows.step,
+    }
+    yield json.dumps(head)[:-1].encode() + b', "values": ['
+    separator = b""
+    for chunk in iter_slice(stored, rows):
+        text = _encode_values(chunk, stored.dtype)
+        if text:
+            yield separator + text.encode()
+            separator = b", "
+    yield b"]}"
@@ -0,0 +1,42 @@
+"""Resolution of scanned barcodes to objects."""
+
+from .models import Analysis, Batch, Entity, Material, Result, Sample
+
+# Object type -> model, in the order matches are reported
+BARCODED_MODELS = {
+    "entity": Entity,
+    "material": Material,
+    "batch": Batch,
+    "sample": Sample,
+    "analysis": Analysis,
+    "result": Result,
+}
+
+
+def _may_match(model, code):
+    """Whether a code can belong to a model with a fixed barcode prefix"""
+    prefix = model.barcode_prefix
+    if prefix is None:
+        return True
+    return code.startswith(prefix) and code[len(prefix) :].isdigit()
+
+
+def resolve_barcodes(codes):
+    """
+    Resolve barcodes to ``{code: [{"type": ..., "id": ...}, ...]}``.
+
+    Uses the indexed barcode column with one query per model type that can
+    hold any of the codes. Entity prefixes are free-form, so a code may match
+    more than one object.
+    """
+    codes = set(codes)
+    matches = {code: [] for code in codes}
+    for object_type, model in BARCODED_MODELS.items():
+        candidates = [code for code in codes if _may_match(model, code)]
+        if not candidates:
+            continue
+        for pk, barcode in model.objects.filter(barcode__in=candidates).values_list(
+            "pk", "barcode"
+        ):
+            matches[barcode].append({"type": object_type, "id": pk})
+    return matches
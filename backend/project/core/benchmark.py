@@ -0,0 +1,293 @@
+"""Repeatable latency, throughput and query count benchmarks of the API."""
+
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import time
+from dataclasses import dataclass
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+from django.urls import reverse
+
+from .datasets import fake_document
+from .models import Analysis, Batch, Entity, MetaSchema, Project, Result, Sample
+
+# Version of the result file layout
+FORMAT_VERSION = 1
+
+SchemaType = MetaSchema.SchemaType
+
+
+@dataclass
+class Endpoint:
+    """One request to benchmark"""
+
+    name: str
+    method: str
+    path: str
+    payload: dict = None
+    expected_status: int = 200
+
+
+def _latest_schema(schema_type):
+    return (
+        MetaSchema.objects.filter(type=schema_type).order_by("-version", "-pk").first()
+    )
+
+
+def _document(schema_type, rng):
+    schema = _latest_schema(schema_type)
+    if schema is None:
+        return None, None
+    return schema.pk, fake_document(schema.definition, rng)
+
+
+def _middle_pk(model):
+    count = model.objects.count()
+    if not count:
+        return None
+    return model.objects.order_by("pk").values_list("pk", flat=True)[count // 2]
+
+
+def create_payloads(rng):
+    """Return a valid create payload per basename, built from existing rows"""
+    project = Project.objects.order_by("pk").values_list("pk", flat=True).first()
+    entity = _middle_pk(Entity)
+    batch = _middle_pk(Batch)
+    sample = _middle_pk(Sample)
+    analysis = _middle_pk(Analysis)
+
+    payloads = {
+        "project": {"name": "Benchmark project", "description": ""},
+        "metaschema": {
+            "title": "Benchmark",
+            "type": SchemaType.RESULT,
+            "version": 32767,
+            "definition": {"type": "object"},
+        },
+    }
+    schema, metadata = _document(SchemaType.ENTITY, rng)
+    if schema and project:
+        payloads["entity"] = {
+            "schema": schema,
+            "metadata": metadata,
+            "projects": [project],
+        }
+    schema, metadata = _document(SchemaType.BATCH, rng)
+    if schema and project and entity:
+        payloads["batch"] = {
+            "schema": schema,
+            "metadata": metadata,
+            "projects": [project],
+            "preparations": [entity],
+        }
+    schema, metadata = _document(SchemaType.SAMPLE, rng)
+    if schema and batch:
+        payloads["sample"] = {"schema": schema, "batch": batch, "metadata": metadata}
+    schema, metadata = _document(SchemaType.ANALYSIS, rng)
+    if schema and project:
+        payloads["analysis"] = {
+            "schema": schema,
+            "metadata": metadata,
+            "projects": [project],
+        }
+    schema, data = _document(SchemaType.RESULT, rng)
+    if schema and sample and analysis:
+        payloads["result"] = {
+            "schema": schema,
+            "sample": sample,
+            "analysis": analysis,
+            "data": data,
+        }
+    return payloads
+
+
+BASENAMES = {
+    "project": Project,
+    "metaschema": MetaSchema,
+    "entity": Entity,
+    "batch": Batch,
+    "sample": Sample,
+    "analysis": Analysis,
+    "result": Result,
+}
+
+
+def discover_endpoints(seed=0):
+    """
+    Return the list, detail and create endpoint of every core model.
+
+    Detail requests use the middle row by primary key; create payloads are
+    generated against the latest schema of each type. Endpoints that cannot
+    be exercised with the data at hand are left out.
+    """
+    payloads = create_payloads(random.Random(seed))
+    endpoints = []
+    for basename, model in BASENAMES.items():
+        endpoints.append(
+            Endpoint(f"{basename}-list", "GET", reverse(f"{basename}-list"))
+        )
+        pk = _middle_pk(model)
+        if pk is not None:
+            endpoints.append(
+                Endpoint(
+                    f"{basename}-detail",
+                    "GET",
+                    reverse(f"{basename}-detail", args=[pk]),
+                )
+            )
+        if basename in payloads:
+            endpoints.append(
+                Endpoint(
+                    f"{basename}-create",
+                    "POST",
+                    reverse(f"{basename}-list"),
+                    payloads[basename],
+                    expected_status=201,
+                )
+            )
+    return endpoints
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+class QueryCounter:
+    """Connection execute wrapper counting queries"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _request(client, endpoint):
+    if endpoint.method == "GET":
+        return client.get(endpoint.path)
+    # Creates are rolled back so every iteration sees the same database.
+    with transaction.atomic():
+        response = client.generic(
+            endpoint.method,
+            endpoint.path,
+            json.dumps(endpoint.payload),
+            content_type="application/json",
+        )
+        transaction.set_rollback(True)
+    return response
+
+
+def measure(client, endpoint, iterations, warmup=1):
+    """Run one endpoint and return its latency, throughput and query stats"""
+    for _ in range(warmup):
+        _request(client, endpoint)
+
+    latencies = []
+    queries = []
+    errors = 0
+    size = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            response = _request(client, endpoint)
+            latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+        if response.status_code != endpoint.expected_status:
+            errors += 1
+        size = len(response.content)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "name": endpoint.name,
+        "method": endpoint.method,
+        "path": endpoint.path,
+        "iterations": iterations,
+        "errors": errors,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 3),
+            "min": round(min(latencies), 3),
+            "p50": round(percentile(latencies, 0.5), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(max(latencies), 3),
+        },
+        "throughput_rps": round(iterations / elapsed, 2),
+        "queries": {"min": min(queries), "max": max(queries)},
+        "response_bytes": size,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(client, endpoints, iterations, warmup=1, label=None, progress=None):
+    """Measure every endpoint and return a JSON-serializable report"""
+    results = []
+    for endpoint in endpoints:
+        results.append(measure(client, endpoint, iterations, warmup))
+        if progress:
+            progress(results[-1])
+    return {
+        "version": FORMAT_VERSION,
+        "label": label,
+        "commit": _commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+        },
+        "dataset": {name: model.objects.count() for name, model in BASENAMES.items()},
+        "iterations": iterations,
+        "endpoints": results,
+    }
+
+
+def compare(baseline, current, metric="p50"):
+    """
+    Pair the endpoints of two reports.
+
+    Returns one dict per endpoint present in both, with the chosen latency
+    metric before and after, its change as a fraction (0.1 is 10% slower)
+    and the query counts.
+    """
+    before = {e["name"]: e for e in baseline["endpoints"]}
+    rows = []
+    for endpoint in current["endpoints"]:
+        previous = before.get(endpoint["name"])
+        if previous is None:
+            continue
+        old = previous["latency_ms"][metric]
+        new = endpoint["latency_ms"][metric]
+        rows.append(
+            {
+                "name": endpoint["name"],
+                "before": old,
+                "after": new,
+                "change": (new - old) / old if old else 0.0,
+                "queries_before": previous["queries"]["max"],
+                "queries_after": endpoint["queries"]["max"],
+            }
+        )
+    return rows
@@ -0,0 +1,252 @@
+"""Bulk validation and insertion of serializer payloads."""
+
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+from jsonschema import ValidationError as JsonSchemaValidationError
+from rest_framework import serializers
+
+from .cache import schema_cache
+from .jsonpatch import check_error, filter_tests, patch_checks, patch_expression
+from .models import BarcodedModel, MetaSchema
+from .signals import bulk_created, bulk_updated, touch_owners
+from .validators import validate_instance
+
+
+@dataclass
+class BulkResult:
+    """Outcome of a bulk ingest"""
+
+    created: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+    valid: int = 0
+
+
+@dataclass
+class BulkPatchResult:
+    """Outcome of a bulk patch"""
+
+    patched: list = field(default_factory=list)
+    skipped: int = 0
+    failed: list = field(default_factory=list)
+
+
+def preload_related(serializer, rows):
+    """
+    Fetch every object referenced by the related fields of a serializer.
+
+    Returns a ``{model: {pk: instance}}`` mapping with one query per related
+    model, used by ``PreloadedPrimaryKeyRelatedField`` instead of one query
+    per row and field. MetaSchemas are left to the schema cache.
+    """
+    wanted = {}
+    for name, serializer_field in serializer.fields.items():
+        many = isinstance(serializer_field, serializers.ManyRelatedField)
+        related = serializer_field.child_relation if many else serializer_field
+        if serializer_field.read_only or not isinstance(
+            related, serializers.PrimaryKeyRelatedField
+        ):
+            continue
+
+        queryset = related.get_queryset()
+        if queryset.model is MetaSchema:
+            continue
+        pks = wanted.setdefault(queryset.model, (queryset, set()))[1]
+        for row in rows:
+            if not isinstance(row, dict):
+                continue
+            values = row.get(name)
+            for value in values if many and isinstance(values, list) else [values]:
+                try:
+                    pks.add(int(value))
+                except (TypeError, ValueError):
+                    pass
+
+    return {
+        model: queryset.in_bulk(pks) if pks else {}
+        for model, (queryset, pks) in wanted.items()
+    }
+
+
+def bulk_ingest(serializer_class, rows, context=None, batch_size=500, dry_run=False):
+    """
+    Validate rows with a serializer and insert the valid ones with bulk_create.
+
+    Invalid rows are reported by index and skipped. Valid rows are written in
+    batches of ``batch_size`` inside a single transaction.
+    """
+    context = dict(context or {})
+    model = serializer_class.Meta.model
+    context["preloaded"] = preload_related(serializer_class(context=context), rows)
+
+    result = BulkResult()
+    instances = []
+    many_to_many = []
+    for index, row in enumerate(rows):
+        serializer = serializer_class(data=row, context=context)
+        if not serializer.is_valid():
+            result.failed.append({"index": index, "errors": serializer.errors})
+            continue
+
+        attrs = dict(serializer.validated_data)
+        relations = {
+            f.name: attrs.pop(f.name)
+            for f in model._meta.many_to_many
+            if f.name in attrs
+        }
+        instances.append(model(**attrs))
+        many_to_many.append(relations)
+
+    result.valid = len(instances)
+    if dry_run or not instances:
+        return result
+
+    with transaction.atomic():
+        model.objects.bulk_create(instances, batch_size=batch_size)
+        if issubclass(model, BarcodedModel):
+            model.assign_barcodes(instances, batch_size=batch_size)
+        _bulk_set_many_to_many(model, instances, many_to_many, batch_size)
+        bulk_created.send(sender=model, instances=instances)
+
+    result.created = instances
+    return result
+
+
+def _bulk_set_many_to_many(model, instances, relations, batch_size):
+    """Insert the through-table rows of freshly created instances"""
+    for m2m in model._meta.many_to_many:
+        through = m2m.remote_field.through
+        source = m2m.m2m_field_name()
+        target = m2m.m2m_reverse_field_name()
+        links = [
+            through(**{f"{source}_id": instance.pk, f"{target}_id": related.pk})
+            for instance, related_map in zip(instances, relations)
+            for related in related_map.get(m2m.name, [])
+        ]
+        if links:
+            through.objects.bulk_create(
+                links, batch_size=batch_size, ignore_conflicts=True
+            )
+
+
+def bulk_assign_projects(model, pks, add=(), remove=(), batch_size=500):
+    """
+    Add and remove projects of many objects by writing the through table of
+    their `projects` relation directly.
+
+    Only links that change are written, with one query per step instead of
+    one ``.add()`` per object, and the objects whose projects changed are
+    touched once. Returns the numbers of links added and removed.
+    """
+    m2m = model._meta.get_field("projects")
+    through = m2m.remote_field.through
+    source = f"{m2m.m2m_field_name()}_id"
+    target = f"{m2m.m2m_reverse_field_name()}_id"
+    pks, add, remove = set(pks), set(add), set(remove)
+
+    with transaction.atomic():
+        changed = set()
+        removed = 0
+        if remove:
+            links = through.objects.filter(
+                **{f"{source}__in": pks, f"{target}__in": remove}
+            )
+            changed.update(links.values_list(source, flat=True))
+            removed, _ = links.delete()
+
+        created = []
+        if add:
+            existing = set(
+                through.objects.filter(
+                    **{f"{source}__in": pks, f"{target}__in": add}
+                ).values_list(source, target)
+            )
+            created = [
+                through(**{source: pk, target: project})
+                for pk in sorted(pks)
+                for project in sorted(add)
+                if (pk, project) not in existing
+            ]
+            through.objects.bulk_create(
+                created, batch_size=batch_size, ignore_conflicts=True
+            )
+            changed.update(getattr(link, source) for link in created)
+
+        if changed:
+            touch_owners(model, changed)
+    return len(created), removed
+
+
+def bulk_patch(model, pks, field, operations, batch_size=500, dry_run=False):
+    """
+    Apply JSON Patch operations to a JSONField of many rows inside the
+    database, one UPDATE per batch of pks, in a single transaction.
+
+    Rows failing a test operation are skipped. Rows a change cannot apply to,
+    such as a replace of a missing member, fail. Only the patched rows are
+    read back and revalidated against their cached schemas; if any row fails,
+    or for a dry run, the whole patch is rolled back.
+    """
+    result = BulkPatchResult()
+    expression = patch_expression(field, operations)
+    checks = patch_checks(field, operations)
+    barcoded = issubclass(model, BarcodedModel) and model.barcode_prefix is None
+    pks = sorted(pks)
+
+    with transaction.atomic():
+        instances = []
+        for start in range(0, len(pks), batch_size):
+            chunk = pks[start : start + batch_size]
+            rows = list(
+                filter_tests(model.objects.filter(pk__in=chunk), field, operations)
+                .annotate(**checks)
+                .order_by("pk")
+                .values_list("pk", *checks)
+            )
+            result.skipped += len(chunk) - len(rows)
+            matched = []
+            for pk, *codes in rows:
+                errors = [
+                    check_error(operations, alias, code)
+                    for alias, code in zip(checks, codes)
+                    if code is not None
+                ]
+                if errors:
+                    result.failed.append({"id": pk, "errors": errors})
+                else:
+                    matched.append(pk)
+            if not matched:
+                continue
+            model.objects.filter(pk__in=matched).update(
+                **{field: expression, "updated_at": timezone.now()}
+            )
+
+            columns = ["pk", "schema_id", field, "updated_at"]
+            if barcoded:
+                columns.append("barcode")
+            for row in model.objects.filter(pk__in=matched).values(*columns):
+                try:
+                    validate_instance(schema_cache.get(row["schema_id"]), row[field])
+                except JsonSchemaValidationError as e:
+                    result.failed.append({"id": row["pk"], "errors": [e.message]})
+                    continue
+                instance = model(**{key: row[key] for key in columns})
+                instances.append(instance)
+
+        if result.failed or dry_run:
+            transaction.set_rollback(True)
+            if result.failed:
+                return result
+        elif instances:
+            if barcoded:
+                changed = [
+                    instance
+                    for instance in instances
+                    if instance.compute_barcode() != instance.barcode
+                ]
+                model.assign_barcodes(changed, batch_size=batch_size)
+            bulk_updated.send(sender=model, instances=instances)
+
+    result.patched = [instance.pk for instance in instances]
+    return result
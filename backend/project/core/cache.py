@@ -0,0 +1,143 @@
+"""In-process caches for rarely changing rows."""
+
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.checks import Error, Tags, register
+
+from .models import MetaSchema
+
+
+class MetaSchemaCache:
+    """
+    Read-through cache of MetaSchema rows.
+
+    Rows are kept per process. When METASCHEMA_CACHE_ALIAS names a Django cache,
+    rows are also shared through it and every local entry is checked against a
+    shared generation counter, so an invalidation in one process reaches all.
+    """
+
+    generation_key = "core:metaschema:generation"
+
+    def __init__(self):
+        self._schemas = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def shared(self):
+        """Return the shared Django cache, if one is configured"""
+        alias = getattr(settings, "METASCHEMA_CACHE_ALIAS", None)
+        return caches[alias] if alias else None
+
+    def _generation(self, shared):
+        return shared.get_or_set(self.generation_key, 0, timeout=None) if shared else 0
+
+    def get(self, pk):
+        """Return the MetaSchema with the given pk, raising DoesNotExist if missing"""
+        shared = self.shared
+        generation = self._generation(shared)
+        entry = self._schemas.get(pk)
+        if entry is not None and entry[1] == generation:
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        key = f"core:metaschema:{generation}:{pk}"
+        schema = shared.get(key) if shared else None
+        if schema is None:
+            schema = MetaSchema.objects.get(pk=pk)
+            if shared:
+                shared.set(
+                    key, schema, getattr(settings, "METASCHEMA_CACHE_TIMEOUT", None)
+                )
+
+        with self._lock:
+            self._schemas[pk] = (schema, generation)
+        return schema
+
+    def invalidate(self, pk=None):
+        """Forget one MetaSchema, or all of them, in every process"""
+        with self._lock:
+            if pk is None:
+                self._schemas.clear()
+            else:
+                self._schemas.pop(pk, None)
+        shared = self.shared
+        if shared:
+            try:
+                shared.incr(self.generation_key)
+            except ValueError:
+                shared.set(self.generation_key, 1, timeout=None)
+
+    def stats(self):
+        """Return cache counters"""
+        return {"size": len(self._schemas), "hits": self.hits, "misses": self.misses}
+
+
+schema_cache = MetaSchemaCache()
+
+
+def _response_cache():
+    alias = getattr(settings, "RESPONSE_CACHE_ALIAS", None)
+    return caches[alias] if alias else None
+
+
+def get_generation(model):
+    """Return the generation counter of a model, bumped on every write"""
+    cache = _response_cache()
+    if cache is None:
+        return 0
+    return cache.get_or_set(f"core:generation:{model._meta.label}", 0, timeout=None)
+
+
+def bump_generation(model):
+    """Invalidate the cached responses of a model"""
+    cache = _response_cache()
+    if cache is None:
+        return
+    key = f"core:generation:{model._meta.label}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_cached_response(key):
+    """Return cached response data, or None"""
+    cache = _response_cache()
+    return cache.get(key) if cache is not None else None
+
+
+def set_cached_response(key, data):
+    """Store response data under a generation-scoped key"""
+    cache = _response_cache()
+    if cache is not None:
+        cache.set(key, data, getattr(settings, "RESPONSE_CACHE_TIMEOUT", 60))
+
+
+@register(Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    """
+    Generation counters only invalidate other processes through a shared cache,
+    and only reliably when it increments them atomically.
+    """
+    errors = []
+    for setting in ("RESPONSE_CACHE_ALIAS", "METASCHEMA_CACHE_ALIAS"):
+        alias = getattr(settings, setting, None)
+        if alias and not isinstance(caches[alias], (RedisCache, BaseMemcachedCache)):
+            errors.append(
+                Error(
+                    f"{setting} names {alias!r}, which is not a Redis or "
+                    "Memcached cache.",
+                    hint="Generation counters need a cache shared by all workers "
+                    "with an atomic incr. Point it at Redis or Memcached, or set "
+                    "it to None.",
+                    id="core.E001",
+                )
+            )
+    return errors
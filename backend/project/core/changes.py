@@ -0,0 +1,164 @@
+"""Change feed of the synced models, served in commit order."""
+
+import datetime
+
+from django.conf import settings
+from django.db import connections, models, router
+from django.db.models import Func
+from django.utils import timezone
+from rest_framework import serializers
+
+from .fastpath import read_plan
+from .models import Analysis, Batch, Change, Entity, Material, Result, Sample
+from .serializers import (
+    AnalysisSerializer,
+    BatchSerializer,
+    EntitySerializer,
+    MaterialSerializer,
+    ResultSerializer,
+    SampleSerializer,
+)
+
+# Models in the feed by name, with the serializer rendering their upserts
+FEED_MODELS = {
+    "entity": (Entity, EntitySerializer),
+    "material": (Material, MaterialSerializer),
+    "batch": (Batch, BatchSerializer),
+    "sample": (Sample, SampleSerializer),
+    "analysis": (Analysis, AnalysisSerializer),
+    "result": (Result, ResultSerializer),
+}
+
+_changed_at = serializers.DateTimeField()
+
+
+def record(model, pks, action=Change.Action.UPSERT):
+    """
+    Add changes of model rows to the feed, in the transaction writing them.
+
+    Callers run inside that transaction: saves of the feed models open one
+    around their post_save receivers, deletes and many-to-many changes run
+    their signals inside one, and bulk writes wrap theirs in atomic(). The
+    entries thus commit or roll back with the change itself. On PostgreSQL
+    they carry the writing transaction's id for the read horizon.
+    """
+    name = model._meta.model_name
+    pks = list(pks)
+    if not pks:
+        return
+    using = router.db_for_write(Change)
+    xid = None
+    if connections[using].vendor == "postgresql":
+        xid = Func(function="txid_current", output_field=models.BigIntegerField())
+    Change.objects.using(using).bulk_create(
+        [Change(model=name, object_id=pk, action=action, xid=xid) for pk in pks],
+        batch_size=1000,
+    )
+
+
+def prune_changes(before, batch_size=10000):
+    """
+    Delete feed entries recorded before a datetime, in batches, and return
+    how many were deleted
+    """
+    using = router.db_for_write(Change)
+    deleted = 0
+    while True:
+        pks = list(
+            Change.objects.using(using)
+            .filter(changed_at__lt=before)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not pks:
+            return deleted
+        deleted += Change.objects.using(using).filter(id__in=pks).delete()[0]
+
+
+def _horizon_xid(connection):
+    """Return the oldest transaction id still in flight on PostgreSQL"""
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        return cursor.fetchone()[0]
+
+
+def _settled(page, connection):
+    """
+    Return the leading changes of a page that are safe to hand out.
+
+    Ids are taken before commit, so a lower id may still commit after a
+    higher one. A change is only served once it is older than
+    CHANGE_FEED_SETTLE_SECONDS and, on PostgreSQL, once every transaction
+    that started before its own has finished.
+    """
+    settle = getattr(settings, "CHANGE_FEED_SETTLE_SECONDS", 2)
+    cutoff = timezone.now() - datetime.timedelta(seconds=settle)
+    xmin = _horizon_xid(connection)
+    for number, change in enumerate(page):
+        if change.changed_at > cutoff or (
+            xmin is not None and change.xid is not None and change.xid >= xmin
+        ):
+            return page[:number]
+    return page
+
+
+def _render(model, serializer_class, pks):
+    """Return the current representation of model rows by pk"""
+    queryset = model.objects.filter(pk__in=pks)
+    plan = read_plan(serializer_class)
+    if plan is not None:
+        rows = list(plan.values(queryset))
+        return dict(zip((row[plan.pk] for row in rows), plan.render(rows), strict=True))
+    return {item["id"]: item for item in serializer_class(queryset, many=True).data}
+
+
+def read_changes(since, limit, models=None):
+    """
+    Return `(changes, cursor, has_more)` for up to limit feed entries after
+    the cursor since.
+
+    Entries are served in id order up to the settle horizon, so a cursor
+    never moves past a change that commits later. has_more is false once
+    the horizon is reached; poll again for newer changes.
+
+    Entries older than CHANGE_FEED_RETENTION_DAYS are pruned, so a cursor
+    left unused for longer may skip changes; such clients sync in full again.
+
+    Only the last change of each object within the page is returned. Upserts
+    carry the object as the list endpoints render it; upserts of objects
+    deleted since are left out, their tombstone follows.
+    """
+    using = router.db_for_read(Change)
+    queryset = Change.objects.using(using).filter(id__gt=since).order_by("id")
+    if models:
+        queryset = queryset.filter(model__in=models)
+    page = list(queryset[: limit + 1])
+    settled = _settled(page, connections[using])
+    has_more = len(settled) > limit
+    page = settled[:limit]
+    cursor = page[-1].id if page else since
+
+    latest = {(change.model, change.object_id): change for change in page}
+    upserts = {}
+    for change in latest.values():
+        if change.action == Change.Action.UPSERT:
+            upserts.setdefault(change.model, []).append(change.object_id)
+    objects = {name: _render(*FEED_MODELS[name], pks) for name, pks in upserts.items()}
+
+    results = []
+    for change in sorted(latest.values(), key=lambda change: change.id):
+        entry = {
+            "cursor": change.id,
+            "model": change.model,
+            "id": change.object_id,
+            "action": change.action,
+            "changed_at": _changed_at.to_representation(change.changed_at),
+        }
+        if change.action == Change.Action.UPSERT:
+            entry["object"] = objects[change.model].get(change.object_id)
+            if entry["object"] is None:
+                continue
+        results.append(entry)
+    return results, cursor, has_more
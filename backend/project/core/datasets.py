@@ -0,0 +1,333 @@
+"""Synthetic datasets for benchmarks and load tests."""
+
+import random
+import string
+from dataclasses import dataclass
+
+from django.db import transaction
+
+from .models import (
+    Analysis,
+    BarcodedModel,
+    Batch,
+    Entity,
+    MetaSchema,
+    Project,
+    Result,
+    Sample,
+)
+from .signals import bulk_created
+
+SchemaType = MetaSchema.SchemaType
+
+
+def _word(rng, length=8):
+    return "".join(rng.choices(string.ascii_lowercase, k=length))
+
+
+# Properties of the generated schemas per type. Each version adds the next
+# property from the extras; values come from the generator next to each one.
+PROPERTIES = {
+    SchemaType.ENTITY: (
+        "Plasmid",
+        {
+            "prefix": ("string", lambda rng, i: rng.choice(["PL", "AB", "SC"])),
+            "name": ("string", lambda rng, i: f"p{_word(rng, 6)}-{i}"),
+            "length": ("integer", lambda rng, i: rng.randint(2000, 15000)),
+            "gc_content": ("number", lambda rng, i: round(rng.uniform(0.35, 0.65), 3)),
+            "resistance": (
+                "string",
+                lambda rng, i: rng.choice(["amp", "kan", "cm", "tet"]),
+            ),
+        },
+        {"sequence_verified": ("boolean", lambda rng, i: rng.random() < 0.8)},
+    ),
+    SchemaType.BATCH: (
+        "Cultivation",
+        {
+            "medium": ("string", lambda rng, i: rng.choice(["LB", "TB", "M9", "YPD"])),
+            "temperature": ("number", lambda rng, i: rng.choice([25, 30, 37])),
+            "volume_ml": ("number", lambda rng, i: rng.choice([5, 50, 500, 2000])),
+            "operator": ("string", lambda rng, i: _word(rng, 5)),
+        },
+        {"inducer": ("string", lambda rng, i: rng.choice(["IPTG", "arabinose"]))},
+    ),
+    SchemaType.SAMPLE: (
+        "CultivationSample",
+        {
+            "well": (
+                "string",
+                lambda rng, i: f"{'ABCDEFGH'[i % 96 // 12]}{i % 12 + 1}",
+            ),
+            "timepoint_h": ("number", lambda rng, i: rng.choice([0, 4, 8, 24, 48])),
+            "od600": ("number", lambda rng, i: round(rng.uniform(0.05, 12), 3)),
+        },
+        {"dilution": ("integer", lambda rng, i: rng.choice([1, 10, 100]))},
+    ),
+    SchemaType.ANALYSIS: (
+        "Titer assay",
+        {
+            "method": ("string", lambda rng, i: rng.choice(["HPLC", "ELISA", "BLI"])),
+            "instrument": ("string", lambda rng, i: f"inst-{rng.randint(1, 9)}"),
+            "run": ("integer", lambda rng, i: i),
+        },
+        {"calibrated": ("boolean", lambda rng, i: True)},
+    ),
+    SchemaType.RESULT: (
+        "Titer",
+        {
+            "titer": ("number", lambda rng, i: round(rng.lognormvariate(0, 1), 4)),
+            "unit": ("string", lambda rng, i: "g/L"),
+            "replicate": ("integer", lambda rng, i: i % 3 + 1),
+            "qc": (
+                "object",
+                lambda rng, i: {"passed": rng.random() < 0.95, "cv": rng.random()},
+            ),
+        },
+        {"flags": ("array", lambda rng, i: rng.sample(["edge", "late", "rerun"], 1))},
+    ),
+}
+
+# Fallback values for properties of schemas not generated here
+TYPE_DEFAULTS = {
+    "string": lambda rng, i: _word(rng),
+    "integer": lambda rng, i: rng.randint(0, 1000),
+    "number": lambda rng, i: round(rng.uniform(0, 1000), 3),
+    "boolean": lambda rng, i: rng.random() < 0.5,
+    "object": lambda rng, i: {},
+    "array": lambda rng, i: [],
+}
+
+
+# Every generator above by property name
+GENERATORS = {
+    name: spec
+    for _, base, extras in PROPERTIES.values()
+    for name, spec in (*base.items(), *extras.items())
+}
+
+
+def schema_properties(schema_type, version):
+    """Return `{name: (json type, generator)}` of a generated schema version"""
+    _, base, extras = PROPERTIES[schema_type]
+    properties = dict(base)
+    properties.update(list(extras.items())[: max(version - 1, 0)])
+    return properties
+
+
+def schema_definition(schema_type, version):
+    """Return the JSON Schema of a generated schema version"""
+    properties = schema_properties(schema_type, version)
+    return {
+        "type": "object",
+        "properties": {name: {"type": t} for name, (t, _) in properties.items()},
+        "required": list(properties),
+    }
+
+
+def fake_document(definition, rng, index=0):
+    """Return a document valid against a generated (or flat) JSON Schema"""
+    document = {}
+    for name, spec in (definition.get("properties") or {}).items():
+        json_type = spec.get("type") if isinstance(spec, dict) else None
+        known = GENERATORS.get(name)
+        if known and known[0] == json_type:
+            document[name] = known[1](rng, index)
+        elif json_type in TYPE_DEFAULTS:
+            document[name] = TYPE_DEFAULTS[json_type](rng, index)
+    return document
+
+
+@dataclass
+class DatasetSpec:
+    """Size of a generated dataset"""
+
+    projects: int = 5
+    schema_versions: int = 2
+    entities: int = 1000
+    batches: int = 200
+    preparations_per_batch: int = 3
+    plate_size: int = 96
+    analyses: int = 50
+    results_per_sample: int = 10
+    seed: int = 0
+    chunk_size: int = 10000
+
+    @property
+    def samples(self):
+        return self.batches * self.plate_size
+
+    @property
+    def results(self):
+        return self.samples * self.results_per_sample
+
+
+class DatasetGenerator:
+    """
+    Writes a DatasetSpec worth of rows with bulk inserts.
+
+    Rows are created in chunks of spec.chunk_size, each in its own
+    transaction, with barcodes, many-to-many links and the bulk_created signal
+    handled as in bulk ingestion. progress(model, created, total) is called
+    after every chunk.
+    """
+
+    def __init__(self, spec, progress=None):
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        self.progress = progress
+        self.label = f"{spec.seed}-{_word(random.Random(), 6)}"
+        self.project_ids = []
+        self.schemas = {}
+        self.entity_ids = []
+        self.batch_ids = []
+        self.sample_ids = []
+        self.analysis_ids = []
+
+    def run(self):
+        """Generate the dataset and return the number of rows per model"""
+        spec = self.spec
+        self.project_ids = self._create(
+            Project,
+            (
+                Project(name=f"Project {self.label}-{i}", description="Synthetic")
+                for i in range(spec.projects)
+            ),
+            spec.projects,
+        )
+        self.schemas = self._create_schemas()
+
+        self.entity_ids = self._create(
+            Entity,
+            (
+                self._document_row(Entity, SchemaType.ENTITY, i)
+                for i in range(spec.entities)
+            ),
+            spec.entities,
+            projects=self._some_projects,
+        )
+        self.batch_ids = self._create(
+            Batch,
+            (
+                self._document_row(Batch, SchemaType.BATCH, i)
+                for i in range(spec.batches)
+            ),
+            spec.batches,
+            projects=self._some_projects,
+            preparations=self._some_entities,
+        )
+        self.sample_ids = self._create(
+            Sample,
+            (
+                self._document_row(
+                    Sample,
+                    SchemaType.SAMPLE,
+                    i,
+                    batch_id=self.batch_ids[i // spec.plate_size],
+                )
+                for i in range(spec.samples)
+            ),
+            spec.samples,
+        )
+        self.analysis_ids = self._create(
+            Analysis,
+            (
+                self._document_row(
+                    Analysis,
+                    SchemaType.ANALYSIS,
+                    i,
+                    raw_data_link=f"https://data.example.org/runs/{self.label}/{i}",
+                )
+                for i in range(spec.analyses)
+            ),
+            spec.analyses,
+            projects=self._some_projects,
+        )
+        self._create(
+            Result,
+            (
+                self._document_row(
+                    Result,
+                    SchemaType.RESULT,
+                    i,
+                    sample_id=self.sample_ids[i // spec.results_per_sample],
+                    analysis_id=self.rng.choice(self.analysis_ids),
+                )
+                for i in range(spec.results)
+            ),
+            spec.results,
+        )
+        return {
+            "projects": spec.projects,
+            "metaschemas": len(self.schemas) * spec.schema_versions,
+            "entities": spec.entities,
+            "batches": spec.batches,
+            "samples": spec.samples,
+            "analyses": spec.analyses,
+            "results": spec.results,
+        }
+
+    def _create_schemas(self):
+        schemas = {}
+        for schema_type, (title, _, _) in PROPERTIES.items():
+            schemas[schema_type] = [
+                MetaSchema.objects.create(
+                    title=f"{title} {self.label}",
+                    type=schema_type,
+                    version=version,
+                    definition=schema_definition(schema_type, version),
+                )
+                for version in range(1, self.spec.schema_versions + 1)
+            ]
+        return schemas
+
+    def _document_row(self, model, schema_type, index, **fields):
+        # Most rows use the latest version, as after a schema migration.
+        versions = self.schemas[schema_type]
+        schema = versions[-1] if self.rng.random() < 0.7 else self.rng.choice(versions)
+        blob = fake_document(schema.definition, self.rng, index)
+        field = "data" if model is Result else "metadata"
+        return model(schema=schema, **{field: blob}, **fields)
+
+    def _some_projects(self):
+        return self.rng.sample(self.project_ids, min(2, len(self.project_ids)))
+
+    def _some_entities(self):
+        count = min(self.spec.preparations_per_batch, len(self.entity_ids))
+        return self.rng.sample(self.entity_ids, count)
+
+    def _create(self, model, rows, total, **relations):
+        """Insert rows in chunks; relations map M2M names to id pickers"""
+        ids = []
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.spec.chunk_size:
+                ids += self._write(model, chunk, relations, total, len(ids))
+                chunk = []
+        if chunk:
+            ids += self._write(model, chunk, relations, total, len(ids))
+        return ids
+
+    def _write(self, model, instances, relations, total, done):
+        with transaction.atomic():
+            model.objects.bulk_create(instances, batch_size=1000)
+            if issubclass(model, BarcodedModel):
+                model.assign_barcodes(instances, batch_size=1000)
+            for name, pick in relations.items():
+                m2m = model._meta.get_field(name)
+                through = m2m.remote_field.through
+                source = f"{m2m.m2m_field_name()}_id"
+                target = f"{m2m.m2m_reverse_field_name()}_id"
+                through.objects.bulk_create(
+                    [
+                        through(**{source: instance.pk, target: related})
+                        for instance in instances
+                        for related in pick()
+                    ],
+                    batch_size=1000,
+                )
+            bulk_created.send(sender=model, instances=instances)
+        if self.progress:
+            self.progress(model, done + len(instances), total)
+        return [instance.pk for instance in instances]
@@ -0,0 +1,83 @@
+"""Streaming export of Results joined with their metadata."""
+
+import csv
+
+from django.conf import settings
+
+from .renderers import encode_csv_value, encode_ndjson_line
+
+# Output column -> ORM path from Result, read with a single joined query
+RESULT_EXPORT_COLUMNS = {
+    "result_id": "id",
+    "result_created_at": "created_at",
+    "result_updated_at": "updated_at",
+    "result_data": "data",
+    "schema_id": "schema_id",
+    "schema_title": "schema__title",
+    "schema_type": "schema__type",
+    "schema_version": "schema__version",
+    "sample_id": "sample_id",
+    "sample_metadata": "sample__metadata",
+    "batch_id": "sample__batch_id",
+    "batch_metadata": "sample__batch__metadata",
+    "analysis_id": "analysis_id",
+    "analysis_metadata": "analysis__metadata",
+    "analysis_raw_data_link": "analysis__raw_data_link",
+}
+
+# Barcode column -> (prefix, id column)
+RESULT_EXPORT_BARCODES = {
+    "result_barcode": ("R", "result_id"),
+    "sample_barcode": ("S", "sample_id"),
+    "batch_barcode": ("B", "batch_id"),
+    "analysis_barcode": ("A", "analysis_id"),
+}
+
+
+def iter_result_rows(queryset, chunk_size=None):
+    """
+    Yield one flat dict per Result with sample, batch, analysis and schema
+    fields joined in.
+
+    Rows are read through a server-side cursor so memory use does not depend
+    on the size of the export.
+    """
+    chunk_size = chunk_size or getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+    rows = (
+        queryset.order_by("id")
+        .values_list(*RESULT_EXPORT_COLUMNS.values())
+        .iterator(chunk_size=chunk_size)
+    )
+    for values in rows:
+        row = dict(zip(RESULT_EXPORT_COLUMNS, values))
+        for column, (prefix, id_column) in RESULT_EXPORT_BARCODES.items():
+            row[column] = f"{prefix}{row[id_column]}"
+        yield row
+
+
+def export_columns():
+    """Return the column names of an export row in output order"""
+    return list(RESULT_EXPORT_COLUMNS) + list(RESULT_EXPORT_BARCODES)
+
+
+def stream_ndjson(rows):
+    """Encode rows as NDJSON lines"""
+    for row in rows:
+        yield encode_ndjson_line(row)
+
+
+class _Echo:
+    """File-like object handing back whatever is written to it"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, columns):
+    """Encode rows as CSV lines, starting with the header"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns).encode()
+    for row in rows:
+        yield writer.writerow(
+            [encode_csv_value(row[column]) for column in columns]
+        ).encode()
@@ -0,0 +1,198 @@
+"""Serializer-free list rows built from QuerySet.values()."""
+
+import functools
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .serializers import TimedRepresentationMixin
+
+# Fields whose to_representation returns the database value unchanged.
+IDENTITY_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class IsoDateTime:
+    """
+    DateTimeField.to_representation for ISO 8601 output, with the timezone
+    looked up once per render instead of once per value.
+    """
+
+    def __init__(self, field, tz=None):
+        self.field = field
+        self.tz = tz
+
+    def bind(self, tz):
+        """Return a converter for the given current timezone"""
+        return IsoDateTime(self.field, tz)
+
+    def __call__(self, value):
+        if self.tz is None or value.utcoffset() is None:
+            return self.field.to_representation(value)
+        value = value.astimezone(self.tz).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+
+class ReadPlan:
+    """
+    Precomputed mapping from the columns of a model to a serializer's output.
+
+    Rows are fetched with values() and turned into the same dicts the
+    serializer would produce, without instantiating models or binding fields.
+    Forward many-to-many fields are filled in with one query per field.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self.pk = model._meta.pk.attname
+
+    def select(self, names):
+        """Return a plan limited to the named fields"""
+        return ReadPlan(
+            self.model, [field for field in self.fields if field[0] in names]
+        )
+
+    def values(self, queryset, ordering=()):
+        """Return queryset as dicts holding every column needed to render"""
+        names = [attname for _, attname, _ in self.fields if attname is not None]
+        extra = [self.pk] + [name.lstrip("-") for name in ordering]
+        names += [name for name in dict.fromkeys(extra) if name not in names]
+        return queryset.select_related(None).prefetch_related(None).values(*names)
+
+    def render(self, rows):
+        """Return the serialized representation of rows fetched with values()"""
+        pks = [row[self.pk] for row in rows]
+        related = {
+            name: self._fetch_many_to_many(m2m, pks)
+            for name, attname, m2m in self.fields
+            if attname is None
+        }
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        fields = [
+            (name, attname, convert.bind(tz) if hasattr(convert, "bind") else convert)
+            for name, attname, convert in self.fields
+        ]
+        data = []
+        for row in rows:
+            item = {}
+            for name, attname, convert in fields:
+                if attname is None:
+                    item[name] = related[name].get(row[self.pk], [])
+                    continue
+                value = row[attname]
+                item[name] = (
+                    value if convert is None or value is None else convert(value)
+                )
+            data.append(item)
+        return data
+
+    def _fetch_many_to_many(self, m2m, pks):
+        through = m2m.remote_field.through
+        source = f"{m2m.m2m_field_name()}_id"
+        target = f"{m2m.m2m_reverse_field_name()}_id"
+        links = {}
+        for pk, related_pk in (
+            through.objects.filter(**{f"{source}__in": pks})
+            .order_by(target)
+            .values_list(source, target)
+        ):
+            links.setdefault(pk, []).append(related_pk)
+        return links
+
+
+def _column_lookup(model, attrs):
+    """
+    Return the values() key of a serializer source: the attname of a column,
+    or a lookup through forward foreign keys and one-to-one relations.
+    """
+    if not attrs:
+        return None
+    *path, name = attrs
+    for attr in path:
+        try:
+            relation = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if not (relation.many_to_one or relation.one_to_one):
+            return None
+        model = relation.related_model
+    columns = {f.name: f for f in model._meta.concrete_fields}
+    if name not in columns:
+        return None
+    return "__".join([*path, name]) if path else columns[name].attname
+
+
+@functools.lru_cache(maxsize=None)
+def read_plan(serializer_class):
+    """
+    Return the ReadPlan of a ModelSerializer, or None when it has fields the
+    plan cannot reproduce (nested serializers, method fields, sources other
+    than columns reachable through single-valued relations).
+    """
+    if serializer_class.to_representation not in (
+        serializers.Serializer.to_representation,
+        TimedRepresentationMixin.to_representation,
+    ):
+        return None
+    model = serializer_class.Meta.model
+    many_to_many = {f.name: f for f in model._meta.many_to_many}
+
+    plan = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.ManyRelatedField):
+            child = field.child_relation
+            if (
+                field.source not in many_to_many
+                or type(child).to_representation
+                is not serializers.PrimaryKeyRelatedField.to_representation
+                or child.pk_field is not None
+            ):
+                return None
+            plan.append((name, None, many_to_many[field.source]))
+            continue
+
+        lookup = _column_lookup(model, field.source_attrs)
+        if lookup is None or isinstance(
+            field,
+            (
+                serializers.BaseSerializer,
+                serializers.SerializerMethodField,
+                serializers.HyperlinkedRelatedField,
+            ),
+        ):
+            return None
+        if isinstance(field, serializers.RelatedField) and (
+            type(field).to_representation
+            is not serializers.PrimaryKeyRelatedField.to_representation
+            or field.pk_field is not None
+        ):
+            return None
+
+        if isinstance(field, serializers.JSONField):
+            convert = field.to_representation if field.binary else None
+        elif (
+            isinstance(field, serializers.DateTimeField)
+            and not hasattr(field, "timezone")
+            and str(getattr(field, "format", api_settings.DATETIME_FORMAT)).lower()
+            == ISO_8601
+        ):
+            convert = IsoDateTime(field)
+        elif type(field).to_representation in {
+            cls.to_representation for cls in IDENTITY_FIELDS
+        }:
+            convert = None
+        else:
+            convert = field.to_representation
+        plan.append((name, lookup, convert))
+
+    return ReadPlan(model, plan)
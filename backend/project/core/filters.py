@@ -0,0 +1,148 @@
+"""Filter backends for the core app."""
+
+import datetime
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .indexes import generated_column_name, generated_columns, key_transform, split_path
+
+OPERATORS = ("eq", "ne", "lt", "lte", "gt", "gte", "in", "range", "contains", "isnull")
+
+
+def json_field_names(model):
+    """Return the names of the JSONFields of a model"""
+    return {
+        f.name for f in model._meta.concrete_fields if isinstance(f, models.JSONField)
+    }
+
+
+def parse_value(raw):
+    """Parse a query parameter as JSON, falling back to the plain string"""
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+
+def _column_output_field(value):
+    if isinstance(value, bool):
+        return models.BooleanField()
+    if isinstance(value, (int, float)):
+        return models.FloatField()
+    if isinstance(value, str):
+        return models.TextField()
+    return None
+
+
+class JSONPathFilterBackend(BaseFilterBackend):
+    """
+    Filters on paths inside JSONFields: `?metadata__<path>__<op>=<value>`.
+
+    Nested keys are separated by `__`. Operators are eq (default), ne, lt, lte,
+    gt, gte, in and range (comma separated), contains (substring for strings,
+    containment for objects and arrays) and isnull. Values are parsed as JSON,
+    so `2.5` is a number and `"2.5"` a string.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        fields = json_field_names(queryset.model)
+        columns = None
+        for number, (param, raw) in enumerate(request.query_params.items()):
+            field, _, rest = param.partition("__")
+            if field not in fields or not rest:
+                continue
+
+            keys = split_path(rest)
+            operator = "eq"
+            if len(keys) > 1 and keys[-1] in OPERATORS:
+                operator = keys.pop()
+            if not keys:
+                raise ValidationError({param: "Missing JSON path."})
+
+            if columns is None:
+                columns = generated_columns(queryset.model)
+            queryset = self.filter_path(
+                queryset, f"_json_filter_{number}", field, keys, operator, raw, columns
+            )
+        return queryset
+
+    def filter_path(self, queryset, alias, field, keys, operator, raw, columns):
+        """Apply one JSON path condition to the queryset"""
+        if operator in ("in", "range"):
+            value = [parse_value(part) for part in raw.split(",")]
+            if operator == "range" and len(value) != 2:
+                raise ValidationError(
+                    {alias: "range takes two comma separated values."}
+                )
+        elif operator == "isnull":
+            value = raw.lower() in ("1", "true")
+        else:
+            value = parse_value(raw)
+
+        sample = (
+            value[0] if isinstance(value, list) and operator != "contains" else value
+        )
+        output_field = _column_output_field(sample)
+        column = generated_column_name(field, "__".join(keys))
+        if column in columns and (output_field or operator == "isnull"):
+            table = connection.ops.quote_name(queryset.model._meta.db_table)
+            expression = RawSQL(
+                f"{table}.{connection.ops.quote_name(column)}",
+                [],
+                output_field=output_field or models.TextField(),
+            )
+        else:
+            expression = key_transform(field, keys)
+        queryset = queryset.alias(**{alias: expression})
+
+        if operator == "contains":
+            if isinstance(value, str):
+                return queryset.filter(**{f"{alias}__icontains": value})
+            if not connection.features.supports_json_field_contains:
+                raise ValidationError(
+                    "Containment of objects and arrays is not supported by this database."
+                )
+            return queryset.filter(**{f"{alias}__contains": value})
+        if operator == "range":
+            return queryset.filter(
+                **{f"{alias}__gte": value[0], f"{alias}__lte": value[1]}
+            )
+        if operator == "ne":
+            return queryset.exclude(**{f"{alias}__exact": value})
+        lookup = "exact" if operator == "eq" else operator
+        return queryset.filter(**{f"{alias}__{lookup}": value})
+
+
+class UpdatedAfterFilterBackend(BaseFilterBackend):
+    """
+    Filters on `?updated_after=<ISO 8601 datetime>` (exclusive), backed by the
+    (updated_at, id) indexes, for models with an updated_at column.
+    """
+
+    param = "updated_after"
+
+    def filter_queryset(self, request, queryset, view):
+        raw = request.query_params.get(self.param)
+        if raw is None:
+            return queryset
+        try:
+            queryset.model._meta.get_field("updated_at")
+        except FieldDoesNotExist:
+            return queryset
+        try:
+            value = parse_datetime(raw)
+        except ValueError:
+            value = None
+        if value is None:
+            raise ValidationError({self.param: "Expected an ISO 8601 datetime."})
+        if settings.USE_TZ and timezone.is_naive(value):
+            value = timezone.make_aware(value, datetime.timezone.utc)
+        return queryset.filter(updated_at__gt=value)
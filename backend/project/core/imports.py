@@ -0,0 +1,276 @@
+"""Background imports of instrument files as samples or results."""
+
+import csv
+import io
+import math
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .bulk import bulk_ingest
+from .models import ImportJob, MetaSchema
+from .serializers import IMPORT_RELATIONS, ResultSerializer, SampleSerializer
+
+# Schema types that may be imported, with the serializer validating the rows
+# and their relation columns
+IMPORTERS = {
+    MetaSchema.SchemaType.SAMPLE: (
+        SampleSerializer,
+        IMPORT_RELATIONS[MetaSchema.SchemaType.SAMPLE],
+    ),
+    MetaSchema.SchemaType.RESULT: (
+        ResultSerializer,
+        IMPORT_RELATIONS[MetaSchema.SchemaType.RESULT],
+    ),
+}
+
+# Spellings of booleans in instrument files
+BOOLEANS = {
+    "true": True,
+    "false": False,
+    "yes": True,
+    "no": False,
+    "1": True,
+    "0": False,
+}
+
+
+class JobLost(Exception):
+    """Another worker took over the job"""
+
+
+def declared_types(definition, keys):
+    """
+    Return the JSON Schema types declared for a nested property, following
+    `properties` along keys; an empty tuple when it has no plain type.
+    """
+    node = definition
+    for key in keys:
+        properties = node.get("properties") if isinstance(node, dict) else None
+        if not isinstance(properties, dict) or key not in properties:
+            return ()
+        node = properties[key]
+    declared = node.get("type") if isinstance(node, dict) else None
+    if isinstance(declared, str):
+        return (declared,)
+    if isinstance(declared, list):
+        return tuple(declared)
+    return ()
+
+
+def _cast(value, type_name):
+    """Cast a stripped cell to a JSON Schema type; raises ValueError"""
+    if type_name == "integer":
+        return int(value)
+    if type_name == "number":
+        try:
+            return int(value)
+        except ValueError:
+            number = float(value)
+        if not math.isfinite(number):
+            raise ValueError(value)
+        return number
+    if type_name == "boolean":
+        return BOOLEANS[value.lower()]
+    if type_name == "string":
+        return value
+    raise ValueError(value)
+
+
+def parse_cell(value, types=()):
+    """
+    Return a cell as the first declared type it parses as.
+
+    Cells of properties without a declared type, and cells that fit none of
+    the types, stay strings, so "007" keeps its zeros and a bad number is
+    reported by schema validation.
+    """
+    value = value.strip()
+    for type_name in types:
+        try:
+            return _cast(value, type_name)
+        except (KeyError, ValueError):
+            continue
+    return value
+
+
+def build_payload(job, relations, row):
+    """
+    Turn a CSV row into a serializer payload.
+
+    Relation columns hold ids or barcodes; every other non-empty cell goes
+    into the blob, with `__` in a column name nesting keys (`qc__cv`), typed
+    as the job's schema declares the property.
+    """
+    payload = {"schema": job.schema_id, **job.defaults}
+    blob = {}
+    for column, value in row.items():
+        if column is None:
+            raise ValueError("Row has more cells than the header.")
+        if value is None or not value.strip():
+            continue
+        if column in relations:
+            payload[column] = value.strip()
+            continue
+        *parents, key = column.strip().split("__")
+        node = blob
+        for parent in parents:
+            node = node.setdefault(parent, {})
+            if not isinstance(node, dict):
+                raise ValueError(f"Column {column} conflicts with {parent}.")
+        node[key] = parse_cell(
+            value, declared_types(job.schema.definition, [*parents, key])
+        )
+    payload[job.schema.target_field] = blob
+    return payload
+
+
+def _resolve_barcodes(serializer_class, relations, payloads):
+    """Replace barcodes in relation columns with ids, one query per relation"""
+    model = serializer_class.Meta.model
+    for name in relations:
+        related = model._meta.get_field(name).related_model
+        codes = {
+            payload[name]
+            for payload in payloads
+            if isinstance(payload.get(name), str) and not payload[name].isdigit()
+        }
+        if not codes:
+            continue
+        ids = dict(
+            related.objects.filter(barcode__in=codes).values_list("barcode", "pk")
+        )
+        for payload in payloads:
+            if payload.get(name) in ids:
+                payload[name] = ids[payload[name]]
+
+
+def open_rows(job):
+    """Yield the rows of the job's file as dicts keyed by the header"""
+    with job.file.open("rb") as handle:
+        text = io.TextIOWrapper(handle, encoding="utf-8-sig", newline="")
+        yield from csv.DictReader(text, delimiter=job.delimiter)
+
+
+def count_rows(job):
+    """Return the number of data rows of the job's file"""
+    return sum(1 for _ in open_rows(job))
+
+
+def claim_job(worker, pk=None):
+    """
+    Claim the oldest pending job, or a running one whose worker stopped
+    sending heartbeats, and return it; None if there is none.
+
+    The claim is a conditional UPDATE, so concurrent workers never run the
+    same job and no row locks or broker are needed.
+    """
+    stale = timezone.now() - timedelta(
+        seconds=getattr(settings, "IMPORT_STALE_SECONDS", 300)
+    )
+    claimable = Q(status=ImportJob.Status.PENDING) | Q(
+        status=ImportJob.Status.RUNNING, heartbeat_at__lt=stale
+    )
+    candidates = ImportJob.objects.filter(claimable).order_by("pk")
+    if pk is not None:
+        candidates = candidates.filter(pk=pk)
+    for candidate in candidates.values("pk", "heartbeat_at")[:10]:
+        now = timezone.now()
+        claimed = ImportJob.objects.filter(claimable, **candidate).update(
+            status=ImportJob.Status.RUNNING, worker=worker, heartbeat_at=now
+        )
+        if claimed:
+            job = ImportJob.objects.get(pk=candidate["pk"])
+            job.attempts += 1
+            job.save(update_fields=["attempts", "updated_at"])
+            return job
+    return None
+
+
+def _apply_chunk(job, serializer_class, relations, first_row, rows):
+    """Insert one chunk of rows and move the checkpoint in one transaction"""
+    payloads = []
+    errors = []
+    for number, row in enumerate(rows, start=first_row):
+        try:
+            payloads.append((number, build_payload(job, relations, row)))
+        except ValueError as e:
+            errors.append({"row": number, "errors": {"non_field_errors": [str(e)]}})
+    _resolve_barcodes(serializer_class, relations, [p for _, p in payloads])
+
+    max_errors = getattr(settings, "IMPORT_MAX_ERRORS", 1000)
+    with transaction.atomic():
+        result = bulk_ingest(
+            serializer_class,
+            [payload for _, payload in payloads],
+            batch_size=getattr(settings, "BULK_CREATE_BATCH_SIZE", 500),
+        )
+        errors += [
+            {"row": payloads[failure["index"]][0], "errors": failure["errors"]}
+            for failure in result.failed
+        ]
+        errors.sort(key=lambda error: error["row"])
+
+        job.last_row = first_row + len(rows) - 1
+        job.processed += len(rows)
+        job.imported += len(result.created)
+        job.failed += len(errors)
+        job.errors = (job.errors + errors)[:max_errors]
+        job.heartbeat_at = timezone.now()
+        updated = ImportJob.objects.filter(
+            pk=job.pk, worker=job.worker, status=ImportJob.Status.RUNNING
+        ).update(
+            last_row=job.last_row,
+            processed=job.processed,
+            imported=job.imported,
+            failed=job.failed,
+            errors=job.errors,
+            heartbeat_at=job.heartbeat_at,
+            updated_at=job.heartbeat_at,
+        )
+        if not updated:
+            raise JobLost(f"Import job {job.pk} was taken over by another worker")
+
+
+def run_import(job, chunk_size=None, progress=None):
+    """
+    Parse, validate and insert the rows of a claimed job in chunks.
+
+    Each chunk is inserted together with the checkpoint, so a job whose
+    worker died resumes after its last committed chunk when claimed again.
+    Invalid rows are skipped and listed in job.errors by row number, counted
+    from 1 after the header.
+    """
+    chunk_size = chunk_size or getattr(settings, "IMPORT_CHUNK_SIZE", 1000)
+    now = timezone.now()
+    try:
+        if job.schema.type not in IMPORTERS:
+            raise ValueError(f"Cannot import rows of {job.schema}.")
+        serializer_class, relations = IMPORTERS[job.schema.type]
+        if not job.started_at:
+            job.started_at = now
+            job.total = count_rows(job)
+            job.save(update_fields=["started_at", "total", "updated_at"])
+
+        rows = islice(open_rows(job), job.last_row, None)
+        while chunk := list(islice(rows, chunk_size)):
+            _apply_chunk(job, serializer_class, relations, job.last_row + 1, chunk)
+            if progress:
+                progress(job)
+    except JobLost:
+        raise
+    except Exception as e:
+        job.status = ImportJob.Status.FAILED
+        job.message = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "message", "finished_at", "updated_at"])
+        raise
+
+    job.status = ImportJob.Status.COMPLETED
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "finished_at", "updated_at"])
+    return job
@@ -0,0 +1,195 @@
+"""Expression indexes on JSON paths declared by MetaSchema.indexed_paths."""
+
+import hashlib
+import re
+
+from django.db import connection, models
+from django.db.models.fields.json import KeyTransform, compile_json_path
+
+COLUMN_PREFIX = "jx_"
+INDEX_PREFIX = "core_jx_"
+GIN_INDEX_PREFIX = "core_jg_"
+
+
+def split_path(path):
+    """Split a `culture__od` style path into its keys"""
+    return [key for key in path.split("__") if key]
+
+
+def key_transform(field, keys):
+    """Build the chained KeyTransform the ORM uses for a JSON path"""
+    expression = field
+    for key in keys:
+        expression = KeyTransform(key, expression)
+    return expression
+
+
+def _digest(*parts):
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:8]
+
+
+def generated_column_name(field, path):
+    """Name of the SQLite generated column extracting a JSON path"""
+    readable = re.sub(r"\W", "_", path)[:30]
+    return f"{COLUMN_PREFIX}{readable}_{_digest(field, path)}"
+
+
+def index_name(model, field, path, prefix=INDEX_PREFIX):
+    """Name of the index of a JSON path, short enough for every backend"""
+    return f"{prefix}{model._meta.model_name[:8]}_{_digest(field, path)}"
+
+
+def declared_paths(model):
+    """Return the JSON paths declared as indexed by the schemas of a model"""
+    from .models import MetaSchema  # pylint: disable=import-outside-toplevel
+
+    types = [
+        t for t in MetaSchema.SchemaType if MetaSchema(type=t).target_model is model
+    ]
+    paths = set()
+    for indexed_paths in MetaSchema.objects.filter(type__in=types).values_list(
+        "indexed_paths", flat=True
+    ):
+        paths.update(indexed_paths or [])
+    return paths
+
+
+def index_targets():
+    """Return the (model, JSONField name) pairs MetaSchemas can index"""
+    from .models import MetaSchema  # pylint: disable=import-outside-toplevel
+
+    targets = {
+        (schema.target_model, schema.target_field)
+        for schema in (MetaSchema(type=t) for t in MetaSchema.SchemaType)
+    }
+    return sorted(targets, key=lambda target: target[0]._meta.label)
+
+
+def generated_columns(model):
+    """Return the names of JSON path generated columns present on a table"""
+    if connection.vendor != "sqlite":
+        return set()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM pragma_table_xinfo(%s) WHERE name LIKE %s",
+            [model._meta.db_table, f"{COLUMN_PREFIX}%"],
+        )
+        return {name for (name,) in cursor.fetchall()}
+
+
+def _existing_indexes(cursor, model):
+    constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return {
+        name
+        for name, info in constraints.items()
+        if info["index"] and name.startswith((INDEX_PREFIX, GIN_INDEX_PREFIX))
+    }
+
+
+def _sqlite_statements(model, field, path):
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = generated_column_name(field, path)
+    json_path = compile_json_path(split_path(path)).replace("'", "''")
+    return column, [
+        f"ALTER TABLE {table} ADD COLUMN {connection.ops.quote_name(column)} "
+        f"GENERATED ALWAYS AS (JSON_EXTRACT({connection.ops.quote_name(field)}, "
+        f"'{json_path}')) VIRTUAL",
+        f"CREATE INDEX {connection.ops.quote_name(index_name(model, field, path))} "
+        f"ON {table} ({connection.ops.quote_name(column)})",
+    ]
+
+
+def _postgresql_indexes(model, field, path):
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+
+    expression = key_transform(field, split_path(path))
+    return [
+        models.Index(expression, name=index_name(model, field, path)),
+        GinIndex(
+            OpClass(expression, name="jsonb_path_ops"),
+            name=index_name(model, field, path, prefix=GIN_INDEX_PREFIX),
+        ),
+    ]
+
+
+def _invalid_indexes(cursor, model):
+    """Names of indexes a failed CREATE INDEX CONCURRENTLY left unusable"""
+    cursor.execute(
+        "SELECT c.relname FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = %s::regclass AND NOT i.indisvalid",
+        [model._meta.db_table],
+    )
+    return {name for (name,) in cursor.fetchall()}
+
+
+def sync_json_indexes(model, field, dry_run=False):
+    """
+    Create and drop indexes so they match the paths declared for a model.
+    Returns the statements run, or that would run with dry_run.
+
+    PostgreSQL gets a btree and a GIN (jsonb_path_ops) index on the same
+    expression the ORM emits for key lookups, built with CREATE INDEX
+    CONCURRENTLY outside transactions so writes continue meanwhile. SQLite
+    cannot match expression indexes against bound parameters, so each path
+    gets a virtual generated column with an index, which
+    JSONPathFilterBackend queries directly.
+
+    This is DDL on large tables; run it from the `sync_json_indexes`
+    management command, not while serving requests. Migrations that rebuild
+    a SQLite table drop its generated columns; migrate restores them through
+    a post_migrate receiver.
+    """
+    paths = declared_paths(model)
+    table = connection.ops.quote_name(model._meta.db_table)
+    statements = []
+
+    with connection.cursor() as cursor:
+        existing = _existing_indexes(cursor, model)
+        wanted = set()
+
+        if connection.vendor == "sqlite":
+            columns = generated_columns(model)
+            wanted_columns = set()
+            for path in paths:
+                column, create = _sqlite_statements(model, field, path)
+                wanted_columns.add(column)
+                wanted.add(index_name(model, field, path))
+                if column not in columns:
+                    statements.append(create[0])
+                if index_name(model, field, path) not in existing:
+                    statements.append(create[1])
+            for name in sorted(existing - wanted):
+                statements.append(f"DROP INDEX {connection.ops.quote_name(name)}")
+            for column in sorted(columns - wanted_columns):
+                statements.append(
+                    f"ALTER TABLE {table} DROP COLUMN {connection.ops.quote_name(column)}"
+                )
+
+        elif connection.vendor == "postgresql":
+            concurrently = not connection.in_atomic_block
+            drop = "DROP INDEX CONCURRENTLY" if concurrently else "DROP INDEX"
+            invalid = _invalid_indexes(cursor, model)
+            for name in sorted(invalid):
+                statements.append(f"{drop} {connection.ops.quote_name(name)}")
+            existing -= invalid
+            with connection.schema_editor(atomic=False) as editor:
+                for path in paths:
+                    for index in _postgresql_indexes(model, field, path):
+                        wanted.add(index.name)
+                        if index.name not in existing:
+                            statements.append(
+                                str(
+                                    index.create_sql(
+                                        model, editor, concurrently=concurrently
+                                    )
+                                )
+                            )
+            for name in sorted(existing - wanted):
+                statements.append(f"{drop} {connection.ops.quote_name(name)}")
+
+        if not dry_run:
+            for statement in statements:
+                cursor.execute(statement)
+    return statements
@@ -0,0 +1,167 @@
+"""Per-request timings and in-process Prometheus histograms."""
+
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+from dataclasses import dataclass, field
+
+# Phases timed inside a request besides SQL, in Server-Timing order
+PHASES = ("validation", "serialization")
+
+_current = contextvars.ContextVar("core_request_timings", default=None)
+
+
+@dataclass
+class RequestTimings:
+    """What one request spent its time on, in seconds"""
+
+    queries: int = 0
+    sql: float = 0.0
+    phases: dict = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+    statements: list = field(default_factory=list)
+    capture_sql: bool = False
+    active: set = field(default_factory=set)
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Connection execute wrapper counting and timing every query"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.sql += elapsed
+            if self.capture_sql:
+                self.statements.append((sql, elapsed))
+
+
+def current():
+    """Return the timings of the request being handled, if any"""
+    return _current.get()
+
+
+def start_request(capture_sql=False):
+    """Begin collecting timings for the current request"""
+    timings = RequestTimings(capture_sql=capture_sql)
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    """Stop collecting timings for the current request"""
+    _current.reset(token)
+
+
+@contextlib.contextmanager
+def timed(phase):
+    """
+    Add the time spent in the block to a phase of the current request.
+
+    Nested blocks of the same phase are counted once, so per-row hooks can be
+    wrapped by per-page ones.
+    """
+    timings = _current.get()
+    if timings is None or phase in timings.active:
+        yield
+        return
+    timings.active.add(phase)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[phase] += time.perf_counter() - start
+        timings.active.discard(phase)
+
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BYTES_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+METRICS = {
+    "core_request_duration_seconds": ("Request duration", SECONDS_BUCKETS),
+    "core_request_queries": ("Database queries per request", QUERY_BUCKETS),
+    "core_request_sql_seconds": ("Time spent in SQL", SECONDS_BUCKETS),
+    "core_request_validation_seconds": (
+        "Time spent in jsonschema validation",
+        SECONDS_BUCKETS,
+    ),
+    "core_request_serialization_seconds": (
+        "Time spent serializing objects",
+        SECONDS_BUCKETS,
+    ),
+    "core_response_size_bytes": ("Response body size", BYTES_BUCKETS),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """
+    Per-endpoint histograms of request timings, kept in process memory.
+
+    Every worker process has its own registry, so scrape each worker or run a
+    single one when exact totals matter.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, labels, values):
+        """Record one request; values maps metric names to observations"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            for name, value in values.items():
+                histogram = self._histograms.get((name, key))
+                if histogram is None:
+                    histogram = Histogram(METRICS[name][1])
+                    self._histograms[(name, key)] = histogram
+                histogram.observe(value)
+
+    def clear(self):
+        """Drop every recorded observation"""
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """Return all histograms in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            snapshot = sorted(
+                (name, key, list(histogram.counts), histogram.sum)
+                for (name, key), histogram in self._histograms.items()
+            )
+        for name, (description, buckets) in METRICS.items():
+            series = [row[1:] for row in snapshot if row[0] == name]
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, counts, total in series:
+                labels = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+                cumulative = 0
+                for bound, count in zip((*buckets, "+Inf"), counts, strict=True):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {total}")
+                lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,234 @@
+"""A subset of RFC 6902 JSON Patch compiled to SQL on JSONField columns."""
+
+import json
+import re
+
+from django.db import NotSupportedError, models
+from django.db.models import Func
+
+from .indexes import key_transform
+
+# Supported operations; tests select the rows, the others rewrite them
+OPERATIONS = ("test", "add", "replace", "remove")
+
+# RFC 6902 operations left out of the subset
+UNSUPPORTED_OPERATIONS = ("move", "copy")
+
+# RFC 6901 array index: no leading zeros
+ARRAY_INDEX = re.compile(r"0|[1-9][0-9]*")
+
+# Why an operation cannot apply to a row, by the code PatchCheck returns
+CHECK_ERRORS = {
+    "target": "Nothing to {op} at {path}.",
+    "parent": "The parent of {path} is missing or cannot hold it.",
+    "index": "Cannot add at the array index {path}; only '-' appends to an array.",
+}
+
+
+def parse_pointer(pointer):
+    """Split an RFC 6901 JSON pointer into its reference tokens"""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise ValueError("A JSON pointer starts with '/'.")
+    return [
+        token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")
+    ]
+
+
+def _sqlite_path(doc_sql, doc_params, tokens):
+    """
+    Return SQL computing the SQLite JSON path of tokens inside a document.
+
+    Numeric tokens index arrays and name members of anything else, decided per
+    row with json_type.
+    """
+    literal, sql, params = "$", None, []
+    for token in tokens:
+        key = f".{json.dumps(token)}"
+        if not ARRAY_INDEX.fullmatch(token):
+            if sql is None:
+                literal += key
+            else:
+                sql, params = f"({sql} || %s)", [*params, key]
+            continue
+        if sql is None:
+            sql, params = "%s", [literal]
+        sql, params = (
+            f"({sql} || CASE json_type({doc_sql}, {sql}) "
+            "WHEN 'array' THEN %s ELSE %s END)",
+            [*params, *doc_params, *params, f"[{token}]", key],
+        )
+    return ("%s", [literal]) if sql is None else (sql, params)
+
+
+class PatchOperation(Func):
+    """
+    One add, replace or remove applied to a JSON expression, as `json_set`,
+    `json_replace` and `json_remove` on SQLite and `jsonb_set`, `jsonb_insert`
+    and `#-` on PostgreSQL.
+
+    Numeric tokens address elements of arrays and members of objects, and a
+    final `-` appends to an array. Only apply it to rows PatchCheck passes.
+    """
+
+    output_field = models.JSONField()
+
+    def __init__(self, expression, op, tokens, value=None):
+        super().__init__(expression)
+        self.op = op
+        self.tokens = tuple(tokens)
+        self.value = value
+
+    @property
+    def appends(self):
+        return self.op == "add" and self.tokens[-1] == "-"
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(
+            f"JSON Patch is not supported on {connection.vendor} databases."
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        if self.appends:
+            path, path_params = _sqlite_path(sql, params, self.tokens[:-1])
+            path = f"({path} || '[#]')"
+        else:
+            path, path_params = _sqlite_path(sql, params, self.tokens)
+        if self.op == "remove":
+            return f"json_remove({sql}, {path})", (*params, *path_params)
+        function = "json_insert" if self.appends else "json_set"
+        if self.op == "replace":
+            function = "json_replace"
+        return (
+            f"{function}({sql}, {path}, json(%s))",
+            (*params, *path_params, json.dumps(self.value)),
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        if self.op == "remove":
+            return f"({sql} #- %s::text[])", (*params, list(self.tokens))
+        value = json.dumps(self.value)
+        if self.appends:
+            return (
+                f"jsonb_insert({sql}, %s::text[], %s::jsonb, true)",
+                (*params, [*self.tokens[:-1], "-1"], value),
+            )
+        create = "true" if self.op == "add" else "false"
+        return (
+            f"jsonb_set({sql}, %s::text[], %s::jsonb, {create})",
+            (*params, list(self.tokens), value),
+        )
+
+
+class PatchCheck(Func):
+    """
+    Why an add, replace or remove cannot apply to a JSON expression: a key of
+    CHECK_ERRORS, or NULL when it can.
+
+    Replace and remove need an existing target. Add needs an object or array
+    parent, and only appends to arrays with `-`; RFC 6902 inserts at an
+    index, which is not supported.
+    """
+
+    output_field = models.CharField()
+
+    def __init__(self, expression, op, tokens):
+        super().__init__(expression)
+        self.op = op
+        self.tokens = tuple(tokens)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(
+            f"JSON Patch is not supported on {connection.vendor} databases."
+        )
+
+    def _case(self, type_sql):
+        """
+        Turn the SQL of the JSON type at the target, or for add at its parent,
+        into the check
+        """
+        if self.op != "add":
+            return f"CASE WHEN {type_sql} IS NULL THEN 'target' END"
+        if self.tokens[-1] == "-":
+            return f"CASE WHEN {type_sql} = 'array' THEN NULL ELSE 'parent' END"
+        return (
+            f"CASE {type_sql} WHEN 'object' THEN NULL WHEN 'array' THEN 'index' "
+            "ELSE 'parent' END"
+        )
+
+    @property
+    def checked_tokens(self):
+        return self.tokens[:-1] if self.op == "add" else self.tokens
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        path, path_params = _sqlite_path(sql, params, self.checked_tokens)
+        return self._case(f"json_type({sql}, {path})"), (*params, *path_params)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return (
+            self._case(f"jsonb_typeof({sql} #> %s::text[])"),
+            (*params, list(self.checked_tokens)),
+        )
+
+
+def patch_checks(field, operations):
+    """
+    Build a PatchCheck per change, keyed by an alias holding its index, each
+    seeing the document as the changes before it left it.
+    """
+    checks = {}
+    expression = models.F(field)
+    for number, operation in enumerate(operations):
+        if operation["op"] == "test":
+            continue
+        tokens = parse_pointer(operation["path"])
+        checks[f"_patch_check_{number}"] = PatchCheck(
+            expression, operation["op"], tokens
+        )
+        expression = PatchOperation(
+            expression, operation["op"], tokens, operation.get("value")
+        )
+    return checks
+
+
+def check_error(operations, alias, code):
+    """Describe a failed PatchCheck of an alias from patch_checks"""
+    number = int(alias.rsplit("_", 1)[1])
+    operation = operations[number]
+    message = CHECK_ERRORS[code].format(op=operation["op"], path=operation["path"])
+    return f"Operation {number}: {message}"
+
+
+def patch_expression(field, operations):
+    """Build the expression applying the non-test operations to a field"""
+    expression = models.F(field)
+    for operation in operations:
+        if operation["op"] != "test":
+            expression = PatchOperation(
+                expression,
+                operation["op"],
+                parse_pointer(operation["path"]),
+                operation.get("value"),
+            )
+    return expression
+
+
+def filter_tests(queryset, field, operations):
+    """Keep the rows passing every test operation"""
+    for number, operation in enumerate(operations):
+        if operation["op"] != "test":
+            continue
+        tokens = parse_pointer(operation["path"])
+        if not tokens:
+            queryset = queryset.filter(**{field: operation["value"]})
+            continue
+        alias = f"_patch_test_{number}"
+        queryset = queryset.alias(**{alias: key_transform(field, tokens)}).filter(
+            **{alias: operation["value"]}
+        )
+    return queryset
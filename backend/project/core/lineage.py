@@ -0,0 +1,109 @@
+"""Lineage graphs along Entity -> Batch -> Sample -> Result."""
+
+from django.conf import settings
+
+from .models import Batch, Entity, Result, Sample
+
+# Levels from the most upstream to the most downstream object type. Each entry
+# holds the lookup to the previous level and the reverse lookup from it.
+LEVELS = [
+    ("entity", Entity, None, None),
+    ("batch", Batch, "preparations", "batches"),
+    ("sample", Sample, "batch", "samples"),
+    ("result", Result, "sample", "results"),
+]
+
+LEVEL_INDEX = {name: index for index, (name, *_) in enumerate(LEVELS)}
+
+DIRECTIONS = ("downstream", "upstream")
+
+DEFAULT_FIELDS = ("barcode",)
+
+
+def node_fields(model, fields):
+    """Return the requested fields that exist as plain columns on a model"""
+    available = {
+        f.attname for f in model._meta.concrete_fields if not f.primary_key
+    } | {f.name for f in model._meta.concrete_fields if not f.is_relation}
+    return [name for name in fields if name in available]
+
+
+def node_id(object_type, pk):
+    """Return the id of a node in a lineage payload"""
+    return f"{object_type}:{pk}"
+
+
+def build_lineage(root, direction="downstream", depth=None, fields=DEFAULT_FIELDS):
+    """
+    Return the nodes and edges reachable from root in one direction.
+
+    Runs one query per level, each joining the next level to the ids found on
+    the previous one. Edges always point downstream, `[parent, child]`.
+
+    Each level is fetched with a LIMIT of the LINEAGE_MAX_NODES budget left;
+    a level with more links than that is left out and the graph marked
+    truncated.
+    """
+    start = LEVEL_INDEX[type(root)._meta.model_name]
+    step = 1 if direction == "downstream" else -1
+    max_levels = len(LEVELS) - 1 - start if step == 1 else start
+    depth = max_levels if depth is None else min(depth, max_levels)
+    max_nodes = getattr(settings, "LINEAGE_MAX_NODES", 10000)
+
+    root_type, root_model = LEVELS[start][:2]
+    root_node = {"id": node_id(root_type, root.pk), "type": root_type, "pk": root.pk}
+    for name in node_fields(root_model, fields):
+        root_node[name] = getattr(root, name)
+
+    nodes = [root_node]
+    edges = []
+    frontier = {root.pk}
+    truncated = False
+
+    for level in range(start + step, start + step * (depth + 1), step):
+        if not frontier:
+            break
+        object_type, model, parent_lookup, _ = LEVELS[level]
+        if step == 1:
+            link, link_type = parent_lookup, LEVELS[level - 1][0]
+        else:
+            link, link_type = LEVELS[level + 1][3], LEVELS[level + 1][0]
+
+        # One row per link; never fetch more than the remaining budget allows
+        columns = node_fields(model, fields)
+        remaining = max_nodes - len(nodes)
+        rows = list(
+            model.objects.filter(**{f"{link}__in": frontier})
+            .order_by("pk")
+            .values_list("pk", link, *columns)[: remaining + 1]
+        )
+        if len(rows) > remaining:
+            truncated = True
+            break
+
+        found = {}
+        for pk, linked, *values in rows:
+            if pk not in found:
+                found[pk] = dict(zip(columns, values))
+            edge = (node_id(link_type, linked), node_id(object_type, pk))
+            edges.append(list(edge if step == 1 else edge[::-1]))
+
+        for pk, values in found.items():
+            nodes.append(
+                {
+                    "id": node_id(object_type, pk),
+                    "type": object_type,
+                    "pk": pk,
+                    **values,
+                }
+            )
+        frontier = set(found)
+
+    return {
+        "root": root_node["id"],
+        "direction": direction,
+        "depth": depth,
+        "truncated": truncated,
+        "nodes": nodes,
+        "edges": edges,
+    }
@@ -0,0 +1,124 @@
+"""Compare the serializer and values() read paths of the results list."""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.fastpath import read_plan
+from core.models import Analysis, Batch, MetaSchema, Result, Sample
+from core.renderers import ORJSONRenderer
+from core.views import ResultViewSet
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark rows"""
+
+
+class Command(BaseCommand):
+    """Time serializing and rendering results with both read paths"""
+
+    help = (
+        "Seed results in a rolled back transaction and time the serializer + "
+        "JSONRenderer path against the values() + ORJSONRenderer path."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--keys", type=int, default=20, help="Keys in each result's data blob"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._seed(options["rows"], options["keys"])
+                self._run(options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _seed(self, rows, keys):
+        schema = MetaSchema.objects.create(
+            title="Benchmark",
+            type=MetaSchema.SchemaType.RESULT,
+            version=1,
+            definition={},
+        )
+        batch = Batch.objects.create(schema=schema, metadata={})
+        sample = Sample.objects.create(schema=schema, batch=batch, metadata={})
+        analysis = Analysis.objects.create(schema=schema, metadata={})
+        rng = random.Random(0)
+        Result.objects.bulk_create(
+            [
+                Result(
+                    schema=schema,
+                    sample=sample,
+                    analysis=analysis,
+                    data={
+                        f"value_{k}": round(rng.uniform(0, 1000), 4)
+                        for k in range(keys)
+                    }
+                    | {"label": f"result {i}", "flags": ["qc", "replicate"]},
+                )
+                for i in range(rows)
+            ],
+            batch_size=1000,
+        )
+
+    def _time(self, repeat, func):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def _run(self, repeat):
+        queryset = ResultViewSet.queryset.order_by("-created_at", "-id")
+        serializer_class = ResultViewSet.serializer_class
+        plan = read_plan(serializer_class)
+        if plan is None:
+            raise CommandError("ResultSerializer has no read plan")
+
+        stages = {}
+        stages["fetch"] = [
+            self._time(repeat, lambda: list(queryset.all())),
+            self._time(repeat, lambda: list(plan.values(queryset))),
+        ]
+        instances, rows = stages["fetch"][0][1], stages["fetch"][1][1]
+        stages["serialize"] = [
+            self._time(repeat, lambda: serializer_class(instances, many=True).data),
+            self._time(repeat, lambda: plan.render(rows)),
+        ]
+        regular_data, fast_data = stages["serialize"][0][1], stages["serialize"][1][1]
+        stages["encode"] = [
+            self._time(repeat, lambda: JSONRenderer().render(regular_data)),
+            self._time(repeat, lambda: ORJSONRenderer().render(fast_data)),
+        ]
+        expected, content = stages["encode"][0][1], stages["encode"][1][1]
+        if content != expected:
+            raise CommandError("Read paths returned different payloads")
+
+        self.stdout.write(
+            f"{len(rows)} rows, {len(content)} bytes, best of {repeat} in ms"
+        )
+        self.stdout.write(f"{'':10} {'serializer+json':>16} {'values+orjson':>14}")
+        totals = [0, 0]
+        for stage, timings in stages.items():
+            regular, fast = timings[0][0], timings[1][0]
+            totals = [totals[0] + regular, totals[1] + fast]
+            self.stdout.write(
+                f"{stage:10} {regular * 1000:16.1f} {fast * 1000:14.1f}"
+                f"  {regular / fast:5.1f}x"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'total':10} {totals[0] * 1000:16.1f} {totals[1] * 1000:14.1f}"
+                f"  {totals[0] / totals[1]:5.1f}x"
+            )
+        )
@@ -0,0 +1,104 @@
+"""Benchmark the list, detail and create endpoints of the core API."""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from core.benchmark import compare, discover_endpoints, run_benchmark
+
+
+class Command(BaseCommand):
+    """Measure latency, throughput and query counts of every core endpoint"""
+
+    help = (
+        "Request every list, detail and create endpoint against the current "
+        "database and report latency percentiles, throughput and query counts "
+        "as JSON. Creates are rolled back. With --compare, fail when an "
+        "endpoint got slower than --max-regression."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument("--label", help="Free-form name stored in the report")
+        parser.add_argument(
+            "--endpoints",
+            nargs="*",
+            help="Only run endpoints with these names, e.g. result-list",
+        )
+        parser.add_argument(
+            "--with-cache",
+            action="store_true",
+            help="Keep the response cache enabled (it is only on with REDIS_URL)",
+        )
+        parser.add_argument("--compare", help="Report file to compare against")
+        parser.add_argument(
+            "--max-regression",
+            type=float,
+            default=None,
+            help="Fail when a p50 latency grew by more than this fraction",
+        )
+        parser.add_argument("--host", default="localhost")
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be positive")
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as f:
+                baseline = json.load(f)
+
+        endpoints = discover_endpoints()
+        if options["endpoints"]:
+            unknown = set(options["endpoints"]) - {e.name for e in endpoints}
+            if unknown:
+                raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+            endpoints = [e for e in endpoints if e.name in options["endpoints"]]
+
+        overrides = {} if options["with_cache"] else {"RESPONSE_CACHE_ALIAS": None}
+        with override_settings(**overrides):
+            report = run_benchmark(
+                Client(HTTP_HOST=options["host"]),
+                endpoints,
+                options["iterations"],
+                warmup=options["warmup"],
+                label=options["label"],
+                progress=self._progress,
+            )
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+                f.write("\n")
+            self.stdout.write(f"Wrote {options['output']}")
+
+        failed = [e["name"] for e in report["endpoints"] if e["errors"]]
+        if failed:
+            raise CommandError(f"Unexpected status from {', '.join(failed)}")
+        if baseline is not None:
+            self._compare(baseline, report, options["max_regression"])
+
+    def _progress(self, result):
+        latency = result["latency_ms"]
+        self.stdout.write(
+            f"{result['name']:<20} p50 {latency['p50']:9.2f} ms  "
+            f"p95 {latency['p95']:9.2f} ms  {result['throughput_rps']:9.1f} req/s  "
+            f"{result['queries']['max']:4d} queries  {result['response_bytes']} B"
+        )
+
+    def _compare(self, baseline, report, max_regression):
+        regressions = []
+        for row in compare(baseline, report):
+            line = (
+                f"{row['name']:<20} {row['before']:9.2f} -> {row['after']:9.2f} ms "
+                f"({row['change']:+.0%}), queries "
+                f"{row['queries_before']} -> {row['queries_after']}"
+            )
+            if max_regression is not None and row["change"] > max_regression:
+                regressions.append(row["name"])
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if regressions:
+            raise CommandError(f"Slower than the baseline: {', '.join(regressions)}")
@@ -0,0 +1,40 @@
+"""Write a columnar snapshot of all rows governed by a MetaSchema."""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.columnar import SNAPSHOT_FORMATS, write_snapshot
+from core.models import MetaSchema
+
+
+class Command(BaseCommand):
+    """Export the rows of one MetaSchema to a Parquet or Arrow file"""
+
+    help = "Write the rows of a MetaSchema as typed columns to a Parquet/Arrow file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("schema", type=int, help="MetaSchema primary key")
+        parser.add_argument("output", help="Path of the file to write")
+        parser.add_argument(
+            "--format", choices=SNAPSHOT_FORMATS, default="parquet", dest="file_format"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=None, help="Rows per record batch"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            metaschema = MetaSchema.objects.get(pk=options["schema"])
+        except MetaSchema.DoesNotExist as e:
+            raise CommandError(f"MetaSchema {options['schema']} does not exist") from e
+
+        with open(options["output"], "wb") as sink:
+            rows = write_snapshot(
+                metaschema,
+                sink,
+                file_format=options["file_format"],
+                chunk_size=options["chunk_size"],
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {rows} rows to {options['output']}")
+        )
@@ -0,0 +1,56 @@
+"""Fill the database with a synthetic dataset."""
+
+from dataclasses import fields
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.datasets import DatasetGenerator, DatasetSpec
+
+
+class Command(BaseCommand):
+    """Generate projects, schemas, entities, batches, samples and results"""
+
+    help = (
+        "Bulk insert a synthetic dataset: projects, versioned metaschemas, "
+        "entities, batches with preparations, plates of samples, analyses and "
+        "results. --scale multiplies every row count except projects and schemas."
+    )
+
+    def add_arguments(self, parser):
+        for spec_field in fields(DatasetSpec):
+            parser.add_argument(
+                f"--{spec_field.name.replace('_', '-')}",
+                type=int,
+                default=spec_field.default,
+            )
+        parser.add_argument("--scale", type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        values = {f.name: options[f.name] for f in fields(DatasetSpec)}
+        if any(value < 0 for value in values.values()):
+            raise CommandError("Sizes must not be negative")
+        if options["scale"] != 1:
+            for name in ("entities", "batches", "analyses"):
+                values[name] = max(round(values[name] * options["scale"]), 1)
+        spec = DatasetSpec(**values)
+        if spec.chunk_size < 1:
+            raise CommandError("--chunk-size must be positive")
+        if spec.schema_versions < 1:
+            raise CommandError("--schema-versions must be positive")
+        if spec.results and not spec.analyses:
+            raise CommandError("Results need at least one analysis")
+
+        self.stdout.write(
+            f"Generating {spec.entities} entities, {spec.batches} batches, "
+            f"{spec.samples} samples, {spec.analyses} analyses and "
+            f"{spec.results} results"
+        )
+        counts = DatasetGenerator(spec, progress=self._progress).run()
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Created " + ", ".join(f"{n} {name}" for name, n in counts.items())
+            )
+        )
+
+    def _progress(self, model, done, total):
+        self.stdout.write(f"  {model._meta.verbose_name_plural}: {done}/{total}")
@@ -0,0 +1,116 @@
+"""Move rows from one MetaSchema version to another."""
+
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import MetaSchema, SchemaMigration
+from core.schema_migration import RunLost, claim_run, queue_resume, run_schema_migration
+
+
+class Command(BaseCommand):
+    """Revalidate and rewrite the rows of a schema as another schema version"""
+
+    help = (
+        "Transform and revalidate all rows of a source MetaSchema against a target "
+        "MetaSchema and rewrite them in chunks. Use --resume to continue a failed "
+        "run. Without arguments, work through the runs queued with the API; runs "
+        "until stopped unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", type=int, nargs="?", help="Source MetaSchema pk")
+        parser.add_argument("target", type=int, nargs="?", help="Target MetaSchema pk")
+        parser.add_argument(
+            "--transform",
+            default="",
+            help="Registered transform name or dotted path of a blob -> blob callable",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+        parser.add_argument("--resume", type=int, help="Resume the run with this id")
+        parser.add_argument(
+            "--once", action="store_true", help="Exit when the queue is empty"
+        )
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument("--poll", type=float, default=None)
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        if options["resume"]:
+            try:
+                run = SchemaMigration.objects.get(pk=options["resume"])
+            except SchemaMigration.DoesNotExist as e:
+                raise CommandError(f"Run {options['resume']} does not exist") from e
+            if run.status == SchemaMigration.Status.COMPLETED:
+                raise CommandError(f"Run {run.pk} is already completed")
+            queue_resume(run)
+            self.claim_and_run(worker, options, pk=run.pk, required=True)
+        elif options["source"] is not None or options["target"] is not None:
+            if options["source"] is None or options["target"] is None:
+                raise CommandError("Give source and target, or --resume")
+            try:
+                source = MetaSchema.objects.get(pk=options["source"])
+                target = MetaSchema.objects.get(pk=options["target"])
+            except MetaSchema.DoesNotExist as e:
+                raise CommandError(str(e)) from e
+            if source.type != target.type:
+                raise CommandError("Source and target must be of the same schema type")
+            run = SchemaMigration.objects.create(
+                source=source,
+                target=target,
+                transform=options["transform"],
+                dry_run=options["dry_run"],
+            )
+            self.claim_and_run(worker, options, pk=run.pk, required=True)
+        else:
+            poll = options["poll"] or getattr(
+                settings, "SCHEMA_MIGRATION_POLL_SECONDS", 2
+            )
+            while True:
+                if not self.claim_and_run(worker, options):
+                    if options["once"]:
+                        return
+                    time.sleep(poll)
+
+    def claim_and_run(self, worker, options, pk=None, required=False):
+        """Claim a run and execute it; returns whether one was claimed"""
+        run = claim_run(worker, pk=pk)
+        if run is None:
+            if required:
+                raise CommandError(f"Run {pk} is already being run by another worker")
+            return False
+
+        self.stdout.write(f"Running schema migration {run.pk}")
+        try:
+            run_schema_migration(
+                run,
+                workers=options["workers"],
+                chunk_size=options["chunk_size"],
+                progress=self.report,
+            )
+        except RunLost as e:
+            self.stderr.write(str(e))
+            return True
+        except Exception as e:
+            if required:
+                raise CommandError(f"Run {run.pk} failed: {e}") from e
+            self.stderr.write(f"Run {run.pk} failed: {e}")
+            return True
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Run {run.pk}: {run.migrated} migrated, {run.failed} failed"
+                f"{' (dry run)' if run.dry_run else ''}"
+            )
+        )
+        return True
+
+    def report(self, run):
+        """Print progress after each chunk"""
+        self.stdout.write(
+            f"  {run.processed}/{run.total} rows, {run.failed} failed, "
+            f"checkpoint pk {run.last_pk}"
+        )
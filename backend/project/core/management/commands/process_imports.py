@@ -0,0 +1,61 @@
+"""Work through the queue of uploaded instrument files."""
+
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.imports import JobLost, claim_job, run_import
+
+
+class Command(BaseCommand):
+    """Import queued instrument files as samples or results"""
+
+    help = (
+        "Claim pending import jobs, and running jobs whose worker stopped, and "
+        "import them chunk by chunk. Runs until stopped unless --once is given. "
+        "Start several workers to import several files at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Exit when the queue is empty"
+        )
+        parser.add_argument("--job", type=int, help="Only process the job with this id")
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument("--poll", type=float, default=None)
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        poll = options["poll"] or getattr(settings, "IMPORT_POLL_SECONDS", 2)
+        while True:
+            job = claim_job(worker, pk=options["job"])
+            if job is None:
+                if options["once"] or options["job"]:
+                    return
+                time.sleep(poll)
+                continue
+
+            self.stdout.write(f"Importing job {job.pk} from row {job.last_row + 1}")
+            try:
+                run_import(job, chunk_size=options["chunk_size"], progress=self.report)
+            except JobLost as e:
+                self.stderr.write(str(e))
+                continue
+            except Exception as e:
+                self.stderr.write(f"Job {job.pk} failed: {e}")
+                continue
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Job {job.pk}: {job.imported} imported, {job.failed} failed"
+                )
+            )
+
+    def report(self, job):
+        """Print progress after each chunk"""
+        self.stdout.write(
+            f"  {job.processed}/{job.total} rows, {job.failed} failed, "
+            f"checkpoint row {job.last_row}"
+        )
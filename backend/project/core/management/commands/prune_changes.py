@@ -0,0 +1,35 @@
+"""Delete old entries of the change feed."""
+
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.changes import prune_changes
+
+
+class Command(BaseCommand):
+    """Delete change feed entries older than the retention period"""
+
+    help = (
+        "Delete change feed entries older than CHANGE_FEED_RETENTION_DAYS, or "
+        "--days. Run it periodically, e.g. daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "CHANGE_FEED_RETENTION_DAYS", 30),
+        )
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if options["days"] < 0:
+            raise CommandError("--days must not be negative")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        before = timezone.now() - datetime.timedelta(days=options["days"])
+        deleted = prune_changes(before, batch_size=options["batch_size"])
+        self.stdout.write(f"Deleted {deleted} change feed entries")
@@ -0,0 +1,21 @@
+"""Rebuild the full-text search index."""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.search import SEARCH_MODELS, rebuild
+
+
+class Command(BaseCommand):
+    """Reindex the JSON strings of every searchable object"""
+
+    help = (
+        "Recreate the search documents of all entities, samples, analyses and "
+        "results, e.g. after rows were written without signals."
+    )
+
+    def handle(self, *args, **options):
+        for model, _ in SEARCH_MODELS.values():
+            with transaction.atomic():
+                count = rebuild(model)
+            self.stdout.write(f"Indexed {count} {model._meta.verbose_name_plural}")
@@ -0,0 +1,38 @@
+"""Recompute or check the Batch and Analysis summaries."""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.summaries import SUMMARIES, rebuild, verify
+
+
+class Command(BaseCommand):
+    """Rebuild the denormalized summaries from the rows, or verify them"""
+
+    help = (
+        "Recompute sample and result counts of every batch and analysis. With "
+        "--verify, only report summaries that disagree with the rows and fail "
+        "if there are any."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            problems = 0
+            for model in SUMMARIES:
+                for pk, field, stored, expected in verify(model):
+                    problems += 1
+                    self.stdout.write(
+                        f"{model.__name__} {pk}: {field} is {stored}, expected {expected}"
+                    )
+            if problems:
+                raise CommandError(f"{problems} summary values are wrong")
+            self.stdout.write(self.style.SUCCESS("All summaries are correct"))
+            return
+
+        for model in SUMMARIES:
+            with transaction.atomic():
+                count = rebuild(model)
+            self.stdout.write(f"Rebuilt {count} {model._meta.verbose_name} summaries")
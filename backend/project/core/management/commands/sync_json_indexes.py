@@ -0,0 +1,31 @@
+"""Create and drop the JSON path indexes declared by MetaSchemas."""
+
+from django.core.management.base import BaseCommand
+
+from core.indexes import index_targets, sync_json_indexes
+
+
+class Command(BaseCommand):
+    """Create missing and drop stale JSON path indexes"""
+
+    help = (
+        "Sync JSON path indexes with MetaSchema.indexed_paths after they changed, "
+        "or after a migration rebuilt a table; on SQLite, migrate does the "
+        "latter itself. Saving a MetaSchema does not touch "
+        "the indexes; nothing is run when they already match."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only print the statements"
+        )
+
+    def handle(self, *args, **options):
+        for model, field in index_targets():
+            statements = sync_json_indexes(model, field, dry_run=options["dry_run"])
+            for statement in statements:
+                self.stdout.write(f"  {statement}")
+            self.stdout.write(
+                f"{model._meta.label}: {len(statements)} statements"
+                f"{' (dry run)' if options['dry_run'] else ''}"
+            )
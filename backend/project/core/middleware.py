@@ -0,0 +1,95 @@
+"""Middleware for the core app."""
+
+import contextlib
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .instrumentation import PHASES, end_request, metrics, start_request
+
+logger = logging.getLogger("core.requests")
+
+
+class RequestTimingMiddleware:
+    """
+    Times SQL, jsonschema validation and serialization for every request.
+
+    The numbers go out as a Server-Timing header and into the per-endpoint
+    histograms served at /metrics. Requests slower than
+    SLOW_REQUEST_THRESHOLD seconds are logged with their SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = getattr(settings, "SLOW_REQUEST_THRESHOLD", None)
+        timings, token = start_request(capture_sql=threshold is not None)
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings.execute_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            end_request(token)
+        total = time.perf_counter() - start
+
+        size = None
+        if not response.streaming:
+            size = len(response.content)
+        elif response.has_header("Content-Length"):
+            size = int(response["Content-Length"])
+
+        entries = [f'db;dur={timings.sql * 1000:.1f};desc="{timings.queries} queries"']
+        entries += [
+            f"{phase};dur={timings.phases[phase] * 1000:.1f}" for phase in PHASES
+        ]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        if size is not None:
+            entries.append(f'size;desc="{size} bytes"')
+        response["Server-Timing"] = ", ".join(entries)
+
+        match = request.resolver_match
+        values = {
+            "core_request_duration_seconds": total,
+            "core_request_queries": timings.queries,
+            "core_request_sql_seconds": timings.sql,
+            "core_request_validation_seconds": timings.phases["validation"],
+            "core_request_serialization_seconds": timings.phases["serialization"],
+        }
+        if size is not None:
+            values["core_response_size_bytes"] = size
+        metrics.observe(
+            {
+                "endpoint": match.view_name if match else "unmatched",
+                "method": request.method,
+            },
+            values,
+        )
+
+        if threshold is not None and total >= threshold:
+            self.log_slow_request(request, response, timings, total)
+        return response
+
+    def log_slow_request(self, request, response, timings, total):
+        """Log a slow request with the statements it ran, slowest first"""
+        max_statements = getattr(settings, "SLOW_REQUEST_MAX_STATEMENTS", 100)
+        statements = sorted(timings.statements, key=lambda s: s[1], reverse=True)
+        logger.warning(
+            "Slow request %s %s (%s): %.1f ms, %d queries in %.1f ms\n%s",
+            request.method,
+            request.get_full_path(),
+            response.status_code,
+            total * 1000,
+            timings.queries,
+            timings.sql * 1000,
+            "\n".join(
+                f"{elapsed * 1000:8.1f} ms  {sql}"
+                for sql, elapsed in statements[:max_statements]
+            ),
+        )
@@ -0,0 +1,107 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Material",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("metadata", models.JSONField()),
+            ],
+        ),
+        migrations.RenameField(
+            model_name="batch",
+            old_name="entities",
+            new_name="preparations",
+        ),
+        migrations.AlterField(
+            model_name="metaschema",
+            name="type",
+            field=models.IntegerField(
+                choices=[
+                    (1, "Entity"),
+                    (2, "Batch"),
+                    (3, "Sample"),
+                    (4, "Result"),
+                    (5, "Analysis"),
+                    (6, "Material"),
+                ]
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="analysis",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="core_analysis_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="batch",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="core_batch_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="entity",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="core_entity_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="core_result_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sample",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="core_sample_created_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="material",
+            name="entity",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="materials",
+                to="core.entity",
+            ),
+        ),
+        migrations.AddField(
+            model_name="material",
+            name="projects",
+            field=models.ManyToManyField(related_name="materials", to="core.project"),
+        ),
+        migrations.AddField(
+            model_name="material",
+            name="schema",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT, to="core.metaschema"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="material",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="core_material_created_idx"
+            ),
+        ),
+    ]
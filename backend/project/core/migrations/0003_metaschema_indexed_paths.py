@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_material_rename_entities_batch_preparations_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="metaschema",
+            name="indexed_paths",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text="JSON paths (e.g. strain, culture__od) to index for filtering",
+            ),
+        ),
+    ]
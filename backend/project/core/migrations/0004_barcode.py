@@ -0,0 +1,84 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:07
+
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+BARCODE_PREFIXES = {
+    "material": "M",
+    "batch": "B",
+    "sample": "S",
+    "analysis": "A",
+    "result": "R",
+}
+
+
+def fill_barcodes(apps, schema_editor):
+    """Store barcodes of existing rows"""
+    for model_name, prefix in BARCODE_PREFIXES.items():
+        apps.get_model("core", model_name).objects.update(
+            barcode=Concat(Value(prefix), Cast("id", CharField()))
+        )
+
+    Entity = apps.get_model("core", "Entity")
+    entities = []
+    for entity in Entity.objects.only("id", "metadata").iterator(chunk_size=2000):
+        entity.barcode = f"{entity.metadata.get('prefix', 'XX')}{entity.id}"
+        entities.append(entity)
+        if len(entities) >= 2000:
+            Entity.objects.bulk_update(entities, ["barcode"])
+            entities = []
+    Entity.objects.bulk_update(entities, ["barcode"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_metaschema_indexed_paths"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysis",
+            name="barcode",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=64
+            ),
+        ),
+        migrations.AddField(
+            model_name="batch",
+            name="barcode",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=64
+            ),
+        ),
+        migrations.AddField(
+            model_name="entity",
+            name="barcode",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=64
+            ),
+        ),
+        migrations.AddField(
+            model_name="material",
+            name="barcode",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=64
+            ),
+        ),
+        migrations.AddField(
+            model_name="result",
+            name="barcode",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=64
+            ),
+        ),
+        migrations.AddField(
+            model_name="sample",
+            name="barcode",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=64
+            ),
+        ),
+        migrations.RunPython(fill_barcodes, migrations.RunPython.noop),
+    ]
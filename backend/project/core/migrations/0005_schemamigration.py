@@ -0,0 +1,80 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_barcode"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SchemaMigration",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "transform",
+                    models.CharField(
+                        blank=True,
+                        help_text="Dotted path of a blob -> blob callable",
+                        max_length=200,
+                    ),
+                ),
+                ("dry_run", models.BooleanField(default=False)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("completed", "Completed"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "last_pk",
+                    models.BigIntegerField(
+                        default=0, help_text="Checkpoint for resuming"
+                    ),
+                ),
+                ("total", models.PositiveBigIntegerField(default=0)),
+                ("processed", models.PositiveBigIntegerField(default=0)),
+                ("migrated", models.PositiveBigIntegerField(default=0)),
+                ("failed", models.PositiveBigIntegerField(default=0)),
+                ("errors", models.JSONField(blank=True, default=list)),
+                (
+                    "source",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="migrations_from",
+                        to="core.metaschema",
+                    ),
+                ),
+                (
+                    "target",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="migrations_to",
+                        to="core.metaschema",
+                    ),
+                ),
+            ],
+        ),
+    ]
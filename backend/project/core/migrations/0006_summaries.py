@@ -0,0 +1,93 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def _counts(model, lookup):
+    return {
+        pk: (count, last)
+        for pk, count, last in model.objects.order_by()
+        .values(lookup)
+        .annotate(count=Count("pk"), last=Max("updated_at"))
+        .values_list(lookup, "count", "last")
+    }
+
+
+def fill_summaries(apps, schema_editor):
+    """Summarize existing batches and analyses"""
+    Sample = apps.get_model("core", "Sample")
+    Result = apps.get_model("core", "Result")
+    owners = (
+        (
+            "Batch",
+            "BatchSummary",
+            {
+                "sample_count": (Sample, "batch"),
+                "result_count": (Result, "sample__batch"),
+            },
+        ),
+        ("Analysis", "AnalysisSummary", {"result_count": (Result, "analysis")}),
+    )
+    for owner, summary, counts in owners:
+        Summary = apps.get_model("core", summary)
+        counted = {field: _counts(*spec) for field, spec in counts.items()}
+        summaries = []
+        for pk, updated_at in apps.get_model("core", owner).objects.values_list(
+            "pk", "updated_at"
+        ):
+            fields = {"last_activity_at": updated_at}
+            for field, values in counted.items():
+                count, last = values.get(pk, (0, None))
+                fields[field] = count
+                if last is not None:
+                    fields["last_activity_at"] = max(fields["last_activity_at"], last)
+            summaries.append(Summary(pk=pk, **fields))
+        Summary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_schemamigration"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnalysisSummary",
+            fields=[
+                (
+                    "analysis",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="core.analysis",
+                    ),
+                ),
+                ("result_count", models.IntegerField(default=0)),
+                ("last_activity_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="BatchSummary",
+            fields=[
+                (
+                    "batch",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="core.batch",
+                    ),
+                ),
+                ("sample_count", models.IntegerField(default=0)),
+                ("result_count", models.IntegerField(default=0)),
+                ("last_activity_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_summaries"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Change",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=20)),
+                ("object_id", models.BigIntegerField()),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[("upsert", "Upsert"), ("delete", "Delete")],
+                        max_length=6,
+                    ),
+                ),
+                ("changed_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="analysis",
+            index=models.Index(
+                fields=["updated_at", "id"], name="core_analysis_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="batch",
+            index=models.Index(
+                fields=["updated_at", "id"], name="core_batch_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="entity",
+            index=models.Index(
+                fields=["updated_at", "id"], name="core_entity_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="material",
+            index=models.Index(
+                fields=["updated_at", "id"], name="core_material_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(
+                fields=["updated_at", "id"], name="core_result_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sample",
+            index=models.Index(
+                fields=["updated_at", "id"], name="core_sample_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(fields=["model", "id"], name="core_change_model_idx"),
+        ),
+    ]
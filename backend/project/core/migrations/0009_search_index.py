@@ -0,0 +1,139 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = "core_searchdocument_fts"
+
+SQLITE_STATEMENTS = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(text, "
+    "content='core_searchdocument', content_rowid='id', prefix='2 3', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER core_search_ai AFTER INSERT ON core_searchdocument BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER core_search_ad AFTER DELETE ON core_searchdocument BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER core_search_au AFTER UPDATE ON core_searchdocument BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END",
+]
+
+SQLITE_DROP_STATEMENTS = [
+    "DROP TRIGGER IF EXISTS core_search_ai",
+    "DROP TRIGGER IF EXISTS core_search_ad",
+    "DROP TRIGGER IF EXISTS core_search_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+# Indexed models and their JSONField
+INDEXED = {
+    "entity": ("Entity", "metadata"),
+    "sample": ("Sample", "metadata"),
+    "analysis": ("Analysis", "metadata"),
+    "result": ("Result", "data"),
+}
+
+
+def _gin_index():
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return GinIndex(SearchVector("text", config="simple"), name="core_search_text_gin")
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def create_search_index(apps, schema_editor):
+    """Create the full-text index and fill it from the existing rows"""
+    SearchDocument = apps.get_model("core", "SearchDocument")
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in SQLITE_STATEMENTS:
+            schema_editor.execute(statement)
+    elif schema_editor.connection.vendor == "postgresql":
+        schema_editor.add_index(SearchDocument, _gin_index())
+
+    for name, (model_name, field) in INDEXED.items():
+        rows = apps.get_model("core", model_name).objects.values_list(
+            "pk", "schema_id", "barcode", field
+        )
+        documents = []
+        for pk, schema_id, barcode, blob in rows.iterator(chunk_size=1000):
+            documents.append(
+                SearchDocument(
+                    model=name,
+                    object_id=pk,
+                    schema_id=schema_id,
+                    barcode=barcode,
+                    text="\n".join([barcode, *_strings(blob)]),
+                )
+            )
+            if len(documents) == 1000:
+                SearchDocument.objects.bulk_create(documents)
+                documents = []
+        SearchDocument.objects.bulk_create(documents)
+
+
+def drop_search_index(apps, schema_editor):
+    """Drop the full-text index"""
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in SQLITE_DROP_STATEMENTS:
+            schema_editor.execute(statement)
+    elif schema_editor.connection.vendor == "postgresql":
+        schema_editor.remove_index(
+            apps.get_model("core", "SearchDocument"), _gin_index()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_importjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=20)),
+                ("object_id", models.BigIntegerField()),
+                ("barcode", models.CharField(blank=True, max_length=64)),
+                ("text", models.TextField(blank=True)),
+                (
+                    "schema",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="core.metaschema",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("model", "object_id"), name="core_search_object_uniq"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BinaryArray",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("name", models.CharField(max_length=100)),
+                ("file", models.FileField(upload_to="arrays/%Y/%m/")),
+                (
+                    "dtype",
+                    models.CharField(help_text="NumPy dtype, e.g. <f8", max_length=8),
+                ),
+                ("shape", models.JSONField()),
+                (
+                    "offset",
+                    models.PositiveIntegerField(help_text="Byte offset of the data"),
+                ),
+                (
+                    "analysis",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="arrays",
+                        to="core.analysis",
+                    ),
+                ),
+                (
+                    "result",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="arrays",
+                        to="core.result",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.CheckConstraint(
+                        condition=models.Q(
+                            models.Q(
+                                ("analysis__isnull", False), ("result__isnull", True)
+                            ),
+                            models.Q(
+                                ("analysis__isnull", True), ("result__isnull", False)
+                            ),
+                            _connector="OR",
+                        ),
+                        name="core_array_one_owner",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("analysis__isnull", False)),
+                        fields=("analysis", "name"),
+                        name="core_array_analysis_name_uniq",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("result__isnull", False)),
+                        fields=("result", "name"),
+                        name="core_array_result_name_uniq",
+                    ),
+                ],
+            },
+        ),
+    ]
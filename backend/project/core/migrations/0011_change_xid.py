@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_binaryarray"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="change",
+            name="xid",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
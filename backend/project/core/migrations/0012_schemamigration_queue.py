@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_change_xid"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="schemamigration",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="schemamigration",
+            name="message",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="schemamigration",
+            name="worker",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name="schemamigration",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("running", "Running"),
+                    ("completed", "Completed"),
+                    ("failed", "Failed"),
+                ],
+                db_index=True,
+                default="pending",
+                max_length=10,
+            ),
+        ),
+    ]
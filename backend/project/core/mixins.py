@@ -0,0 +1,393 @@
+"""Reusable viewset mixins for the core app."""
+
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, F, Max, Prefetch
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+
+from .bulk import bulk_assign_projects, bulk_ingest, bulk_patch
+from .cache import get_cached_response, get_generation, set_cached_response
+from .fastpath import read_plan
+from .instrumentation import timed
+from .lineage import DEFAULT_FIELDS, DIRECTIONS, build_lineage
+from .parsers import NDJSONParser
+from .serializers import (
+    SPARSE_ACTIONS,
+    JSONPatchSerializer,
+    ProjectAssignmentSerializer,
+)
+
+
+def get_int(request, name, default=None):
+    """Read an integer query parameter"""
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError as e:
+        raise ValidationError({name: "Must be an integer."}) from e
+
+
+def get_positive_int(request, name, default):
+    """Read a positive integer query parameter"""
+    value = get_int(request, name, default)
+    if value is not None and value < 1:
+        raise ValidationError({name: "Must be positive."})
+    return value
+
+
+class BulkCreateMixin:
+    """
+    Adds a `bulk` action accepting a JSON array or NDJSON body.
+
+    Every row is validated on its own; valid rows are inserted with bulk_create
+    in one transaction and failed rows are reported by index. Pass
+    `?dry_run=true` to only validate and `?batch_size=` to tune insert batches.
+    """
+
+    @action(detail=False, methods=["post"], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Validate and create many objects at once.
+        """
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError("Expected a JSON array or NDJSON body.")
+
+        max_rows = getattr(settings, "BULK_MAX_ROWS", 10000)
+        if len(rows) > max_rows:
+            raise ValidationError(f"At most {max_rows} rows per request.")
+
+        batch_size = get_positive_int(
+            request, "batch_size", getattr(settings, "BULK_CREATE_BATCH_SIZE", 500)
+        )
+        dry_run = request.query_params.get("dry_run", "").lower() in ("1", "true")
+
+        result = bulk_ingest(
+            self.get_serializer_class(),
+            rows,
+            context=self.get_serializer_context(),
+            batch_size=batch_size,
+            dry_run=dry_run,
+        )
+
+        payload = {
+            "created": len(result.created),
+            "ids": [instance.pk for instance in result.created],
+            "failed": result.failed,
+        }
+        if dry_run:
+            payload["valid"] = result.valid
+            response_status = status.HTTP_200_OK
+        elif result.failed and not result.created:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response(payload, status=response_status)
+
+
+class BulkPatchMixin:
+    """
+    Adds a `bulk-patch` action applying RFC 6902 JSON Patch operations to the
+    JSON blob of many objects, posted as `{"ids": [...], "patch": [...]}`.
+
+    Only test, add, replace and remove are supported, and add only appends to
+    arrays with `-` instead of inserting at an index. An object a change
+    cannot apply to, e.g. a replace of a missing member, fails.
+
+    Without ids the objects are chosen by the list filters in the query
+    string. Patches run in the database; only patched rows are revalidated
+    and nothing is written if any of them fails. Leading `test` operations
+    select the objects to patch. Pass `?dry_run=true` to only validate.
+    """
+
+    # JSONField the patch applies to
+    patch_field = "metadata"
+
+    @action(detail=False, methods=["patch"], url_path="bulk-patch")
+    def bulk_patch(self, request):
+        """
+        Patch the JSON blob of many objects at once.
+        """
+        serializer = JSONPatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data.get("ids")
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if ids is not None:
+            queryset = queryset.filter(pk__in=ids)
+        elif queryset.query.where == self.queryset.all().query.where:
+            # Parameters no filter consumed (page_size, format, ...) select
+            # nothing, so they must not patch every row
+            raise ValidationError("Give ids or filter the objects to patch.")
+        max_rows = getattr(settings, "BULK_MAX_ROWS", 10000)
+        pks = list(queryset.order_by().values_list("pk", flat=True)[: max_rows + 1])
+        if len(pks) > max_rows:
+            raise ValidationError(f"At most {max_rows} objects per request.")
+
+        dry_run = request.query_params.get("dry_run", "").lower() in ("1", "true")
+        result = bulk_patch(
+            queryset.model,
+            pks,
+            self.patch_field,
+            serializer.validated_data["patch"],
+            batch_size=get_positive_int(
+                request, "batch_size", getattr(settings, "BULK_CREATE_BATCH_SIZE", 500)
+            ),
+            dry_run=dry_run,
+        )
+        return Response(
+            {
+                "patched": len(result.patched),
+                "ids": result.patched,
+                "skipped": result.skipped,
+                "failed": result.failed,
+            },
+            status=(
+                status.HTTP_400_BAD_REQUEST if result.failed else status.HTTP_200_OK
+            ),
+        )
+
+
+class BulkProjectsMixin:
+    """
+    Adds a `projects` action adding and removing projects of many objects at
+    once, posted as `{"ids": [...], "add": [...], "remove": [...]}`.
+    """
+
+    @action(detail=False, methods=["post"], url_path="projects")
+    def assign_projects(self, request):
+        """
+        Add projects to and remove projects from the listed objects.
+        """
+        model = self.get_queryset().model
+        serializer = ProjectAssignmentSerializer(
+            data=request.data, context={"model": model}
+        )
+        serializer.is_valid(raise_exception=True)
+        added, removed = bulk_assign_projects(
+            model,
+            serializer.validated_data["ids"],
+            add=serializer.validated_data["add"],
+            remove=serializer.validated_data["remove"],
+            batch_size=getattr(settings, "BULK_CREATE_BATCH_SIZE", 500),
+        )
+        return Response({"added": added, "removed": removed})
+
+
+class LineageMixin:
+    """
+    Adds a `lineage` detail action returning the Entity -> Batch -> Sample ->
+    Result graph around an object as compact nodes and edges.
+
+    Query parameters: `direction` (downstream or upstream), `depth` (levels to
+    follow) and `fields` (comma separated columns to include on each node).
+    """
+
+    @action(detail=True, methods=["get"])
+    def lineage(self, request, pk=None):
+        """
+        Return the downstream or upstream lineage of this object.
+        """
+        direction = request.query_params.get("direction", "downstream")
+        if direction not in DIRECTIONS:
+            raise ValidationError({"direction": f"Expected one of {DIRECTIONS}."})
+        depth = get_positive_int(request, "depth", None)
+        fields = request.query_params.get("fields")
+        fields = fields.split(",") if fields else DEFAULT_FIELDS
+
+        return Response(
+            build_lineage(
+                self.get_object(), direction=direction, depth=depth, fields=fields
+            )
+        )
+
+
+def _select_related_paths(select_related, prefix=""):
+    for name, nested in select_related.items():
+        yield f"{prefix}{name}"
+        yield from _select_related_paths(nested, f"{prefix}{name}__")
+
+
+class SparseQuerysetMixin:
+    """
+    Pushes `?fields=`/`?exclude=` down to the queryset on list and retrieve.
+
+    Columns of dropped fields are deferred, so large JSON blobs are neither
+    read nor decoded, and joins or prefetches only they needed are skipped.
+    """
+
+    def sparse_fields(self):
+        """Return the names of the fields to render, or None for all of them"""
+        params = self.request.query_params
+        if self.action not in SPARSE_ACTIONS or not (
+            params.get("fields") or params.get("exclude")
+        ):
+            return None
+        return set(self.get_serializer().fields)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.sparse_fields()
+        if fields is None:
+            return queryset
+
+        ordering = getattr(self.paginator, "ordering", ())
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        needed = fields | {name.lstrip("-") for name in ordering}
+        needed |= {
+            field.source.split(".")[0]
+            for field in self.get_serializer().fields.values()
+        }
+
+        if isinstance(queryset.query.select_related, dict):
+            joins = [
+                path
+                for path in _select_related_paths(queryset.query.select_related)
+                if path.split("__")[0] in needed
+            ]
+            queryset = queryset.select_related(None)
+            if joins:
+                queryset = queryset.select_related(*joins)
+            needed |= {path.split("__")[0] for path in joins}
+
+        lookups = [
+            lookup
+            for lookup in queryset._prefetch_related_lookups
+            if (lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup).split(
+                "__"
+            )[0]
+            in needed
+        ]
+        queryset = queryset.prefetch_related(None).prefetch_related(*lookups)
+
+        return queryset.defer(
+            *(
+                f.name
+                for f in queryset.model._meta.concrete_fields
+                if not f.primary_key and f.name not in needed
+            )
+        )
+
+
+class FastListMixin:
+    """
+    Serves list from QuerySet.values() through a precomputed ReadPlan instead
+    of model instances and the serializer, with identical output.
+
+    Enabled by the FAST_READ_PATH setting; serializers the plan cannot
+    reproduce use the regular list.
+    """
+
+    def list(self, request, *args, **kwargs):
+        plan = (
+            read_plan(self.get_serializer_class())
+            if getattr(settings, "FAST_READ_PATH", False)
+            else None
+        )
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        fields = getattr(self, "sparse_fields", lambda: None)()
+        if fields is not None:
+            plan = plan.select(fields)
+
+        ordering = getattr(self.paginator, "ordering", ())
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        rows = plan.values(self.filter_queryset(self.get_queryset()), ordering)
+
+        page = self.paginate_queryset(rows)
+        with timed("serialization"):
+            data = plan.render(list(rows) if page is None else page)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class ConditionalGetMixin:
+    """
+    Adds weak ETag/Last-Modified handling and a response cache to list and
+    retrieve.
+
+    List ETags derive from the count and max(updated_at) of the filtered
+    queryset, detail ETags from the object's updated_at; both include the
+    model's generation counter, bumped on every write. Matching
+    If-None-Match/If-Modified-Since requests get a 304 before anything is
+    serialized, and other responses are served from the cache when possible.
+    """
+
+    # When a row last changed, for viewsets whose output includes other tables
+    last_modified = F("updated_at")
+
+    def _etag(self, *parts):
+        request = self.request
+        parts = (
+            self.get_queryset().model._meta.label,
+            get_generation(self.get_queryset().model),
+            request.get_full_path(),
+            request.accepted_media_type,
+            *parts,
+        )
+        digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()
+        return f'W/"{digest}"'
+
+    def _conditional(self, etag, last_modified, render):
+        """Return a 304, a cached response or a freshly rendered one"""
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        not_modified = get_conditional_response(
+            self.request, etag=etag, last_modified=timestamp
+        )
+        if not_modified is not None:
+            return not_modified
+
+        cache_key = f"core:response:{etag}"
+        data = get_cached_response(cache_key)
+        if data is not None:
+            response = Response(data)
+        else:
+            response = render()
+            if response.status_code == 200:
+                set_cached_response(cache_key, response.data)
+
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+        patch_vary_headers(response, ["Accept"])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        stats = self.filter_queryset(self.get_queryset()).aggregate(
+            count=Count("pk"), last_modified=Max(self.last_modified)
+        )
+        etag = self._etag(stats["count"], stats["last_modified"])
+        return self._conditional(
+            etag,
+            stats["last_modified"],
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        updated_at = (
+            self.filter_queryset(self.get_queryset())
+            .filter(**{self.lookup_field: kwargs[lookup]})
+            .values_list(self.last_modified, flat=True)
+            .first()
+        )
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        return self._conditional(
+            self._etag(updated_at),
+            updated_at,
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
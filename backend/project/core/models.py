@@ -1,6 +1,6 @@
 """Core models for samples and metadata schema"""
 
-from django.db import models
+from django.db import connections, models, router, transaction
 from django.db.models import JSONField
 
 
@@ -33,6 +33,11 @@ class MetaSchema(models.Model):
     type = models.IntegerField(choices=SchemaType)
     version = models.PositiveSmallIntegerField()
     definition = JSONField()
+    indexed_paths = JSONField(
+        default=list,
+        blank=True,
+        help_text="JSON paths (e.g. strain, culture__od) to index for filtering",
+    )
 
     class Meta:
         unique_together = ("title", "type", "version")
@@ -40,8 +45,113 @@ class MetaSchema(models.Model):
     def __str__(self):
         return f"{self.type} v{self.version}"
 
+    @property
+    def target_model(self):
+        """Return the model whose rows are governed by this schema"""
+        return {
+            self.SchemaType.ENTITY: Entity,
+            self.SchemaType.BATCH: Batch,
+            self.SchemaType.SAMPLE: Sample,
+            self.SchemaType.RESULT: Result,
+            self.SchemaType.ANALYSIS: Analysis,
+            self.SchemaType.MATERIAL: Material,
+        }[self.type]
+
+    @property
+    def target_field(self):
+        """Return the name of the JSONField validated by this schema"""
+        return "data" if self.type == self.SchemaType.RESULT else "metadata"
+
+
+class BarcodedModel(models.Model):
+    """Abstract model keeping its barcode in an indexed column"""
+
+    barcode_prefix = None
 
-class Entity(models.Model):
+    barcode = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def get_barcode_prefix(self):
+        """Return the barcode prefix of this object"""
+        return self.barcode_prefix
+
+    def compute_barcode(self):
+        """Return the barcode for the object, `<prefix><id>`"""
+        return f"{self.get_barcode_prefix()}{self.id}"
+
+    def _next_id(self, using):
+        """
+        Allocate the id of a new row from the table's sequence, or return None
+        on databases without one
+        """
+        connection = connections[using]
+        table, column = self._meta.db_table, self._meta.pk.column
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence(%s, %s))", [table, column]
+                )
+                return cursor.fetchone()[0]
+        if (
+            connection.vendor == "sqlite"
+            and connection.features.can_return_columns_from_insert
+        ):
+            # AUTOINCREMENT tables count in sqlite_sequence, which later
+            # inserts continue from
+            quote = connection.ops.quote_name
+            with transaction.atomic(using=using), connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT %s, 0 "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)",
+                    [table, table],
+                )
+                cursor.execute(
+                    "UPDATE sqlite_sequence SET seq = max(seq, (SELECT "
+                    f"coalesce(max({quote(column)}), 0) FROM {quote(table)})) + 1 "
+                    "WHERE name = %s RETURNING seq",
+                    [table],
+                )
+                return cursor.fetchone()[0]
+        return None
+
+    def save(self, *args, **kwargs):
+        """
+        Store the barcode with the row, so post_save receivers see it.
+
+        New rows take their id from the table's sequence first; on databases
+        without one the barcode is written right after the INSERT instead.
+        The row commits together with what post_save receivers write, such
+        as its change feed entry, even under autocommit.
+        """
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            if self.pk is None:
+                self.pk = self._next_id(using)
+                if self.pk is None:
+                    super().save(*args, **kwargs)
+                    self.barcode = self.compute_barcode()
+                    type(self)._base_manager.using(using).filter(pk=self.pk).update(
+                        barcode=self.barcode
+                    )
+                    return
+                kwargs["force_insert"] = True
+
+            self.barcode = self.compute_barcode()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "barcode"}
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def assign_barcodes(cls, instances, batch_size=None):
+        """Store barcodes of instances created with bulk_create"""
+        for instance in instances:
+            instance.barcode = instance.compute_barcode()
+        cls._base_manager.bulk_update(instances, ["barcode"], batch_size=batch_size)
+
+
+class Entity(BarcodedModel):
     """Entity with metadata"""
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -50,20 +160,26 @@ class Entity(models.Model):
     projects = models.ManyToManyField(Project, related_name="entities")
     metadata = JSONField()
 
-    @property
-    def barcode(self):
-        """Return barcode for the entity"""
-        prefix = self.metadata.get("prefix", "XX")
-        return f"{prefix}{self.id}"
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="core_entity_created_idx"),
+            models.Index(fields=["updated_at", "id"], name="core_entity_updated_idx"),
+        ]
+
+    def get_barcode_prefix(self):
+        """Return the barcode prefix stored in the metadata"""
+        return self.metadata.get("prefix", "XX")
 
     def __str__(self):
         prefix = self.metadata.get("prefix", "XX")
         return f"{prefix}{self.id}"
 
 
-class Material(models.Model):
+class Material(BarcodedModel):
     """Material model"""
 
+    barcode_prefix = "M"
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     metadata = JSONField()
@@ -74,19 +190,23 @@ class Material(models.Model):
     schema = models.ForeignKey(MetaSchema, on_delete=models.PROTECT)
     projects = models.ManyToManyField(Project, related_name="materials")
 
-    @property
-    def barcode(self):
-        """Return barcode for the material"""
-        prefix = "M"
-        return f"{prefix}{self.id}"
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"], name="core_material_created_idx"
+            ),
+            models.Index(fields=["updated_at", "id"], name="core_material_updated_idx"),
+        ]
 
     def __str__(self):
         return f"Material {self.id}"
 
 
-class Batch(models.Model):
+class Batch(BarcodedModel):
     """Batch of preparations"""
 
+    barcode_prefix = "B"
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     metadata = JSONField()
@@ -95,19 +215,21 @@ class Batch(models.Model):
     projects = models.ManyToManyField(Project, related_name="batches")
     preparations = models.ManyToManyField(Entity, related_name="batches")
 
-    @property
-    def barcode(self):
-        """Return barcode for the batch"""
-        prefix = "B"
-        return f"{prefix}{self.id}"
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="core_batch_created_idx"),
+            models.Index(fields=["updated_at", "id"], name="core_batch_updated_idx"),
+        ]
 
     def __str__(self):
         return f"Batch {self.id}"
 
 
-class Sample(models.Model):
+class Sample(BarcodedModel):
     """Sample with metadata"""
 
+    barcode_prefix = "S"
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     metadata = JSONField()
@@ -115,19 +237,21 @@ class Sample(models.Model):
     batch = models.ForeignKey(Batch, on_delete=models.PROTECT, related_name="samples")
     schema = models.ForeignKey(MetaSchema, on_delete=models.PROTECT)
 
-    @property
-    def barcode(self):
-        """Return barcode for the sample"""
-        prefix = "S"
-        return f"{prefix}{self.id}"
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="core_sample_created_idx"),
+            models.Index(fields=["updated_at", "id"], name="core_sample_updated_idx"),
+        ]
 
     def __str__(self):
         return f"{self.id} ({self.schema})"
 
 
-class Analysis(models.Model):
+class Analysis(BarcodedModel):
     """Analysis model representing an analytical run (e.g., HPLC SEC for titer quantification)"""
 
+    barcode_prefix = "A"
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     schema = models.ForeignKey(MetaSchema, on_delete=models.PROTECT)
@@ -135,19 +259,23 @@ class Analysis(models.Model):
     projects = models.ManyToManyField(Project, related_name="analyses")
     raw_data_link = models.URLField(blank=True, null=True, help_text="Link to raw data")
 
-    @property
-    def barcode(self):
-        """Return barcode for the analysis"""
-        prefix = "A"
-        return f"{prefix}{self.id}"
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"], name="core_analysis_created_idx"
+            ),
+            models.Index(fields=["updated_at", "id"], name="core_analysis_updated_idx"),
+        ]
 
     def __str__(self):
         return f"Analysis {self.id}"
 
 
-class Result(models.Model):
+class Result(BarcodedModel):
     """Result model linking to both Analysis and Sample, storing specific output data"""
 
+    barcode_prefix = "R"
+
     analysis = models.ForeignKey(
         Analysis, on_delete=models.CASCADE, related_name="results"
     )
@@ -157,11 +285,219 @@ class Result(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    @property
-    def barcode(self):
-        """Return barcode for the result"""
-        prefix = "R"
-        return f"{prefix}{self.id}"
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="core_result_created_idx"),
+            models.Index(fields=["updated_at", "id"], name="core_result_updated_idx"),
+        ]
 
     def __str__(self):
         return f"Result for Sample {self.sample.id}"
+
+
+class BatchSummary(models.Model):
+    """Sample and result counts of a batch, kept up to date by signals"""
+
+    batch = models.OneToOneField(
+        Batch, on_delete=models.CASCADE, primary_key=True, related_name="summary"
+    )
+    sample_count = models.IntegerField(default=0)
+    result_count = models.IntegerField(default=0)
+    last_activity_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Summary of batch {self.batch_id}"
+
+
+class AnalysisSummary(models.Model):
+    """Result count of an analysis, kept up to date by signals"""
+
+    analysis = models.OneToOneField(
+        Analysis, on_delete=models.CASCADE, primary_key=True, related_name="summary"
+    )
+    result_count = models.IntegerField(default=0)
+    last_activity_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Summary of analysis {self.analysis_id}"
+
+
+class Change(models.Model):
+    """
+    Entry of the change feed, written in the transaction of the change.
+
+    Ids are allocated before commit, so the feed only serves ids below a
+    horizon that no open transaction can still fill in.
+    """
+
+    class Action(models.TextChoices):
+        """What happened to the object"""
+
+        UPSERT = "upsert"
+        DELETE = "delete"
+
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=6, choices=Action.choices)
+    changed_at = models.DateTimeField(auto_now_add=True)
+    # Id of the writing transaction on PostgreSQL
+    xid = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["model", "id"], name="core_change_model_idx")]
+
+    def __str__(self):
+        return f"{self.action} {self.model} {self.object_id}"
+
+
+class SchemaMigration(models.Model):
+    """Run moving rows from one MetaSchema version to another, run by a worker"""
+
+    class Status(models.TextChoices):
+        """Run status"""
+
+        PENDING = "pending"
+        RUNNING = "running"
+        COMPLETED = "completed"
+        FAILED = "failed"
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    source = models.ForeignKey(
+        MetaSchema, on_delete=models.PROTECT, related_name="migrations_from"
+    )
+    target = models.ForeignKey(
+        MetaSchema, on_delete=models.PROTECT, related_name="migrations_to"
+    )
+    transform = models.CharField(
+        max_length=200, blank=True, help_text="Dotted path of a blob -> blob callable"
+    )
+    dry_run = models.BooleanField(default=False)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING, db_index=True
+    )
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+
+    last_pk = models.BigIntegerField(default=0, help_text="Checkpoint for resuming")
+    total = models.PositiveBigIntegerField(default=0)
+    processed = models.PositiveBigIntegerField(default=0)
+    migrated = models.PositiveBigIntegerField(default=0)
+    failed = models.PositiveBigIntegerField(default=0)
+    errors = JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Schema migration {self.id} ({self.source_id} -> {self.target_id})"
+
+
+class ImportJob(models.Model):
+    """Uploaded instrument file imported as samples or results by a worker"""
+
+    class Status(models.TextChoices):
+        """Job status"""
+
+        PENDING = "pending"
+        RUNNING = "running"
+        COMPLETED = "completed"
+        FAILED = "failed"
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    file = models.FileField(upload_to="imports/%Y/%m/")
+    schema = models.ForeignKey(MetaSchema, on_delete=models.PROTECT)
+    defaults = JSONField(
+        default=dict,
+        blank=True,
+        help_text='Relations of rows without the column, e.g. {"batch": 3}',
+    )
+    delimiter = models.CharField(max_length=1, default=",")
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING, db_index=True
+    )
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+
+    last_row = models.PositiveBigIntegerField(
+        default=0, help_text="Checkpoint for resuming"
+    )
+    total = models.PositiveBigIntegerField(default=0)
+    processed = models.PositiveBigIntegerField(default=0)
+    imported = models.PositiveBigIntegerField(default=0)
+    failed = models.PositiveBigIntegerField(default=0)
+    errors = JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Import job {self.id} ({self.status})"
+
+
+class SearchDocument(models.Model):
+    """Strings of an object's JSON blob, kept in the full-text search index"""
+
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    schema = models.ForeignKey(MetaSchema, on_delete=models.CASCADE)
+    barcode = models.CharField(max_length=64, blank=True)
+    text = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["model", "object_id"], name="core_search_object_uniq"
+            )
+        ]
+
+    def __str__(self):
+        return f"Search document of {self.model} {self.object_id}"
+
+
+class BinaryArray(models.Model):
+    """Numeric array of an analysis or a result, stored as a .npy file"""
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    analysis = models.ForeignKey(
+        Analysis,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="arrays",
+    )
+    result = models.ForeignKey(
+        Result, on_delete=models.CASCADE, blank=True, null=True, related_name="arrays"
+    )
+    name = models.CharField(max_length=100)
+    file = models.FileField(upload_to="arrays/%Y/%m/")
+    dtype = models.CharField(max_length=8, help_text="NumPy dtype, e.g. <f8")
+    shape = JSONField()
+    offset = models.PositiveIntegerField(help_text="Byte offset of the data")
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(analysis__isnull=False, result__isnull=True)
+                | models.Q(analysis__isnull=True, result__isnull=False),
+                name="core_array_one_owner",
+            ),
+            models.UniqueConstraint(
+                fields=["analysis", "name"],
+                condition=models.Q(analysis__isnull=False),
+                name="core_array_analysis_name_uniq",
+            ),
+            models.UniqueConstraint(
+                fields=["result", "name"],
+                condition=models.Q(result__isnull=False),
+                name="core_array_result_name_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Array {self.name} ({self.dtype} {self.shape})"
@@ -0,0 +1,23 @@
+"""Pagination classes for the core app."""
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_at, id), newest first.
+
+    Backed by the composite (created_at, id) indexes so deep pages cost the
+    same as the first one.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "MAX_PAGE_SIZE", 1000)
+
+
+class IdCursorPagination(CreatedAtCursorPagination):
+    """Keyset pagination on the primary key for models without timestamps."""
+
+    ordering = ("-id",)
@@ -0,0 +1,144 @@
+"""Renderers for the core app."""
+
+import csv
+import datetime
+import io
+import json
+import re
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# orjson writes floats below 1e-4 or from 1e16 up differently from json.dumps
+# (0.00001 for 1e-05, 1e16 for 1e+16). Payloads holding a digit followed by an
+# exponent or a "0.0000" run may contain such a number and are rendered again
+# with the stdlib encoder. The pattern starts with a literal to scan quickly.
+EXPONENT = re.compile(rb"e(?<=[0-9]e)")
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson, producing the same bytes as the stdlib.
+
+    Falls back to the stdlib encoder for indented or ASCII-only output, for
+    values orjson cannot encode (integers over 64 bits, non-string keys) and
+    for floats it formats differently. Datetimes and other
+    non-JSON types go through the DRF encoder. NaN and infinity are the one
+    difference: orjson writes null where strict DRF rendering raises.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if (
+            self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b"0.0000" in ret or EXPONENT.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same javascript-safe escaping of U+2028 and U+2029 as JSONRenderer.
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Renders a list as newline-delimited JSON, one object per line.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        return b"".join(encode_ndjson_line(row) for row in rows)
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Renders a list of flat objects as CSV with a header row.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        if not rows:
+            return b""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(
+                {key: encode_csv_value(value) for key, value in row.items()}
+            )
+        return buffer.getvalue().encode(self.charset)
+
+
+def encode_ndjson_line(row):
+    """Encode one object as a line of NDJSON"""
+    return json.dumps(row, cls=JSONEncoder, ensure_ascii=False).encode() + b"\n"
+
+
+def encode_csv_value(value):
+    """Encode nested values as JSON text so they fit in one CSV cell"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=JSONEncoder, ensure_ascii=False)
+    if isinstance(value, datetime.datetime):
+        return JSONEncoder().default(value)
+    return value
+
+
+class ParquetRenderer(BaseRenderer):
+    """
+    Marks an endpoint as producing Apache Parquet files.
+
+    Views stream the file themselves, so render only handles empty bodies.
+    """
+
+    media_type = "application/vnd.apache.parquet"
+    format = "parquet"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b"" if data is None else json.dumps(data, cls=JSONEncoder).encode()
+
+
+class ArrowRenderer(ParquetRenderer):
+    """
+    Marks an endpoint as producing Arrow IPC files.
+    """
+
+    media_type = "application/vnd.apache.arrow.file"
+    format = "arrow"
+
+
+class NPYRenderer(ParquetRenderer):
+    """
+    Marks an endpoint as producing NumPy .npy files.
+    """
+
+    media_type = "application/x-npy"
+    format = "npy"
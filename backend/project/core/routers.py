@@ -0,0 +1,121 @@
+"""Database routing between the primary and its read replicas."""
+
+import contextvars
+import random
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.viewsets import ViewSetMixin
+
+# Set after a write so the client's next reads go to the primary
+STICKY_COOKIE = "core_read_primary"
+
+SAFE_METHODS = ("GET", "HEAD")
+
+_current = contextvars.ContextVar("core_routing", default=None)
+
+# app_label of the tables behind DatabaseCache backends
+CACHE_APP_LABEL = "django_cache"
+
+
+@dataclass
+class RoutingState:
+    """Where the reads of the request being handled go"""
+
+    replica: str = None
+    wrote: bool = False
+
+
+def current():
+    """Return the routing state of the request being handled, if any"""
+    return _current.get()
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of safe ViewSet requests to a replica.
+
+    Everything else, including reads outside requests, reads inside a
+    transaction and every read after the request wrote, goes to the primary.
+    One replica is picked per request so paginated reads stay consistent.
+    Database cache tables always live on the primary and writing to them does
+    not count as a write of the request.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None:
+            return None
+        if model._meta.app_label == CACHE_APP_LABEL:
+            return DEFAULT_DB_ALIAS
+        if (
+            state.replica is None
+            or state.wrote
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None and model._meta.app_label != CACHE_APP_LABEL:
+            state.wrote = True
+        # Never fall back to the alias an instance was read from.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None if db == DEFAULT_DB_ALIAS else False
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Picks the database of every request for ReplicaRouter.
+
+    GET and HEAD requests to ViewSets read from a random alias of
+    DATABASE_REPLICAS. A request that wrote sets a cookie that keeps the
+    client on the primary for REPLICA_STICKY_SECONDS, so it reads its own
+    writes despite replication lag.
+
+    Clients without a cookie jar, such as instrument and LIMS scripts, get
+    no such guarantee: their reads right after a write may hit a replica
+    that has not caught up. They can send `Cookie: core_read_primary=1` on
+    reads that must see their writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState()
+        token = _current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        if state.wrote and getattr(settings, "DATABASE_REPLICAS", None):
+            response.set_cookie(
+                STICKY_COOKIE,
+                "1",
+                max_age=getattr(settings, "REPLICA_STICKY_SECONDS", 5),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _current.get()
+        replicas = getattr(settings, "DATABASE_REPLICAS", None)
+        view_class = getattr(view_func, "cls", None)
+        if (
+            state is not None
+            and replicas
+            and request.method in SAFE_METHODS
+            and view_class is not None
+            and issubclass(view_class, ViewSetMixin)
+            and STICKY_COOKIE not in request.COOKIES
+        ):
+            state.replica = random.choice(replicas)
@@ -0,0 +1,210 @@
+"""Moving existing rows from one MetaSchema version to another."""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import BarcodedModel, SchemaMigration
+from .schema_migration_worker import init_worker, process_chunk
+from .signals import bulk_updated
+
+
+class RunLost(Exception):
+    """Another worker took over the run"""
+
+
+def resolve_transform(name):
+    """Return the dotted path of a transform registered by name, or name itself"""
+    return getattr(settings, "SCHEMA_MIGRATION_TRANSFORMS", {}).get(name, name)
+
+
+def _iter_chunks(queryset, field, after, chunk_size):
+    """Yield `(pk, blob)` chunks in primary key order, starting after a pk"""
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=after)
+            .order_by("pk")
+            .values_list("pk", field)[:chunk_size]
+        )
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][0]
+
+
+def _bounded_map(pool, chunks, limit):
+    """Like pool.map, in order, but with at most `limit` chunks in flight"""
+    pending = deque()
+    for chunk in chunks:
+        pending.append(pool.submit(process_chunk, chunk))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def claim_run(worker, pk=None):
+    """
+    Claim the oldest pending run, or a running one whose worker stopped
+    sending heartbeats, and return it; None if there is none.
+
+    Like claim_job, the claim is a conditional UPDATE, so concurrent workers
+    never run the same migration.
+    """
+    stale = timezone.now() - timedelta(
+        seconds=getattr(settings, "SCHEMA_MIGRATION_STALE_SECONDS", 300)
+    )
+    claimable = Q(status=SchemaMigration.Status.PENDING) | Q(
+        status=SchemaMigration.Status.RUNNING, heartbeat_at__lt=stale
+    )
+    candidates = SchemaMigration.objects.filter(claimable).order_by("pk")
+    if pk is not None:
+        candidates = candidates.filter(pk=pk)
+    for candidate in candidates.values("pk", "heartbeat_at")[:10]:
+        now = timezone.now()
+        claimed = SchemaMigration.objects.filter(claimable, **candidate).update(
+            status=SchemaMigration.Status.RUNNING,
+            worker=worker,
+            heartbeat_at=now,
+            updated_at=now,
+        )
+        if claimed:
+            return SchemaMigration.objects.get(pk=candidate["pk"])
+    return None
+
+
+def queue_resume(run):
+    """
+    Queue a failed run again, to continue from its checkpoint; returns
+    whether it was queued. Only one of concurrent calls succeeds.
+    """
+    queued = SchemaMigration.objects.filter(
+        pk=run.pk, status=SchemaMigration.Status.FAILED
+    ).update(
+        status=SchemaMigration.Status.PENDING,
+        message="",
+        finished_at=None,
+        updated_at=timezone.now(),
+    )
+    if queued:
+        run.refresh_from_db()
+    return bool(queued)
+
+
+def _owned(run):
+    """Queryset updating the run only while this worker still holds it"""
+    return SchemaMigration.objects.filter(
+        pk=run.pk, worker=run.worker, status=SchemaMigration.Status.RUNNING
+    )
+
+
+def _apply_chunk(run, model, field, processed):
+    """Write one processed chunk and move the checkpoint in one transaction"""
+    now = timezone.now()
+    instances = []
+    errors = []
+    for pk, blob, error in processed:
+        if error is not None:
+            errors.append({"id": pk, "error": error})
+            continue
+        instance = model(pk=pk, schema_id=run.target_id, **{field: blob})
+        instance.updated_at = now
+        instances.append(instance)
+
+    fields = ["schema", field, "updated_at"]
+    if issubclass(model, BarcodedModel):
+        fields.append("barcode")
+        for instance in instances:
+            instance.barcode = instance.compute_barcode()
+
+    max_errors = getattr(settings, "SCHEMA_MIGRATION_MAX_ERRORS", 1000)
+    with transaction.atomic():
+        if instances and not run.dry_run:
+            model.objects.bulk_update(instances, fields)
+            bulk_updated.send(sender=model, instances=instances)
+
+        run.last_pk = processed[-1][0]
+        run.processed += len(processed)
+        run.migrated += len(instances)
+        run.failed += len(errors)
+        run.errors = (run.errors + errors)[:max_errors]
+        run.heartbeat_at = timezone.now()
+        updated = _owned(run).update(
+            last_pk=run.last_pk,
+            processed=run.processed,
+            migrated=run.migrated,
+            failed=run.failed,
+            errors=run.errors,
+            heartbeat_at=run.heartbeat_at,
+            updated_at=run.heartbeat_at,
+        )
+        if not updated:
+            raise RunLost(f"Schema migration {run.pk} was taken over by another worker")
+
+
+def _finish(run, status, message=""):
+    run.status = status
+    run.message = message
+    run.finished_at = timezone.now()
+    _owned(run).update(
+        status=status,
+        message=message,
+        finished_at=run.finished_at,
+        updated_at=run.finished_at,
+    )
+
+
+def run_schema_migration(run, workers=None, chunk_size=None, progress=None):
+    """
+    Revalidate, transform and rewrite the rows of a claimed run's source as
+    its target.
+
+    Rows are streamed in primary key chunks. Transformation and validation
+    against the target definition run in a process pool; each chunk is then
+    written with bulk_update together with the checkpoint, so an interrupted
+    run resumes after the last written chunk. Rows that fail stay on the
+    source schema and are listed in run.errors. A dry run only reports.
+    """
+    workers = workers or getattr(settings, "SCHEMA_MIGRATION_WORKERS", 1)
+    chunk_size = chunk_size or getattr(settings, "SCHEMA_MIGRATION_CHUNK_SIZE", 1000)
+    try:
+        if run.source.type != run.target.type:
+            raise ValueError("Source and target schemas must be of the same type.")
+        model = run.source.target_model
+        field = run.source.target_field
+        queryset = model.objects.filter(schema=run.source)
+        transform = resolve_transform(run.transform) or None
+
+        run.total = run.processed + queryset.filter(pk__gt=run.last_pk).count()
+        _owned(run).update(total=run.total)
+
+        chunks = _iter_chunks(queryset, field, run.last_pk, chunk_size)
+        if workers > 1:
+            with ProcessPoolExecutor(
+                workers,
+                initializer=init_worker,
+                initargs=(run.target.definition, transform),
+            ) as pool:
+                for processed in _bounded_map(pool, chunks, workers * 2):
+                    _apply_chunk(run, model, field, processed)
+                    if progress:
+                        progress(run)
+        else:
+            init_worker(run.target.definition, transform)
+            for chunk in chunks:
+                _apply_chunk(run, model, field, process_chunk(chunk))
+                if progress:
+                    progress(run)
+    except RunLost:
+        raise
+    except Exception as e:
+        _finish(run, SchemaMigration.Status.FAILED, str(e))
+        raise
+
+    _finish(run, SchemaMigration.Status.COMPLETED)
+    return run
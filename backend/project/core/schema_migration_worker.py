@@ -0,0 +1,41 @@
+"""
+Worker side of schema migrations.
+
+Runs in pool processes, so it only depends on jsonschema and never touches
+the database or the app registry.
+"""
+
+from django.utils.module_loading import import_string
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
+
+_validator = None
+_transform = None
+
+
+def init_worker(definition, transform_path):
+    """Compile the target validator and load the transform once per process"""
+    global _validator, _transform  # pylint: disable=global-statement
+    cls = validator_for(definition)
+    cls.check_schema(definition)
+    _validator = cls(definition)
+    _transform = import_string(transform_path) if transform_path else None
+
+
+def process_chunk(rows):
+    """
+    Transform and validate a chunk of `(pk, blob)` rows.
+
+    Returns `(pk, blob, error)` tuples where error is None for valid rows.
+    """
+    processed = []
+    for pk, blob in rows:
+        try:
+            if _transform is not None:
+                blob = _transform(blob)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            processed.append((pk, None, f"Transform failed: {e!r}"))
+            continue
+        error = best_match(_validator.iter_errors(blob))
+        processed.append((pk, blob, error.message if error else None))
+    return processed
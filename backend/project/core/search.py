@@ -0,0 +1,230 @@
+"""Full-text search over the strings of metadata and result data."""
+
+import re
+
+from django.db import NotSupportedError, connections, router
+from django.db.models import Count
+
+from .models import Analysis, Entity, MetaSchema, Result, Sample, SearchDocument
+
+# Indexed models by name, with the JSONField whose strings are indexed
+SEARCH_MODELS = {
+    "entity": (Entity, "metadata"),
+    "sample": (Sample, "metadata"),
+    "analysis": (Analysis, "metadata"),
+    "result": (Result, "data"),
+}
+
+# External content FTS5 table kept in sync with SearchDocument by triggers
+FTS_TABLE = "core_searchdocument_fts"
+
+# Text search configuration of the PostgreSQL GIN index
+POSTGRES_CONFIG = "simple"
+
+_WORD = re.compile(r"\w+")
+
+
+def flatten_strings(value):
+    """Yield every string inside a JSON value"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from flatten_strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from flatten_strings(item)
+
+
+def _name(model):
+    return model._meta.model_name
+
+
+def index_objects(model, instances, batch_size=1000):
+    """Add or refresh the search documents of saved objects"""
+    _, field = SEARCH_MODELS[_name(model)]
+    documents = []
+    for instance in instances:
+        barcode = instance.compute_barcode()
+        documents.append(
+            SearchDocument(
+                model=_name(model),
+                object_id=instance.pk,
+                schema_id=instance.schema_id,
+                barcode=barcode,
+                text="\n".join([barcode, *flatten_strings(getattr(instance, field))]),
+            )
+        )
+    SearchDocument.objects.bulk_create(
+        documents,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["model", "object_id"],
+        update_fields=["schema", "barcode", "text"],
+    )
+
+
+def remove_objects(model, pks):
+    """Drop the search documents of deleted objects"""
+    SearchDocument.objects.filter(model=_name(model), object_id__in=pks).delete()
+
+
+def rebuild(model, batch_size=1000):
+    """Reindex every object of model, returning how many"""
+    _, field = SEARCH_MODELS[_name(model)]
+    SearchDocument.objects.filter(model=_name(model)).delete()
+    queryset = model.objects.only("pk", "schema", "barcode", field).order_by("pk")
+    count = 0
+    chunk = []
+    for instance in queryset.iterator(chunk_size=batch_size):
+        chunk.append(instance)
+        if len(chunk) == batch_size:
+            index_objects(model, chunk, batch_size)
+            count += len(chunk)
+            chunk = []
+    index_objects(model, chunk, batch_size)
+    return count + len(chunk)
+
+
+def _sqlite_match(query):
+    """Quote every word of a query for FTS5; the last one matches as a prefix"""
+    words = _WORD.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _sqlite_search(connection, query, limit, models, schemas):
+    match = _sqlite_match(query)
+    if match is None:
+        return [], []
+    table = SearchDocument._meta.db_table
+    conditions = [f"{FTS_TABLE} MATCH %s"]
+    params = [match]
+    for column, values in (("model", models), ("schema_id", schemas)):
+        if values is not None:
+            conditions.append(
+                f"{table}.{column} IN ({', '.join(['%s'] * len(values))})"
+            )
+            params += values
+    source = (
+        f"{FTS_TABLE} JOIN {table} ON {table}.id = {FTS_TABLE}.rowid "
+        f"WHERE {' AND '.join(conditions)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {table}.model, {table}.object_id, {table}.barcode, "
+            f"{table}.schema_id, -{FTS_TABLE}.rank, "
+            f"snippet({FTS_TABLE}, 0, '[', ']', '…', 12) FROM {source} "
+            f"ORDER BY {FTS_TABLE}.rank LIMIT %s",
+            [*params, limit],
+        )
+        ranked = cursor.fetchall()
+        cursor.execute(
+            f"SELECT {table}.model, {table}.schema_id, COUNT(*) FROM {source} "
+            f"GROUP BY {table}.model, {table}.schema_id",
+            params,
+        )
+        counts = cursor.fetchall()
+    return ranked, counts
+
+
+def _postgresql_search(query, limit, models, schemas):
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.postgres.search import (
+        SearchHeadline,
+        SearchQuery,
+        SearchRank,
+        SearchVector,
+    )
+
+    vector = SearchVector("text", config=POSTGRES_CONFIG)
+    search_query = SearchQuery(query, config=POSTGRES_CONFIG, search_type="websearch")
+    matched = SearchDocument.objects.alias(vector=vector).filter(vector=search_query)
+    if models is not None:
+        matched = matched.filter(model__in=models)
+    if schemas is not None:
+        matched = matched.filter(schema__in=schemas)
+    ranked = (
+        matched.annotate(
+            rank=SearchRank(vector, search_query),
+            snippet=SearchHeadline(
+                "text",
+                search_query,
+                config=POSTGRES_CONFIG,
+                start_sel="[",
+                stop_sel="]",
+                max_words=12,
+            ),
+        )
+        .order_by("-rank", "id")
+        .values_list("model", "object_id", "barcode", "schema", "rank", "snippet")[
+            :limit
+        ]
+    )
+    counts = (
+        matched.order_by()
+        .values("model", "schema")
+        .annotate(count=Count("id"))
+        .values_list("model", "schema", "count")
+    )
+    return list(ranked), list(counts)
+
+
+def search(query, limit, models=None, schemas=None):
+    """
+    Return `(hits, facets)` for the best matches of a free-text query.
+
+    Hits are ordered by relevance and carry the object, its barcode, schema
+    and a highlighted snippet. Facets count all matches by model and by
+    schema. models and schemas (pks) narrow the search.
+    """
+    if models is not None:
+        models = list(models)
+    if schemas is not None:
+        schemas = list(schemas)
+    if models == [] or schemas == []:
+        return [], {"model": {}, "schema": []}
+
+    connection = connections[router.db_for_read(SearchDocument)]
+    if connection.vendor == "sqlite":
+        ranked, counts = _sqlite_search(connection, query, limit, models, schemas)
+    elif connection.vendor == "postgresql":
+        ranked, counts = _postgresql_search(query, limit, models, schemas)
+    else:
+        raise NotSupportedError(f"Search is not supported on {connection.vendor}.")
+    if not ranked:
+        return [], {"model": {}, "schema": []}
+
+    schema_rows = MetaSchema.objects.only("title", "type").in_bulk(
+        {schema_id for _, schema_id, _ in counts}
+    )
+
+    def describe(schema_id):
+        schema = schema_rows[schema_id]
+        return {"id": schema.pk, "title": schema.title, "type": schema.type}
+
+    hits = [
+        {
+            "model": model,
+            "id": object_id,
+            "barcode": barcode,
+            "schema": describe(schema_id),
+            "rank": rank,
+            "snippet": snippet,
+        }
+        for model, object_id, barcode, schema_id, rank, snippet in ranked
+    ]
+    facets = {"model": {}, "schema": {}}
+    for model, schema_id, count in counts:
+        facets["model"][model] = facets["model"].get(model, 0) + count
+        schema = facets["schema"].setdefault(
+            schema_id, {**describe(schema_id), "count": 0}
+        )
+        schema["count"] += count
+    facets["schema"] = sorted(
+        facets["schema"].values(), key=lambda schema: -schema["count"]
+    )
+    return hits, facets
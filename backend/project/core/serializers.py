@@ -1,13 +1,112 @@
 """Serializers for the core app."""
 
+import math
+
+from django.conf import settings
+from django.core.files.base import ContentFile
 from jsonschema import ValidationError as JsonSchemaValidationError
-from jsonschema import validate
 from rest_framework import serializers
-
-from .models import Analysis, Batch, Entity, MetaSchema, Project, Result, Sample
-
-
-class ProjectSerializer(serializers.ModelSerializer):
+from rest_framework.permissions import SAFE_METHODS
+
+from .arrays import DTYPES, itemsize, npy_header, pack_values, read_header
+from .cache import schema_cache
+from .instrumentation import timed
+from .jsonpatch import OPERATIONS, UNSUPPORTED_OPERATIONS, parse_pointer
+from .models import (
+    Analysis,
+    Batch,
+    BinaryArray,
+    Entity,
+    ImportJob,
+    Material,
+    MetaSchema,
+    Project,
+    Result,
+    Sample,
+    SchemaMigration,
+)
+from .validators import validate_instance
+
+SPARSE_ACTIONS = ("list", "retrieve")
+
+# Relation columns of importable rows by schema type, given per row or as
+# defaults of the import job
+IMPORT_RELATIONS = {
+    MetaSchema.SchemaType.SAMPLE: ("batch",),
+    MetaSchema.SchemaType.RESULT: ("sample", "analysis"),
+}
+
+
+def _split_names(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class SparseFieldsetMixin:
+    """
+    Drops the fields not selected with `?fields=` or listed in `?exclude=`
+    (comma separated names) when a view lists or retrieves objects.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        view = self.context.get("view")
+        if (
+            request is None
+            or request.method not in SAFE_METHODS
+            or getattr(view, "action", None) not in SPARSE_ACTIONS
+        ):
+            return
+
+        selected = {}
+        for param in ("fields", "exclude"):
+            selected[param] = _split_names(request.query_params.get(param, ""))
+            unknown = [name for name in selected[param] if name not in self.fields]
+            if unknown:
+                raise serializers.ValidationError(
+                    {param: f"Unknown fields: {', '.join(unknown)}."}
+                )
+
+        for name in list(self.fields):
+            if (selected["fields"] and name not in selected["fields"]) or (
+                name in selected["exclude"]
+            ):
+                self.fields.pop(name)
+
+
+class TimedRepresentationMixin:
+    """
+    Counts the time spent building representations as request serialization
+    time. Nested and per-row calls are included in the outermost one.
+    """
+
+    def to_representation(self, instance):
+        with timed("serialization"):
+            return super().to_representation(instance)
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field resolving against objects preloaded into the context.
+
+    MetaSchemas are resolved through the in-process schema cache.
+    """
+
+    def to_internal_value(self, data):
+        model = self.get_queryset().model
+        if not isinstance(data, bool):
+            try:
+                if model is MetaSchema:
+                    return schema_cache.get(int(data))
+                return self.context["preloaded"][model][int(data)]
+            except (KeyError, TypeError, ValueError, MetaSchema.DoesNotExist):
+                pass
+        return super().to_internal_value(data)
+
+
+class ProjectSerializer(
+    SparseFieldsetMixin, TimedRepresentationMixin, serializers.ModelSerializer
+):
     """Serializer for the Project model."""
 
     class Meta:
@@ -15,17 +114,31 @@ class ProjectSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class MetaSchemaSerializer(serializers.ModelSerializer):
+class MetaSchemaSerializer(
+    SparseFieldsetMixin, TimedRepresentationMixin, serializers.ModelSerializer
+):
     """Serializer for the MetadataSchema model."""
 
     class Meta:
         model = MetaSchema
         fields = "__all__"
 
+    def validate_indexed_paths(self, value):
+        """Indexed paths must be a list of non-empty strings."""
+        if not isinstance(value, list) or not all(
+            isinstance(path, str) and path.strip("_") for path in value
+        ):
+            raise serializers.ValidationError("Expected a list of JSON paths.")
+        return sorted(set(value))
 
-class EntitySerializer(serializers.ModelSerializer):
+
+class EntitySerializer(
+    SparseFieldsetMixin, TimedRepresentationMixin, serializers.ModelSerializer
+):
     """Serializer for the Entity model."""
 
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
     class Meta:
         model = Entity
         fields = "__all__"
@@ -34,16 +147,52 @@ class EntitySerializer(serializers.ModelSerializer):
         attrs = super().validate(attrs)
 
         try:
-            validate(instance=attrs["metadata"], schema=attrs["schema"].definition)
+            validate_instance(attrs["schema"], attrs["metadata"])
+        except JsonSchemaValidationError as e:
+            raise serializers.ValidationError(f"Metadata validation error: {e.message}")
+
+        return attrs
+
+
+class MaterialSerializer(
+    SparseFieldsetMixin, TimedRepresentationMixin, serializers.ModelSerializer
+):
+    """Serializer for the Material model."""
+
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
+    class Meta:
+        model = Material
+        fields = "__all__"
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+
+        try:
+            validate_instance(attrs["schema"], attrs["metadata"])
         except JsonSchemaValidationError as e:
             raise serializers.ValidationError(f"Metadata validation error: {e.message}")
 
         return attrs
 
 
-class BatchSerializer(serializers.ModelSerializer):
+class BatchSerializer(
+    SparseFieldsetMixin, TimedRepresentationMixin, serializers.ModelSerializer
+):
     """Serializer for the Batch model."""
 
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
+    sample_count = serializers.IntegerField(
+        source="summary.sample_count", read_only=True, allow_null=True
+    )
+    result_count = serializers.IntegerField(
+        source="summary.result_count", read_only=True, allow_null=True
+    )
+    last_activity_at = serializers.DateTimeField(
+        source="summary.last_activity_at", read_only=True, allow_null=True
+    )
+
     class Meta:
         model = Batch
         fields = "__all__"
@@ -52,16 +201,20 @@ class BatchSerializer(serializers.ModelSerializer):
         attrs = super().validate(attrs)
 
         try:
-            validate(instance=attrs["metadata"], schema=attrs["schema"].definition)
+            validate_instance(attrs["schema"], attrs["metadata"])
         except JsonSchemaValidationError as e:
             raise serializers.ValidationError(f"Metadata validation error: {e.message}")
 
         return attrs
 
 
-class SampleSerializer(serializers.ModelSerializer):
+class SampleSerializer(
+    SparseFieldsetMixin, TimedRepresentationMixin, serializers.ModelSerializer
+):
     """Serializer for the Sample model."""
 
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
     class Meta:
         model = Sample
         fields = "__all__"
@@ -70,16 +223,27 @@ class SampleSerializer(serializers.ModelSerializer):
         attrs = super().validate(attrs)
 
         try:
-            validate(instance=attrs["metadata"], schema=attrs["schema"].definition)
+            validate_instance(attrs["schema"], attrs["metadata"])
         except JsonSchemaValidationError as e:
             raise serializers.ValidationError(f"Metadata validation error: {e.message}")
 
         return attrs
 
 
-class AnalysisSerializer(serializers.ModelSerializer):
+class AnalysisSerializer(
+    SparseFieldsetMixin, TimedRepresentationMixin, serializers.ModelSerializer
+):
     """Serializer for the Analysis model."""
 
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
+    result_count = serializers.IntegerField(
+        source="summary.result_count", read_only=True, allow_null=True
+    )
+    last_activity_at = serializers.DateTimeField(
+        source="summary.last_activity_at", read_only=True, allow_null=True
+    )
+
     class Meta:
         model = Analysis
         fields = "__all__"
@@ -88,16 +252,20 @@ class AnalysisSerializer(serializers.ModelSerializer):
         attrs = super().validate(attrs)
 
         try:
-            validate(instance=attrs["metadata"], schema=attrs["schema"].definition)
+            validate_instance(attrs["schema"], attrs["metadata"])
         except JsonSchemaValidationError as e:
             raise serializers.ValidationError(f"Metadata validation error: {e.message}")
 
         return attrs
 
 
-class ResultSerializer(serializers.ModelSerializer):
+class ResultSerializer(
+    SparseFieldsetMixin, TimedRepresentationMixin, serializers.ModelSerializer
+):
     """Serializer for the Result model."""
 
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
     class Meta:
         model = Result
         fields = "__all__"
@@ -106,10 +274,293 @@ class ResultSerializer(serializers.ModelSerializer):
         attrs = super().validate(attrs)
 
         try:
-            validate(instance=attrs["data"], schema=attrs["schema"].definition)
+            validate_instance(attrs["schema"], attrs["data"])
         except JsonSchemaValidationError as e:
             raise serializers.ValidationError(
                 f"Result data validation error: {e.message}"
             )
 
         return attrs
+
+
+class SchemaMigrationSerializer(
+    SparseFieldsetMixin, TimedRepresentationMixin, serializers.ModelSerializer
+):
+    """Serializer for the SchemaMigration model."""
+
+    class Meta:
+        model = SchemaMigration
+        fields = "__all__"
+        read_only_fields = [
+            "status",
+            "finished_at",
+            "worker",
+            "heartbeat_at",
+            "last_pk",
+            "total",
+            "processed",
+            "migrated",
+            "failed",
+            "errors",
+            "message",
+        ]
+
+    def validate_transform(self, value):
+        """Only transforms registered in the settings may be requested."""
+        if value and value not in getattr(settings, "SCHEMA_MIGRATION_TRANSFORMS", {}):
+            raise serializers.ValidationError(f"Unknown transform {value}.")
+        return value
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+
+        if attrs["source"] == attrs["target"]:
+            raise serializers.ValidationError("Source and target must differ.")
+        if attrs["source"].type != attrs["target"].type:
+            raise serializers.ValidationError(
+                "Source and target must be of the same schema type."
+            )
+
+        return attrs
+
+
+class ProjectAssignmentSerializer(serializers.Serializer):
+    """Objects to add projects to or remove projects from, by id"""
+
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    add = serializers.ListField(child=serializers.IntegerField(), default=list)
+    remove = serializers.ListField(child=serializers.IntegerField(), default=list)
+
+    def validate_ids(self, value):
+        max_rows = getattr(settings, "BULK_MAX_ROWS", 10000)
+        if len(value) > max_rows:
+            raise serializers.ValidationError(f"At most {max_rows} ids per request.")
+        return value
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+
+        if not attrs["add"] and not attrs["remove"]:
+            raise serializers.ValidationError("Give projects to add or remove.")
+        if set(attrs["add"]) & set(attrs["remove"]):
+            raise serializers.ValidationError(
+                "A project cannot be both added and removed."
+            )
+        missing = set(attrs["add"]) - set(
+            Project.objects.filter(pk__in=attrs["add"]).values_list("pk", flat=True)
+        )
+        if missing:
+            raise serializers.ValidationError(
+                {"add": f"Unknown projects: {', '.join(map(str, sorted(missing)))}."}
+            )
+        model = self.context["model"]
+        missing = set(attrs["ids"]) - set(
+            model.objects.filter(pk__in=attrs["ids"]).values_list("pk", flat=True)
+        )
+        if missing:
+            raise serializers.ValidationError(
+                {"ids": f"Unknown ids: {', '.join(map(str, sorted(missing)))}."}
+            )
+
+        return attrs
+
+
+class JSONPatchOperationSerializer(serializers.Serializer):
+    """One operation of the supported RFC 6902 subset"""
+
+    op = serializers.ChoiceField(choices=OPERATIONS + UNSUPPORTED_OPERATIONS)
+    path = serializers.CharField(allow_blank=True, trim_whitespace=False)
+    value = serializers.JSONField(required=False, allow_null=True)
+
+    def validate_op(self, value):
+        if value in UNSUPPORTED_OPERATIONS:
+            raise serializers.ValidationError(
+                f"{value} is not supported; use remove and add instead."
+            )
+        return value
+
+    def validate_path(self, value):
+        try:
+            parse_pointer(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+
+        if attrs["op"] != "remove" and "value" not in attrs:
+            raise serializers.ValidationError({"value": "This field is required."})
+        if attrs["op"] != "test" and not attrs["path"]:
+            raise serializers.ValidationError(
+                {"path": "The whole document cannot be patched."}
+            )
+        if attrs["op"] != "add" and attrs["path"].endswith("/-"):
+            raise serializers.ValidationError(
+                {"path": "Only add can use the end of an array."}
+            )
+
+        return attrs
+
+
+class JSONPatchSerializer(serializers.Serializer):
+    """JSON Patch operations for many objects, optionally chosen by id"""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False
+    )
+    patch = serializers.ListField(
+        child=JSONPatchOperationSerializer(), allow_empty=False
+    )
+
+    def validate_ids(self, value):
+        max_rows = getattr(settings, "BULK_MAX_ROWS", 10000)
+        if len(value) > max_rows:
+            raise serializers.ValidationError(f"At most {max_rows} ids per request.")
+        return value
+
+    def validate_patch(self, value):
+        ops = [operation["op"] for operation in value]
+        changes = [index for index, op in enumerate(ops) if op != "test"]
+        if not changes:
+            raise serializers.ValidationError("Give at least one change.")
+        if "test" in ops[changes[0] :]:
+            raise serializers.ValidationError(
+                "Test operations must come before the changes."
+            )
+        return value
+
+
+class ImportJobSerializer(
+    SparseFieldsetMixin, TimedRepresentationMixin, serializers.ModelSerializer
+):
+    """Serializer for the ImportJob model."""
+
+    delimiter = serializers.ChoiceField(choices=[",", ";", "\t"], default=",")
+
+    class Meta:
+        model = ImportJob
+        fields = "__all__"
+        read_only_fields = [
+            "started_at",
+            "finished_at",
+            "status",
+            "worker",
+            "heartbeat_at",
+            "attempts",
+            "last_row",
+            "total",
+            "processed",
+            "imported",
+            "failed",
+            "errors",
+            "message",
+        ]
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+
+        relations = IMPORT_RELATIONS.get(attrs["schema"].type)
+        if relations is None:
+            raise serializers.ValidationError(
+                {"schema": "Only sample and result schemas can be imported."}
+            )
+        defaults = attrs.get("defaults", {})
+        if not isinstance(defaults, dict):
+            raise serializers.ValidationError({"defaults": "Expected an object."})
+        unknown = set(defaults) - set(relations)
+        if unknown:
+            raise serializers.ValidationError(
+                {"defaults": f"Unknown relations: {', '.join(sorted(unknown))}."}
+            )
+        if not all(isinstance(value, (int, str)) for value in defaults.values()):
+            raise serializers.ValidationError(
+                {"defaults": "Relations are given as ids or barcodes."}
+            )
+
+        return attrs
+
+
+class BinaryArraySerializer(
+    SparseFieldsetMixin, TimedRepresentationMixin, serializers.ModelSerializer
+):
+    """
+    Serializer for the BinaryArray model.
+
+    Arrays are uploaded either as a .npy `file` or as JSON `values` (nested
+    lists of numbers) with a `dtype`.
+    """
+
+    file = serializers.FileField(write_only=True, required=False)
+    values = serializers.JSONField(write_only=True, required=False)
+    dtype = serializers.ChoiceField(choices=list(DTYPES), required=False)
+    nbytes = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BinaryArray
+        fields = [
+            "id",
+            "created_at",
+            "updated_at",
+            "analysis",
+            "result",
+            "name",
+            "dtype",
+            "shape",
+            "nbytes",
+            "file",
+            "values",
+        ]
+        read_only_fields = ["shape"]
+        # Names are unique per owner; checked in validate since either owner
+        # may be missing
+        validators = []
+
+    def get_nbytes(self, obj):
+        return math.prod(obj.shape) * itemsize(obj.dtype)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+
+        if bool(attrs.get("analysis")) == bool(attrs.get("result")):
+            raise serializers.ValidationError(
+                "Attach the array to either an analysis or a result."
+            )
+        owner = "analysis" if attrs.get("analysis") else "result"
+        if BinaryArray.objects.filter(
+            **{owner: attrs[owner], "name": attrs["name"]}
+        ).exists():
+            raise serializers.ValidationError(
+                {"name": f"The {owner} already has an array with this name."}
+            )
+        upload = attrs.get("file")
+        if (upload is None) == ("values" not in attrs):
+            raise serializers.ValidationError("Give either a .npy file or values.")
+
+        if upload is not None:
+            try:
+                dtype, shape, offset = read_header(upload)
+            except ValueError as e:
+                raise serializers.ValidationError({"file": str(e)})
+            if attrs.get("dtype", dtype) != dtype:
+                raise serializers.ValidationError(
+                    {"dtype": f"The file holds {dtype} values."}
+                )
+            expected = offset + self.get_nbytes(BinaryArray(dtype=dtype, shape=shape))
+            if upload.size != expected:
+                raise serializers.ValidationError(
+                    {"file": f"Expected {expected} bytes for shape {shape}."}
+                )
+            upload.seek(0)
+        else:
+            dtype = attrs.get("dtype", "<f8")
+            try:
+                data, shape = pack_values(attrs.pop("values"), dtype)
+            except ValueError as e:
+                raise serializers.ValidationError({"values": str(e)})
+            header = npy_header(dtype, shape)
+            offset = len(header)
+            attrs["file"] = ContentFile(header + data, name=f"{attrs['name']}.npy")
+
+        attrs.update(dtype=dtype, shape=shape, offset=offset)
+        return attrs
@@ -0,0 +1,306 @@
+"""Signal handlers for the core app."""
+
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_save,
+)
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .aggregation import SQLITE_STDDEV_FUNCTION, SQLiteSampleStdDev
+from .cache import bump_generation, schema_cache
+from .changes import FEED_MODELS, record
+from .indexes import index_targets, sync_json_indexes
+from .models import (
+    Analysis,
+    Batch,
+    BinaryArray,
+    Change,
+    Entity,
+    Material,
+    MetaSchema,
+    Result,
+    Sample,
+)
+from .search import SEARCH_MODELS, index_objects, remove_objects
+from .summaries import add, batches_of, create_summaries
+from .validators import registry
+
+# Sent with ``instances`` after rows are written with bulk_create, which skips
+# the per-instance save signals.
+bulk_created = Signal()
+
+# Sent with ``instances`` after rows are rewritten with bulk_update.
+bulk_updated = Signal()
+
+# Models whose writes invalidate cached responses
+TRACKED_MODELS = (Entity, Material, Batch, Sample, Analysis, Result)
+
+
+@receiver(connection_created)
+def register_sqlite_functions(sender, connection, **kwargs):
+    """Add the SQL functions core needs that SQLite lacks"""
+    if connection.vendor == "sqlite":
+        connection.connection.create_aggregate(
+            SQLITE_STDDEV_FUNCTION, 1, SQLiteSampleStdDev
+        )
+
+
+@receiver(post_migrate)
+def restore_generated_columns(sender, using, verbosity=1, stdout=None, **kwargs):
+    """
+    Re-add the JSON path columns of SQLite tables that migrations rebuilt,
+    which drops columns the models do not declare
+    """
+    if (
+        sender.name != "core"
+        or using != DEFAULT_DB_ALIAS
+        or connections[using].vendor != "sqlite"
+    ):
+        return
+    executor = MigrationExecutor(connections[using])
+    if executor.migration_plan(executor.loader.graph.leaf_nodes()):
+        # Not fully migrated, e.g. migrating backwards
+        return
+    for model, field in index_targets():
+        statements = sync_json_indexes(model, field)
+        if statements and verbosity >= 1 and stdout is not None:
+            stdout.write(
+                f"{model._meta.label}: ran {len(statements)} JSON path index "
+                "statements\n"
+            )
+
+
+@receiver([post_save, post_delete], sender=MetaSchema)
+def evict_schema_validator(sender, instance, **kwargs):
+    """Drop cached validators and rows when a MetaSchema changes"""
+    registry.evict(instance.pk)
+    schema_cache.invalidate(instance.pk)
+
+
+def bump_model_generation(sender, **kwargs):
+    """Invalidate cached responses of a model after any write"""
+    bump_generation(sender)
+
+
+for tracked_model in TRACKED_MODELS:
+    for write_signal in (post_save, post_delete, bulk_created, bulk_updated):
+        write_signal.connect(bump_model_generation, sender=tracked_model)
+
+
+def record_upserts(sender, instance=None, instances=None, **kwargs):
+    """Add saved or bulk written rows to the change feed"""
+    record(
+        sender, [i.pk for i in instances] if instances is not None else [instance.pk]
+    )
+
+
+def record_delete(sender, instance, **kwargs):
+    """Add a tombstone of a deleted row to the change feed"""
+    record(sender, [instance.pk], Change.Action.DELETE)
+
+
+for feed_model, _ in FEED_MODELS.values():
+    for write_signal in (post_save, bulk_created, bulk_updated):
+        write_signal.connect(record_upserts, sender=feed_model)
+    post_delete.connect(record_delete, sender=feed_model)
+
+
+def _owner_pks(through, owner_model, instance):
+    """Return the pks of owner_model rows linked to instance in a through table"""
+    owner_field = next(
+        f.attname
+        for f in through._meta.concrete_fields
+        if f.is_relation and f.related_model is owner_model
+    )
+    instance_field = next(
+        f.name
+        for f in through._meta.concrete_fields
+        if f.is_relation and f.related_model is type(instance)
+    )
+    return set(
+        through.objects.filter(**{instance_field: instance}).values_list(
+            owner_field, flat=True
+        )
+    )
+
+
+def touch_owners(model, pks):
+    """Mark rows of model as updated after their relations changed"""
+    model._base_manager.filter(pk__in=pks).update(updated_at=timezone.now())
+    bump_generation(model)
+    record(model, pks)
+
+
+@receiver(m2m_changed)
+def touch_m2m_owners(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Bump updated_at of objects whose many-to-many relations changed, so ETags
+    derived from updated_at notice the change.
+    """
+    owner_model = model if reverse else type(instance)
+    if owner_model not in TRACKED_MODELS:
+        return
+
+    if action == "pre_clear" and reverse:
+        instance._cleared_owner_pks = _owner_pks(sender, owner_model, instance)
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        pks = {instance.pk}
+    elif action == "post_clear":
+        pks = getattr(instance, "_cleared_owner_pks", set())
+    else:
+        pks = pk_set or set()
+
+    if pks:
+        touch_owners(owner_model, pks)
+
+
+def create_owner_summaries(
+    sender, instance=None, instances=None, created=True, **kwargs
+):
+    """Create the summary of new batches and analyses"""
+    if created:
+        create_summaries(sender, instances or [instance])
+
+
+for summary_owner in (Batch, Analysis):
+    post_save.connect(create_owner_summaries, sender=summary_owner)
+    bulk_created.connect(create_owner_summaries, sender=summary_owner)
+
+
+def _previous(model, instance, fields, update_fields):
+    """Return the stored values of fields, unless the save cannot change them"""
+    if instance._state.adding or (
+        update_fields is not None and not set(fields) & set(update_fields)
+    ):
+        return None
+    return model._base_manager.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(pre_save, sender=Sample)
+def remember_sample_batch(sender, instance, update_fields=None, **kwargs):
+    """Keep the stored batch of a sample to notice moves between batches"""
+    instance._summary_previous = _previous(Sample, instance, ["batch"], update_fields)
+
+
+@receiver(pre_save, sender=Result)
+def remember_result_owners(sender, instance, update_fields=None, **kwargs):
+    """Keep the stored sample and analysis of a result to notice moves"""
+    instance._summary_previous = _previous(
+        Result, instance, ["sample", "analysis"], update_fields
+    )
+
+
+@receiver(post_save, sender=Sample)
+def summarize_saved_sample(sender, instance, created, **kwargs):
+    """Count a new sample in its batch, or move it and its results"""
+    if created:
+        add(Batch, {instance.batch_id: {"sample_count": 1}})
+        return
+    previous = getattr(instance, "_summary_previous", None)
+    if previous is None or previous[0] == instance.batch_id:
+        add(Batch, {instance.batch_id: {}})
+        return
+    results = instance.results.count()
+    add(
+        Batch,
+        {
+            previous[0]: {"sample_count": -1, "result_count": -results},
+            instance.batch_id: {"sample_count": 1, "result_count": results},
+        },
+    )
+
+
+@receiver(post_save, sender=Result)
+def summarize_saved_result(sender, instance, created, **kwargs):
+    """Count a new result in its batch and analysis, or move it"""
+    (batch,) = batches_of([instance])
+    if created:
+        add(Batch, {batch: {"result_count": 1}})
+        add(Analysis, {instance.analysis_id: {"result_count": 1}})
+        return
+    previous = getattr(instance, "_summary_previous", None)
+    if previous is None:
+        previous = (instance.sample_id, instance.analysis_id)
+    previous_batch = (
+        batch
+        if previous[0] == instance.sample_id
+        else Sample.objects.filter(pk=previous[0])
+        .values_list("batch_id", flat=True)
+        .first()
+    )
+    for model, old, new in (
+        (Batch, previous_batch, batch),
+        (Analysis, previous[1], instance.analysis_id),
+    ):
+        if old == new:
+            add(model, {new: {}})
+        else:
+            add(model, {old: {"result_count": -1}, new: {"result_count": 1}})
+
+
+@receiver(post_delete, sender=Sample)
+def summarize_deleted_sample(sender, instance, **kwargs):
+    """Uncount a deleted sample; its results are uncounted by their own signal"""
+    add(Batch, {instance.batch_id: {"sample_count": -1}})
+
+
+@receiver(post_delete, sender=Result)
+def summarize_deleted_result(sender, instance, **kwargs):
+    """Uncount a deleted result"""
+    (batch,) = batches_of([instance])
+    if batch is not None:
+        add(Batch, {batch: {"result_count": -1}})
+    add(Analysis, {instance.analysis_id: {"result_count": -1}})
+
+
+def _counts(keys, field):
+    return {key: {field: n} for key, n in Counter(keys).items() if key is not None}
+
+
+@receiver(bulk_created, sender=Sample)
+def summarize_bulk_samples(sender, instances, **kwargs):
+    """Count bulk created samples in their batches"""
+    add(Batch, _counts((i.batch_id for i in instances), "sample_count"))
+
+
+@receiver(bulk_created, sender=Result)
+def summarize_bulk_results(sender, instances, **kwargs):
+    """Count bulk created results in their batches and analyses"""
+    add(Batch, _counts(batches_of(instances), "result_count"))
+    add(Analysis, _counts((i.analysis_id for i in instances), "result_count"))
+
+
+def index_saved(sender, instance=None, instances=None, **kwargs):
+    """Refresh the search documents of saved or bulk written rows"""
+    index_objects(sender, instances if instances is not None else [instance])
+
+
+def unindex_deleted(sender, instance, **kwargs):
+    """Drop the search document of a deleted row"""
+    remove_objects(sender, [instance.pk])
+
+
+for search_model, _ in SEARCH_MODELS.values():
+    for write_signal in (post_save, bulk_created, bulk_updated):
+        write_signal.connect(index_saved, sender=search_model)
+    post_delete.connect(unindex_deleted, sender=search_model)
+
+
+@receiver(post_delete, sender=BinaryArray)
+def delete_array_file(sender, instance, **kwargs):
+    """Remove the file of a deleted array once the deletion commits"""
+    storage, name = instance.file.storage, instance.file.name
+    transaction.on_commit(lambda: storage.delete(name))
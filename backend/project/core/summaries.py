@@ -0,0 +1,144 @@
+"""Denormalized Batch and Analysis summaries, maintained incrementally."""
+
+from django.db.models import Count, F, Max, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .cache import bump_generation
+from .models import Analysis, AnalysisSummary, Batch, BatchSummary, Result, Sample
+
+# Summary model of each owner and its counts: (field, counted model, lookup
+# from the counted model to the owner)
+SUMMARIES = {
+    Batch: (
+        BatchSummary,
+        (("sample_count", Sample, "batch"), ("result_count", Result, "sample__batch")),
+    ),
+    Analysis: (AnalysisSummary, (("result_count", Result, "analysis"),)),
+}
+
+# When a batch or analysis, or its summary, last changed
+SUMMARY_LAST_MODIFIED = Greatest(
+    "updated_at", Coalesce("summary__last_activity_at", "updated_at")
+)
+
+
+def create_summaries(model, instances):
+    """Create the empty summaries of newly created owners"""
+    summary_model, _ = SUMMARIES[model]
+    summary_model.objects.bulk_create(
+        [
+            summary_model(pk=instance.pk, last_activity_at=instance.created_at)
+            for instance in instances
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def add(model, deltas):
+    """
+    Apply `{owner pk: {count field: delta}}` to the summaries of model and
+    mark them active now; an empty dict of deltas only marks activity.
+
+    Summaries missing when rows are added are rebuilt from the rows instead.
+    """
+    if not deltas:
+        return
+    summary_model, _ = SUMMARIES[model]
+    groups = {}
+    for pk, changes in deltas.items():
+        groups.setdefault(tuple(sorted(changes.items())), []).append(pk)
+
+    now = timezone.now()
+    missing = []
+    for changes, pks in groups.items():
+        updates = {field: F(field) + n for field, n in changes if n}
+        updated = summary_model.objects.filter(pk__in=pks).update(
+            last_activity_at=Greatest("last_activity_at", Value(now)), **updates
+        )
+        if updated < len(pks) and any(n > 0 for _, n in changes):
+            missing += pks
+    if missing:
+        rebuild(model, missing)
+    bump_generation(model)
+
+
+def compute(model, pks=None):
+    """
+    Return `{owner pk: {field: value}}` computed from the rows.
+
+    last_activity_at is the latest update of the owner or of any counted row;
+    deletions after that are only known to the stored summaries.
+    """
+    _, counts = SUMMARIES[model]
+    owners = model.objects.all() if pks is None else model.objects.filter(pk__in=pks)
+    values = {
+        pk: {"last_activity_at": updated_at, **{field: 0 for field, _, _ in counts}}
+        for pk, updated_at in owners.values_list("pk", "updated_at")
+    }
+    for field, counted, lookup in counts:
+        rows = counted.objects.order_by()
+        if pks is not None:
+            rows = rows.filter(**{f"{lookup}__in": pks})
+        for pk, count, last in (
+            rows.values(lookup)
+            .annotate(count=Count("pk"), last=Max("updated_at"))
+            .values_list(lookup, "count", "last")
+        ):
+            if pk in values:
+                values[pk][field] = count
+                values[pk]["last_activity_at"] = max(
+                    values[pk]["last_activity_at"], last
+                )
+    return values
+
+
+def rebuild(model, pks=None, batch_size=1000):
+    """Recompute and store the summaries of model, returning how many"""
+    summary_model, counts = SUMMARIES[model]
+    values = compute(model, pks)
+    summary_model.objects.bulk_create(
+        [summary_model(pk=pk, **fields) for pk, fields in values.items()],
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=[summary_model._meta.pk.name],
+        update_fields=[field for field, _, _ in counts] + ["last_activity_at"],
+    )
+    bump_generation(model)
+    return len(values)
+
+
+def verify(model):
+    """Return `(owner pk, field, stored, expected)` for every wrong count"""
+    summary_model, counts = SUMMARIES[model]
+    fields = [field for field, _, _ in counts]
+    stored = {
+        row["pk"]: row for row in summary_model.objects.values("pk", *fields).iterator()
+    }
+    problems = []
+    for pk, expected in compute(model).items():
+        row = stored.get(pk)
+        for field in fields:
+            value = row[field] if row else None
+            if value != expected[field]:
+                problems.append((pk, field, value, expected[field]))
+    return problems
+
+
+def batches_of(results):
+    """Return the batch pk of every result's sample"""
+    sample = Result._meta.get_field("sample")
+    missing = {result.sample_id for result in results if not sample.is_cached(result)}
+    batches = (
+        dict(Sample.objects.filter(pk__in=missing).values_list("pk", "batch_id"))
+        if missing
+        else {}
+    )
+    return [
+        (
+            result.sample.batch_id
+            if sample.is_cached(result)
+            else batches.get(result.sample_id)
+        )
+        for result in results
+    ]
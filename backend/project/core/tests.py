@@ -1,3 +1,2108 @@
-from django.test import TestCase
+"""Tests for the core app."""
 
-# Create your tests here.
+import csv
+import datetime
+import decimal
+import io
+import json
+import os
+import tempfile
+from array import array
+from collections import Counter
+from importlib.util import find_spec
+from pathlib import Path
+from unittest import skipUnless
+
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection, router, transaction
+from django.db.models.signals import post_save
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from conf.database import databases_from_env
+
+from .arrays import npy_header, read_header
+from .cache import MetaSchemaCache, check_shared_caches, schema_cache
+from .imports import build_payload, claim_job, run_import
+from .indexes import (
+    generated_column_name,
+    generated_columns,
+    index_name,
+    sync_json_indexes,
+)
+from .instrumentation import metrics
+from .models import (
+    Analysis,
+    AnalysisSummary,
+    Batch,
+    BatchSummary,
+    BinaryArray,
+    Change,
+    Entity,
+    ImportJob,
+    MetaSchema,
+    Project,
+    Result,
+    Sample,
+    SchemaMigration,
+)
+from .renderers import ORJSONRenderer
+from .routers import STICKY_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware
+from .schema_migration import RunLost, claim_run, run_schema_migration
+from .signals import bulk_created
+from .summaries import SUMMARIES, verify
+from .validators import ValidatorRegistry, registry
+from .views import EntityViewSet
+
+
+@override_settings(RESPONSE_CACHE_ALIAS=None)
+class ListQueryCountTests(APITestCase):
+    """List endpoints run a fixed number of queries regardless of row count."""
+
+    # endpoint -> queries for one page: the ETag aggregate where conditional GET
+    # is supported, the main query and one per prefetched M2M; the database
+    # backed response cache is left out
+    expected_queries = {
+        "/projects/": 1,
+        "/metaschemas/": 1,
+        "/entities/": 3,
+        "/batches/": 4,
+        "/samples/": 2,
+        "/analyses/": 3,
+        "/results/": 2,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.schema = MetaSchema.objects.create(
+            title="Plasmid", type=MetaSchema.SchemaType.ENTITY, version=1, definition={}
+        )
+        cls.projects = [Project.objects.create(name=f"P{i}") for i in range(3)]
+
+    def create_rows(self, count):
+        """Create `count` rows of every model, each linked to all projects"""
+        for _ in range(count):
+            entity = Entity.objects.create(schema=self.schema, metadata={})
+            entity.projects.set(self.projects)
+            batch = Batch.objects.create(schema=self.schema, metadata={})
+            batch.projects.set(self.projects)
+            batch.preparations.add(entity)
+            sample = Sample.objects.create(schema=self.schema, batch=batch, metadata={})
+            analysis = Analysis.objects.create(schema=self.schema, metadata={})
+            analysis.projects.set(self.projects)
+            Result.objects.create(
+                schema=self.schema, sample=sample, analysis=analysis, data={}
+            )
+
+    def assert_list_queries(self, rows):
+        """Check every list endpoint against its expected query count"""
+        for url, queries in self.expected_queries.items():
+            with self.subTest(url=url, rows=rows):
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_query_count_with_one_row(self):
+        self.create_rows(1)
+        self.assert_list_queries(1)
+
+    def test_query_count_with_many_rows(self):
+        self.create_rows(20)
+        self.assert_list_queries(20)
+
+    def test_sample_results_query_count(self):
+        self.create_rows(1)
+        sample = Sample.objects.get()
+        for _ in range(10):
+            Result.objects.create(
+                schema=self.schema,
+                sample=sample,
+                analysis=Analysis.objects.get(),
+                data={},
+            )
+
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/samples/{sample.pk}/results/")
+        self.assertEqual(len(response.json()["results"]), 11)
+
+
+class ValidatorRegistryTests(APITestCase):
+    """Compiled validators are reused until their schema changes."""
+
+    def setUp(self):
+        registry.clear()
+        self.addCleanup(registry.clear)
+        self.schema = MetaSchema.objects.create(
+            title="Plasmid",
+            type=MetaSchema.SchemaType.ENTITY,
+            version=1,
+            definition={"type": "object", "required": ["name"]},
+        )
+        self.project = Project.objects.create(name="P")
+
+    def create_entity(self, metadata):
+        return self.client.post(
+            "/entities/",
+            {
+                "schema": self.schema.pk,
+                "metadata": metadata,
+                "projects": [self.project.pk],
+            },
+            format="json",
+        )
+
+    def test_hits_and_misses(self):
+        self.assertEqual(self.create_entity({"name": "a"}).status_code, 201)
+        self.assertEqual(self.create_entity({"name": "b"}).status_code, 201)
+        self.assertEqual(self.create_entity({}).status_code, 400)
+        stats = self.client.get("/metaschemas/validator-cache/").json()
+        self.assertEqual((stats["size"], stats["hits"], stats["misses"]), (1, 2, 1))
+
+    def test_schema_save_evicts_its_validator(self):
+        self.assertEqual(self.create_entity({"name": "a"}).status_code, 201)
+        self.schema.definition = {"type": "object"}
+        self.schema.save()
+        self.assertEqual(registry.stats()["size"], 0)
+        self.assertEqual(self.create_entity({}).status_code, 201)
+        self.assertEqual(registry.stats()["misses"], 2)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ValidatorRegistry(maxsize=2)
+        schemas = [
+            MetaSchema(pk=pk, version=1, definition={"type": "object"})
+            for pk in (1, 2, 3)
+        ]
+        first = cache.get(schemas[0])
+        cache.get(schemas[1])
+        self.assertIs(cache.get(schemas[0]), first)
+        cache.get(schemas[2])
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertIs(cache.get(schemas[0]), first)
+        cache.get(schemas[1])
+        self.assertEqual(cache.stats()["misses"], 4)
+
+
+class BulkIngestTests(APITestCase):
+    """Bulk creation reports failed rows by index and writes the rest."""
+
+    def setUp(self):
+        self.schema = MetaSchema.objects.create(
+            title="Well",
+            type=MetaSchema.SchemaType.SAMPLE,
+            version=1,
+            definition={"type": "object", "required": ["name"]},
+        )
+        self.batch = Batch.objects.create(schema=self.schema, metadata={})
+
+    def row(self, **metadata):
+        return {
+            "schema": self.schema.pk,
+            "metadata": metadata,
+            "batch": self.batch.pk,
+        }
+
+    def post_ndjson(self, body):
+        return self.client.post(
+            "/samples/bulk/", body, content_type="application/x-ndjson"
+        )
+
+    def test_ndjson_body(self):
+        lines = [json.dumps(self.row(name="a")), "", json.dumps(self.row())]
+        response = self.post_ndjson("\n".join(lines) + "\n")
+        self.assertEqual(response.status_code, 201)
+        payload = response.json()
+        self.assertEqual(payload["created"], 1)
+        self.assertEqual([f["index"] for f in payload["failed"]], [1])
+        sample = Sample.objects.get()
+        self.assertEqual(payload["ids"], [sample.pk])
+        self.assertEqual(sample.barcode, f"S{sample.pk}")
+
+    def test_ndjson_parse_error_names_the_line(self):
+        body = json.dumps(self.row(name="a")) + "\n\n{nope\n"
+        response = self.post_ndjson(body)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("line 3", response.json()["detail"])
+        self.assertFalse(Sample.objects.exists())
+
+    def test_dry_run_writes_nothing(self):
+        response = self.client.post(
+            "/samples/bulk/?dry_run=true",
+            [self.row(name="a"), self.row(name="b")],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["valid"], 2)
+        self.assertFalse(Sample.objects.exists())
+
+    def test_only_failed_rows(self):
+        response = self.client.post("/samples/bulk/", [self.row()], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["failed"][0]["index"], 0)
+
+    @override_settings(BULK_MAX_ROWS=1)
+    def test_rejected_bodies(self):
+        for body in ([self.row(name="a"), self.row(name="b")], self.row(name="a")):
+            with self.subTest(body=body):
+                response = self.client.post("/samples/bulk/", body, format="json")
+                self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            "/samples/bulk/?batch_size=0", [self.row(name="a")], format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Sample.objects.exists())
+
+
+@override_settings(RESPONSE_CACHE_ALIAS=None)
+class CursorPaginationTests(APITestCase):
+    """List endpoints page through rows by keyset without gaps or repeats."""
+
+    def setUp(self):
+        self.schema = MetaSchema.objects.create(
+            title="Plasmid", type=MetaSchema.SchemaType.ENTITY, version=1, definition={}
+        )
+
+    def collect(self, url):
+        """Follow next links and return the ids of every page"""
+        pages = []
+        while url:
+            payload = self.client.get(url).json()
+            pages.append([row["id"] for row in payload["results"]])
+            url = payload["next"]
+        return pages
+
+    def test_newest_first_with_id_tiebreak(self):
+        entities = [
+            Entity.objects.create(schema=self.schema, metadata={}) for _ in range(5)
+        ]
+        now = timezone.now()
+        Entity.objects.filter(pk__in=[e.pk for e in entities[:3]]).update(
+            created_at=now
+        )
+        Entity.objects.filter(pk=entities[4].pk).update(
+            created_at=now - datetime.timedelta(days=1)
+        )
+        Entity.objects.filter(pk=entities[3].pk).update(
+            created_at=now + datetime.timedelta(days=1)
+        )
+
+        pages = self.collect("/entities/?page_size=2")
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(
+            sum(pages, []),
+            [entities[i].pk for i in (3, 2, 1, 0, 4)],
+        )
+
+    def test_id_ordering(self):
+        projects = [Project.objects.create(name=f"P{i}") for i in range(3)]
+        pages = self.collect("/projects/?page_size=2")
+        self.assertEqual(sum(pages, []), [p.pk for p in reversed(projects)])
+
+    def test_rows_created_while_paging_are_not_repeated(self):
+        for _ in range(3):
+            Entity.objects.create(schema=self.schema, metadata={})
+        first = self.client.get("/entities/?page_size=2").json()
+        Entity.objects.create(schema=self.schema, metadata={})
+        rest = self.collect(first["next"])
+        seen = [row["id"] for row in first["results"]] + sum(rest, [])
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), 3)
+
+
+@override_settings(RESPONSE_CACHE_ALIAS=None)
+class ResultExportTests(APITestCase):
+    """Exports stream one flat row per result in id order."""
+
+    def setUp(self):
+        schema = MetaSchema.objects.create(
+            title="Assay", type=MetaSchema.SchemaType.RESULT, version=2, definition={}
+        )
+        batch = Batch.objects.create(schema=schema, metadata={"lot": 7})
+        self.sample = Sample.objects.create(
+            schema=schema, batch=batch, metadata={"well": "A1"}
+        )
+        self.analysis = Analysis.objects.create(schema=schema, metadata={})
+        self.results = [
+            Result.objects.create(
+                schema=schema,
+                sample=self.sample,
+                analysis=self.analysis,
+                data={"od": i, "note": "a,b"},
+            )
+            for i in range(3)
+        ]
+
+    def test_ndjson(self):
+        response = self.client.get("/results/export/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('filename="results.ndjson"', response["Content-Disposition"])
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [row["result_id"] for row in rows], [r.pk for r in self.results]
+        )
+        self.assertEqual(rows[1]["result_data"], {"od": 1, "note": "a,b"})
+        self.assertEqual(rows[0]["batch_metadata"], {"lot": 7})
+        self.assertEqual(rows[0]["sample_barcode"], f"S{self.sample.pk}")
+        self.assertEqual(rows[0]["schema_version"], 2)
+
+    def test_csv(self):
+        response = self.client.get("/results/export/", {"format": "csv"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/csv"))
+        text = b"".join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(text)))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(json.loads(rows[2]["result_data"]), {"od": 2, "note": "a,b"})
+        self.assertEqual(rows[0]["analysis_barcode"], f"A{self.analysis.pk}")
+
+    def test_filters_apply(self):
+        response = self.client.get(
+            "/results/export/", {"format": "csv", "schema__version": 1}
+        )
+        text = b"".join(response.streaming_content).decode()
+        self.assertEqual(list(csv.DictReader(io.StringIO(text))), [])
+
+
+@skipUnless(find_spec("pyarrow"), "snapshots need pyarrow")
+class SnapshotTests(APITestCase):
+    """Snapshots hold one typed column per schema property."""
+
+    def setUp(self):
+        self.schema = MetaSchema.objects.create(
+            title="Plasmid",
+            type=MetaSchema.SchemaType.ENTITY,
+            version=3,
+            definition={
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "length": {"type": "integer"},
+                    "gc": {"type": ["number", "null"]},
+                    "circular": {"type": "boolean"},
+                    "tags": {"type": "array"},
+                    "id": {"type": "string"},
+                },
+            },
+        )
+        self.entities = [
+            Entity.objects.create(
+                schema=self.schema,
+                metadata={
+                    "name": "pUC19",
+                    "length": 2686,
+                    "gc": 0.5,
+                    "circular": True,
+                    "tags": ["amp"],
+                    "id": "x",
+                },
+            ),
+            Entity.objects.create(schema=self.schema, metadata={"length": "long"}),
+        ]
+
+    def download(self, file_format):
+        response = self.client.get(
+            f"/metaschemas/{self.schema.pk}/snapshot/", {"format": file_format}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            f'filename="metaschema-{self.schema.pk}-v3.{file_format}"',
+            response["Content-Disposition"],
+        )
+        return b"".join(response.streaming_content)
+
+    def check_table(self, table):
+        self.assertEqual(json.loads(table.schema.metadata[b"metaschema"])["version"], 3)
+        self.assertEqual(str(table.schema.field("length").type), "int64")
+        self.assertEqual(str(table.schema.field("gc").type), "double")
+        rows = table.to_pylist()
+        self.assertEqual([row["id"] for row in rows], [e.pk for e in self.entities])
+        self.assertEqual(
+            {k: rows[0][k] for k in ("name", "length", "circular", "metadata.id")},
+            {"name": "pUC19", "length": 2686, "circular": True, "metadata.id": "x"},
+        )
+        self.assertEqual(json.loads(rows[0]["tags"]), ["amp"])
+        self.assertIsNone(rows[1]["length"])
+
+    def test_parquet(self):
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+
+        self.check_table(pq.read_table(io.BytesIO(self.download("parquet"))))
+
+    def test_arrow(self):
+        import pyarrow  # pylint: disable=import-outside-toplevel
+
+        self.check_table(pyarrow.ipc.open_file(self.download("arrow")).read_all())
+
+
+class MetaSchemaCacheTests(APITestCase):
+    """Cached schemas are dropped in every process when a schema changes."""
+
+    def setUp(self):
+        self.schema = MetaSchema.objects.create(
+            title="Plasmid", type=MetaSchema.SchemaType.ENTITY, version=1, definition={}
+        )
+
+    def test_hits_and_misses(self):
+        cache = MetaSchemaCache()
+        self.assertEqual(cache.get(self.schema.pk).title, "Plasmid")
+        with self.assertNumQueries(0):
+            cache.get(self.schema.pk)
+        self.assertEqual(cache.stats(), {"size": 1, "hits": 1, "misses": 1})
+        with self.assertRaises(MetaSchema.DoesNotExist):
+            cache.get(self.schema.pk + 1)
+
+    def test_schema_save_invalidates(self):
+        schema_cache.get(self.schema.pk)
+        self.schema.title = "Vector"
+        self.schema.save()
+        self.assertEqual(schema_cache.get(self.schema.pk).title, "Vector")
+        self.schema.delete()
+        with self.assertRaises(MetaSchema.DoesNotExist):
+            schema_cache.get(self.schema.pk)
+
+    @override_settings(METASCHEMA_CACHE_ALIAS="default")
+    def test_invalidation_reaches_other_processes(self):
+        self.addCleanup(caches["default"].clear)
+        first, second = MetaSchemaCache(), MetaSchemaCache()
+        first.get(self.schema.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(second.get(self.schema.pk).title, "Plasmid")
+
+        MetaSchema.objects.filter(pk=self.schema.pk).update(title="Vector")
+        first.invalidate(self.schema.pk)
+        self.assertEqual(second.get(self.schema.pk).title, "Vector")
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """ORJSONRenderer output is byte for byte the output of JSONRenderer."""
+
+    def test_matches_json_renderer(self):
+        payloads = [
+            {"a": 1, "b": [1.5, -0.0, 0.1, 123456.789], "c": None, "d": True},
+            {"floats": [1e-05, 1.234e-07, 1e16, 1.5e300, 5e-324, 0.0001]},
+            {"text": 'caf\u00e9 \u2028 \u2029 \x1f \x7f \\ " \U0001f600'},
+            {"when": datetime.datetime(2024, 5, 1, 12, 0, 0, 123456, datetime.UTC)},
+            {"date": datetime.date(2024, 5, 1), "amount": decimal.Decimal("1.25")},
+            {"big": 2**70, "keys": {1: "non-string key"}},
+            [{"nested": [{"deep": ["1e5", ",1e5"]}]}],
+        ]
+        for payload in payloads:
+            with self.subTest(payload=payload):
+                self.assertEqual(
+                    ORJSONRenderer().render(payload),
+                    JSONRenderer().render(payload),
+                )
+
+    def test_indent_falls_back_to_json_renderer(self):
+        payload = {"a": [1, 2]}
+        media_type = "application/json; indent=2"
+        self.assertEqual(
+            ORJSONRenderer().render(payload, media_type),
+            JSONRenderer().render(payload, media_type),
+        )
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    """Generation counters must live in a cache every process sees."""
+
+    def test_per_process_cache_fails_the_check(self):
+        self.assertEqual(check_shared_caches(None), [])
+        with override_settings(RESPONSE_CACHE_ALIAS="default"):
+            errors = check_shared_caches(None)
+        self.assertEqual([error.id for error in errors], ["core.E001"])
+
+    def test_database_cache_fails_the_check(self):
+        database_cache = {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "core_cache",
+        }
+        with override_settings(
+            CACHES={"default": database_cache}, METASCHEMA_CACHE_ALIAS="default"
+        ):
+            errors = check_shared_caches(None)
+        self.assertEqual([error.id for error in errors], ["core.E001"])
+
+
+@override_settings(RESPONSE_CACHE_ALIAS=None)
+class FastReadPathTests(APITestCase):
+    """The values() based list path returns the serializer's exact bytes."""
+
+    urls = ["/entities/", "/batches/", "/samples/", "/analyses/", "/results/"]
+
+    @classmethod
+    def setUpTestData(cls):
+        schema = MetaSchema.objects.create(
+            title="Plasmid", type=MetaSchema.SchemaType.ENTITY, version=1, definition={}
+        )
+        projects = [Project.objects.create(name=f"P{i}") for i in range(3)]
+        blob = {
+            "name": "caf\u00e9 \u2028",
+            "od": 0.731,
+            "tiny": 1e-05,
+            "tags": ["a", "b"],
+            "nested": {"n": None, "ok": True},
+        }
+        for i in range(5):
+            entity = Entity.objects.create(schema=schema, metadata=dict(blob, i=i))
+            entity.projects.set(projects[i % 3 :])
+            batch = Batch.objects.create(schema=schema, metadata={"i": i})
+            batch.projects.set(projects[: i % 3])
+            batch.preparations.add(entity)
+            sample = Sample.objects.create(
+                schema=schema, batch=batch, metadata={"i": i}
+            )
+            analysis = Analysis.objects.create(
+                schema=schema,
+                metadata={"i": i},
+                raw_data_link=None if i % 2 else "https://example.org/raw",
+            )
+            analysis.projects.set(projects)
+            Result.objects.create(
+                schema=schema, sample=sample, analysis=analysis, data=dict(blob, i=i)
+            )
+
+    def test_list_matches_serializer_output(self):
+        for url in self.urls:
+            for query in ("", "?page_size=2", "?metadata__i__gte=2", "?data__i__gte=2"):
+                with self.subTest(url=url, query=query):
+                    with override_settings(FAST_READ_PATH=False):
+                        expected = self.client.get(url + query)
+                    with override_settings(FAST_READ_PATH=True):
+                        response = self.client.get(url + query)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.content, expected.content)
+                    self.assertTrue(json.loads(response.content)["results"])
+
+
+@override_settings(RESPONSE_CACHE_ALIAS=None)
+class SparseFieldsetTests(APITestCase):
+    """`?fields=` and `?exclude=` trim payloads and the columns read."""
+
+    @classmethod
+    def setUpTestData(cls):
+        schema = MetaSchema.objects.create(
+            title="Plasmid", type=MetaSchema.SchemaType.ENTITY, version=1, definition={}
+        )
+        cls.project = Project.objects.create(name="P")
+        batch = Batch.objects.create(schema=schema, metadata={"big": "x" * 100})
+        batch.projects.add(cls.project)
+        cls.sample = Sample.objects.create(
+            schema=schema, batch=batch, metadata={"big": "x" * 100}
+        )
+        Result.objects.create(
+            schema=schema,
+            sample=cls.sample,
+            analysis=Analysis.objects.create(schema=schema, metadata={}),
+            data={"big": "x" * 100},
+        )
+
+    def get_with_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), " ".join(q["sql"] for q in queries)
+
+    def test_fields_defer_json_blobs(self):
+        for fast in (True, False):
+            with self.subTest(fast=fast), override_settings(FAST_READ_PATH=fast):
+                payload, sql = self.get_with_queries(
+                    "/results/?fields=id,barcode,sample"
+                )
+                self.assertEqual(
+                    list(payload["results"][0]), ["id", "barcode", "sample"]
+                )
+                self.assertNotIn('"data"', sql)
+
+                payload, sql = self.get_with_queries("/samples/?exclude=metadata")
+                self.assertNotIn("metadata", payload["results"][0])
+                self.assertIn("batch", payload["results"][0])
+                self.assertNotIn('"metadata"', sql)
+
+    def test_excluded_many_to_many_is_not_fetched(self):
+        for fast in (True, False):
+            with self.subTest(fast=fast), override_settings(FAST_READ_PATH=fast):
+                payload, sql = self.get_with_queries("/batches/?exclude=projects")
+                self.assertNotIn("projects", payload["results"][0])
+                self.assertNotIn("core_batch_projects", sql)
+
+    def test_retrieve(self):
+        payload, sql = self.get_with_queries(
+            f"/samples/{self.sample.pk}/?fields=id,metadata"
+        )
+        self.assertEqual(
+            payload, {"id": self.sample.pk, "metadata": {"big": "x" * 100}}
+        )
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get("/results/?fields=id,nope")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("fields", response.json())
+
+    def test_lineage_fields_are_not_serializer_fields(self):
+        response = self.client.get(f"/samples/{self.sample.pk}/lineage/?fields=barcode")
+        self.assertEqual(response.status_code, 200)
+
+
+class BarcodeTests(APITestCase):
+    """Barcodes are stored on the row and resolved through the index."""
+
+    def setUp(self):
+        self.schema = MetaSchema.objects.create(
+            title="Any", type=MetaSchema.SchemaType.ENTITY, version=1, definition={}
+        )
+        self.entity = Entity.objects.create(
+            schema=self.schema, metadata={"prefix": "CL"}
+        )
+        self.batch = Batch.objects.create(schema=self.schema, metadata={})
+
+    def test_post_save_sees_the_stored_barcode(self):
+        seen = []
+
+        def receiver(sender, instance, created, **kwargs):
+            seen.append((created, instance.barcode))
+
+        post_save.connect(receiver, sender=Sample)
+        self.addCleanup(post_save.disconnect, receiver, sender=Sample)
+        sample = Sample.objects.create(
+            schema=self.schema, batch=self.batch, metadata={}
+        )
+        self.assertEqual(seen, [(True, f"S{sample.pk}")])
+        self.assertEqual(
+            Sample.objects.filter(barcode=f"S{sample.pk}").get().pk, sample.pk
+        )
+
+    def test_create_writes_the_barcode_in_the_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            sample = Sample.objects.create(
+                schema=self.schema, batch=self.batch, metadata={}
+            )
+        writes = [
+            q["sql"] for q in queries if q["sql"].startswith('UPDATE "core_sample"')
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(Sample.objects.get(pk=sample.pk).barcode, f"S{sample.pk}")
+
+        bulk = Sample.objects.bulk_create(
+            [Sample(schema=self.schema, batch=self.batch, metadata={})]
+        )
+        later = Sample.objects.create(schema=self.schema, batch=self.batch, metadata={})
+        self.assertEqual(len({sample.pk, bulk[0].pk, later.pk}), 3)
+        self.assertGreater(later.pk, bulk[0].pk)
+
+    def test_barcode_follows_the_entity_prefix(self):
+        self.entity.metadata = {"prefix": "AB"}
+        self.entity.save(update_fields=["metadata"])
+        self.assertEqual(
+            Entity.objects.get(pk=self.entity.pk).barcode, f"AB{self.entity.pk}"
+        )
+
+    def test_resolve(self):
+        code = f"B{self.batch.pk}"
+        response = self.client.get(f"/barcodes/{code}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["objects"][0]["url"],
+            f"http://testserver/batches/{self.batch.pk}/",
+        )
+        self.assertEqual(self.client.get("/barcodes/B0/").status_code, 404)
+
+        response = self.client.post(
+            "/barcodes/resolve/",
+            {"barcodes": [code, self.entity.barcode, "nope", code]},
+            format="json",
+        )
+        payload = response.json()
+        self.assertEqual(
+            [(r["barcode"], r["objects"][0]["type"]) for r in payload["results"]],
+            [(code, "batch"), (f"CL{self.entity.pk}", "entity")],
+        )
+        self.assertEqual(payload["unresolved"], ["nope"])
+        response = self.client.post(
+            "/barcodes/resolve/", {"barcodes": "B1"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class LineageTests(APITestCase):
+    """Lineage follows Entity -> Batch -> Sample -> Result in both directions."""
+
+    @classmethod
+    def setUpTestData(cls):
+        schema = MetaSchema.objects.create(
+            title="Any", type=MetaSchema.SchemaType.ENTITY, version=1, definition={}
+        )
+        cls.entity = Entity.objects.create(schema=schema, metadata={})
+        cls.batches = [Batch.objects.create(schema=schema, metadata={}) for _ in "ab"]
+        for batch in cls.batches:
+            batch.preparations.add(cls.entity)
+        cls.samples = [
+            Sample.objects.create(schema=schema, batch=batch, metadata={})
+            for batch in (cls.batches[0], cls.batches[0], cls.batches[1])
+        ]
+        analysis = Analysis.objects.create(schema=schema, metadata={})
+        for _ in range(2):
+            Result.objects.create(
+                schema=schema, sample=cls.samples[0], analysis=analysis, data={}
+            )
+
+    def lineage(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        graph = response.json()
+        return graph, Counter(node["type"] for node in graph["nodes"])
+
+    def test_downstream_and_depth(self):
+        url = f"/entities/{self.entity.pk}/lineage/"
+        graph, types = self.lineage(url)
+        self.assertEqual(types, {"entity": 1, "batch": 2, "sample": 3, "result": 2})
+        self.assertEqual(len(graph["edges"]), 7)
+        self.assertIn(
+            [f"entity:{self.entity.pk}", f"batch:{self.batches[1].pk}"], graph["edges"]
+        )
+        self.assertFalse(graph["truncated"])
+
+        graph, types = self.lineage(url, depth=1)
+        self.assertEqual((graph["depth"], types), (1, {"entity": 1, "batch": 2}))
+
+    def test_upstream(self):
+        graph, types = self.lineage(
+            f"/samples/{self.samples[2].pk}/lineage/", direction="upstream"
+        )
+        self.assertEqual(types, {"sample": 1, "batch": 1, "entity": 1})
+        self.assertEqual(
+            graph["edges"],
+            [
+                [f"batch:{self.batches[1].pk}", f"sample:{self.samples[2].pk}"],
+                [f"entity:{self.entity.pk}", f"batch:{self.batches[1].pk}"],
+            ],
+        )
+        response = self.client.get(
+            f"/samples/{self.samples[2].pk}/lineage/", {"direction": "sideways"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_truncation_limits_the_query(self):
+        with override_settings(LINEAGE_MAX_NODES=4), CaptureQueriesContext(
+            connection
+        ) as queries:
+            graph, types = self.lineage(f"/entities/{self.entity.pk}/lineage/")
+        self.assertTrue(graph["truncated"])
+        self.assertEqual(types, {"entity": 1, "batch": 2})
+        self.assertEqual(len(graph["edges"]), 2)
+        self.assertTrue(
+            any("core_sample" in q["sql"] and "LIMIT 2" in q["sql"] for q in queries)
+        )
+
+
+class ResultAggregateTests(APITestCase):
+    """The aggregate action computes statistics over a JSON path in SQL."""
+
+    @classmethod
+    def setUpTestData(cls):
+        schema = MetaSchema.objects.create(
+            title="Titer", type=MetaSchema.SchemaType.RESULT, version=1, definition={}
+        )
+        cls.analysis = Analysis.objects.create(schema=schema, metadata={})
+        cls.batches = [Batch.objects.create(schema=schema, metadata={}) for _ in "ab"]
+        values = {0: [1, 2.5, 4.5, "n/a"], 1: [10, None, True]}
+        for index, titers in values.items():
+            sample = Sample.objects.create(
+                schema=schema, batch=cls.batches[index], metadata={}
+            )
+            for titer in titers:
+                Result.objects.create(
+                    schema=schema,
+                    sample=sample,
+                    analysis=cls.analysis,
+                    data={"assay": {"titer": titer}},
+                )
+
+    def test_group_by_batch(self):
+        response = self.client.get(
+            "/results/aggregate/",
+            {
+                "path": "assay__titer",
+                "group_by": "sample__batch",
+                "aggregates": "count,sum,avg,min,max,stddev",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        first, second = response.json()["results"]
+        self.assertEqual(first["sample__batch"], self.batches[0].pk)
+        self.assertEqual(first["count"], 3)
+        self.assertAlmostEqual(first["sum"], 8)
+        self.assertAlmostEqual(first["avg"], 8 / 3)
+        self.assertAlmostEqual(first["min"], 1)
+        self.assertAlmostEqual(first["max"], 4.5)
+        self.assertAlmostEqual(first["stddev"], 1.755942292142123)
+        self.assertEqual(second["count"], 1)
+        self.assertIsNone(second["stddev"])
+
+    def test_without_group_by(self):
+        response = self.client.get("/results/aggregate/", {"path": "assay__titer"})
+        self.assertEqual(
+            response.json()["results"], [{"count": 4, "avg": 4.5, "min": 1, "max": 10}]
+        )
+
+    def test_invalid_parameters(self):
+        for params in (
+            {},
+            {"path": "titer", "group_by": "sample__metadata"},
+            {"path": "titer", "aggregates": "median"},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get("/results/aggregate/", params)
+                self.assertEqual(response.status_code, 400)
+
+
+class RequestTimingTests(APITestCase):
+    """Requests report their timings in Server-Timing and /metrics."""
+
+    def setUp(self):
+        metrics.clear()
+        self.schema = MetaSchema.objects.create(
+            title="Plasmid",
+            type=MetaSchema.SchemaType.ENTITY,
+            version=1,
+            definition={"type": "object"},
+        )
+        self.project = Project.objects.create(name="P")
+
+    def test_server_timing_header(self):
+        response = self.client.post(
+            "/entities/",
+            {"schema": self.schema.pk, "metadata": {}, "projects": [self.project.pk]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        entries = [
+            entry.split(";")[0] for entry in response["Server-Timing"].split(", ")
+        ]
+        self.assertEqual(
+            entries, ["db", "validation", "serialization", "total", "size"]
+        )
+        self.assertIn(
+            f'size;desc="{len(response.content)} bytes"', response["Server-Timing"]
+        )
+
+    def test_metrics_endpoint(self):
+        self.client.get("/entities/")
+        self.client.get("/entities/")
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn("# TYPE core_request_duration_seconds histogram", body)
+        self.assertIn(
+            'core_request_queries_count{endpoint="entity-list",method="GET"} 2', body
+        )
+        self.assertIn(
+            'core_response_size_bytes_bucket{endpoint="entity-list",method="GET",'
+            'le="+Inf"} 2',
+            body,
+        )
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_request_log(self):
+        with self.assertLogs("core.requests", "WARNING") as logs:
+            self.client.get("/entities/")
+        self.assertIn("Slow request GET /entities/", logs.output[0])
+        self.assertIn('FROM "core_entity"', logs.output[0])
+
+
+class BenchmarkTests(APITestCase):
+    def test_generate_and_benchmark(self):
+        call_command(
+            "generate_dataset",
+            projects=2,
+            entities=6,
+            batches=2,
+            plate_size=4,
+            analyses=2,
+            results_per_sample=3,
+            chunk_size=5,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(Project.objects.count(), 2)
+        self.assertEqual(MetaSchema.objects.count(), 10)
+        self.assertEqual(Entity.objects.count(), 6)
+        self.assertEqual(Batch.objects.first().preparations.count(), 3)
+        self.assertEqual(Sample.objects.count(), 8)
+        self.assertEqual(Result.objects.count(), 24)
+        self.assertFalse(Result.objects.filter(barcode="").exists())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.json")
+            call_command(
+                "benchmark_api",
+                iterations=2,
+                warmup=0,
+                output=path,
+                host="testserver",
+                stdout=io.StringIO(),
+            )
+            with open(path, encoding="utf-8") as f:
+                report = json.load(f)
+            call_command(
+                "benchmark_api",
+                iterations=1,
+                warmup=0,
+                endpoints=["result-list"],
+                compare=path,
+                host="testserver",
+                stdout=io.StringIO(),
+            )
+
+        self.assertEqual(len(report["endpoints"]), 21)
+        self.assertEqual(report["dataset"]["result"], 24)
+        self.assertEqual(Result.objects.count(), 24)
+        for endpoint in report["endpoints"]:
+            self.assertEqual(endpoint["errors"], 0, endpoint["name"])
+            self.assertGreater(endpoint["queries"]["max"], 0)
+
+    def test_generate_rejects_zero_schema_versions(self):
+        with self.assertRaisesMessage(CommandError, "--schema-versions"):
+            call_command("generate_dataset", schema_versions=0, stdout=io.StringIO())
+        self.assertFalse(Project.objects.exists())
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Reads inside a transaction go to the primary, hence no TestCase."""
+
+    def route(self, method, cookies=None, write=None):
+        """Return the read alias seen inside an entity list request"""
+        seen = []
+
+        def get_response(request):
+            middleware.process_view(
+                request, EntityViewSet.as_view({"get": "list"}), (), {}
+            )
+            seen.append(router.db_for_read(Entity))
+            if write is None:
+                Project.objects.create(name=f"{method} {cookies}")
+            else:
+                write()
+            seen.append(router.db_for_read(Entity))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        request = getattr(RequestFactory(), method.lower())("/entities/")
+        request.COOKIES.update(cookies or {})
+        response = middleware(request)
+        return seen, response
+
+    def test_safe_requests_read_from_replica_until_they_write(self):
+        seen, response = self.route("GET")
+        self.assertEqual(seen, ["replica_1", "default"])
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_database_cache_writes_do_not_stick(self):
+        cache_table = DatabaseCache("core_cache", {}).cache_model_class
+        self.assertEqual(router.db_for_write(cache_table), "default")
+        seen, response = self.route(
+            "GET", write=lambda: router.db_for_write(cache_table)
+        )
+        self.assertEqual(seen, ["replica_1", "replica_1"])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_unsafe_and_sticky_requests_read_from_primary(self):
+        self.assertEqual(self.route("POST")[0], ["default", "default"])
+        self.assertEqual(
+            self.route("GET", {STICKY_COOKIE: "1"})[0], ["default", "default"]
+        )
+
+    def test_reads_outside_requests_use_default_routing(self):
+        self.assertIsNone(ReplicaRouter().db_for_read(Entity))
+        self.assertEqual(router.db_for_read(Entity), "default")
+
+    def test_databases_from_env(self):
+        databases = databases_from_env(
+            {
+                "DB_ENGINE": "postgresql",
+                "DB_HOST": "primary",
+                "DB_PORT": "5432",
+                "DB_REPLICAS": "replica-a, replica-b:6432",
+                "DB_CONN_MAX_AGE": "none",
+            },
+            Path("/srv"),
+        )
+        self.assertEqual(list(databases), ["default", "replica_1", "replica_2"])
+        self.assertIsNone(databases["default"]["CONN_MAX_AGE"])
+        self.assertTrue(databases["default"]["CONN_HEALTH_CHECKS"])
+        self.assertEqual(databases["replica_1"]["HOST"], "replica-a")
+        self.assertEqual(databases["replica_1"]["PORT"], "5432")
+        self.assertEqual(databases["replica_2"]["PORT"], "6432")
+        self.assertEqual(databases["replica_2"]["TEST"], {"MIRROR": "default"})
+        self.assertNotIn("OPTIONS", databases["default"])
+
+
+@override_settings(RESPONSE_CACHE_ALIAS="default")
+class ConditionalGetTests(APITestCase):
+    """List and detail responses are validated by ETag and cached per generation."""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.addCleanup(caches["default"].clear)
+        self.schema = MetaSchema.objects.create(
+            title="Any", type=MetaSchema.SchemaType.SAMPLE, version=1, definition={}
+        )
+        self.batch = Batch.objects.create(schema=self.schema, metadata={})
+        self.samples = [
+            Sample.objects.create(
+                schema=self.schema, batch=self.batch, metadata={"well": i}
+            )
+            for i in range(2)
+        ]
+        self.project = Project.objects.create(name="P")
+        self.entities = [
+            Entity.objects.create(schema=self.schema, metadata={}) for _ in range(2)
+        ]
+
+    def test_not_modified(self):
+        for url in ("/samples/", f"/samples/{self.samples[0].pk}/"):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag, last_modified = response["ETag"], response["Last-Modified"]
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b"")
+                response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+                self.assertEqual(response.status_code, 304)
+                response = self.client.get(url, HTTP_IF_NONE_MATCH='W/"other"')
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_follows_filters_and_accept(self):
+        etags = {
+            self.client.get("/samples/")["ETag"],
+            self.client.get("/samples/", {"batch": self.batch.pk})["ETag"],
+            self.client.get("/samples/", HTTP_ACCEPT="application/json; indent=2")[
+                "ETag"
+            ],
+        }
+        self.assertEqual(len(etags), 3)
+        response = self.client.get("/samples/")
+        self.assertIn("Accept", response["Vary"])
+        self.assertIn(response["ETag"], etags)
+
+    def assert_invalidated_by(self, obj, write):
+        """Check a cached detail response is served until write runs"""
+        url = f"/{'samples' if isinstance(obj, Sample) else 'entities'}/{obj.pk}/"
+        before = self.client.get(url).json()["metadata"]
+        # update() leaves updated_at and the generation alone
+        type(obj).objects.filter(pk=obj.pk).update(metadata={"changed": True})
+        self.assertEqual(self.client.get(url).json()["metadata"], before)
+        write()
+        self.assertEqual(self.client.get(url).json()["metadata"], {"changed": True})
+
+    def test_save_invalidates(self):
+        self.assert_invalidated_by(
+            self.samples[0], lambda: self.samples[1].save(update_fields=["metadata"])
+        )
+
+    def test_bulk_create_invalidates(self):
+        self.assert_invalidated_by(
+            self.samples[0],
+            lambda: self.client.post(
+                "/samples/bulk/",
+                [{"schema": self.schema.pk, "batch": self.batch.pk, "metadata": {}}],
+                format="json",
+            ),
+        )
+
+    def test_bulk_update_invalidates(self):
+        self.assert_invalidated_by(
+            self.samples[0],
+            lambda: self.client.patch(
+                "/samples/bulk-patch/",
+                {
+                    "ids": [self.samples[1].pk],
+                    "patch": [{"op": "add", "path": "/x", "value": 1}],
+                },
+                format="json",
+            ),
+        )
+
+    def test_many_to_many_change_invalidates(self):
+        self.assert_invalidated_by(
+            self.entities[0], lambda: self.entities[1].projects.add(self.project)
+        )
+
+
+@override_settings(RESPONSE_CACHE_ALIAS=None)
+class SummaryTests(APITestCase):
+    """Batch and analysis summaries follow sample and result writes."""
+
+    def setUp(self):
+        self.schema = MetaSchema.objects.create(
+            title="Any", type=MetaSchema.SchemaType.SAMPLE, version=1, definition={}
+        )
+        self.batches = [
+            Batch.objects.create(schema=self.schema, metadata={}) for _ in range(2)
+        ]
+        self.analysis = Analysis.objects.create(schema=self.schema, metadata={})
+
+    def summary(self, batch):
+        summary = BatchSummary.objects.get(pk=batch.pk)
+        return summary.sample_count, summary.result_count
+
+    def add_results(self, sample, n):
+        results = Result.objects.bulk_create(
+            Result(
+                schema=self.schema, sample_id=sample.pk, analysis=self.analysis, data={}
+            )
+            for _ in range(n)
+        )
+        bulk_created.send(sender=Result, instances=results)
+
+    def test_counts_follow_writes(self):
+        first, second = self.batches
+        samples = Sample.objects.bulk_create(
+            Sample(schema=self.schema, batch=first, metadata={}) for _ in range(3)
+        )
+        bulk_created.send(sender=Sample, instances=samples)
+        self.add_results(samples[0], 4)
+        Result.objects.create(
+            schema=self.schema, sample=samples[1], analysis=self.analysis, data={}
+        )
+        self.assertEqual(self.summary(first), (3, 5))
+        self.assertEqual(AnalysisSummary.objects.get().result_count, 5)
+
+        samples[0].batch = second
+        samples[0].save()
+        self.assertEqual(self.summary(first), (2, 1))
+        self.assertEqual(self.summary(second), (1, 4))
+
+        samples[0].delete()
+        self.assertEqual(self.summary(second), (0, 0))
+        self.assertEqual(AnalysisSummary.objects.get().result_count, 1)
+        for model in SUMMARIES:
+            self.assertEqual(verify(model), [])
+
+    def test_list_and_detail(self):
+        sample = Sample.objects.create(
+            schema=self.schema, batch=self.batches[0], metadata={}
+        )
+        self.add_results(sample, 2)
+        batch = self.client.get(f"/batches/{self.batches[0].pk}/").json()
+        self.assertEqual((batch["sample_count"], batch["result_count"]), (1, 2))
+
+        BatchSummary.objects.filter(pk=self.batches[1].pk).delete()
+        for url in ("/batches/", "/analyses/", "/batches/?fields=id,result_count"):
+            with self.subTest(url=url):
+                with override_settings(FAST_READ_PATH=False):
+                    expected = self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.content, expected.content)
+                self.assertFalse(
+                    [q for q in queries if '"core_sample"' in q["sql"]]
+                    + [q for q in queries if '"core_result"' in q["sql"]]
+                )
+        rows = self.client.get("/batches/").json()["results"]
+        self.assertEqual([row["result_count"] for row in rows], [None, 2])
+
+    def test_list_etag_changes_with_summary(self):
+        etag = self.client.get("/batches/")["ETag"]
+        Sample.objects.create(schema=self.schema, batch=self.batches[0], metadata={})
+        response = self.client.get("/batches/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_rebuild_command_repairs_drift(self):
+        sample = Sample.objects.create(
+            schema=self.schema, batch=self.batches[0], metadata={}
+        )
+        self.add_results(sample, 3)
+        BatchSummary.objects.update(result_count=0)
+        AnalysisSummary.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command("rebuild_summaries", verify=True, stdout=io.StringIO())
+        call_command("rebuild_summaries", stdout=io.StringIO())
+        call_command("rebuild_summaries", verify=True, stdout=io.StringIO())
+        self.assertEqual(self.summary(self.batches[0]), (1, 3))
+
+
+class JSONPathFilterTests(APITestCase):
+    """List endpoints filter on paths inside JSON blobs."""
+
+    def setUp(self):
+        self.schema = MetaSchema.objects.create(
+            title="Strain", type=MetaSchema.SchemaType.ENTITY, version=1, definition={}
+        )
+        self.entities = [
+            Entity.objects.create(schema=self.schema, metadata=metadata)
+            for metadata in (
+                {"strain": "K12", "culture": {"od": 0.5}, "tags": ["a"]},
+                {"strain": "BL21", "culture": {"od": 1.5}, "tags": ["b"]},
+                {"strain": "K12-x", "culture": {"od": 2.5}},
+                {"strain": "007", "culture": {}},
+            )
+        ]
+
+    def ids(self, query):
+        response = self.client.get(f"/entities/?{query}")
+        self.assertEqual(response.status_code, 200)
+        pks = [entity.pk for entity in self.entities]
+        return sorted(pks.index(row["id"]) for row in response.json()["results"])
+
+    def test_operators(self):
+        for query, expected in (
+            ("metadata__strain=K12", [0]),
+            ("metadata__strain__ne=K12", [1, 2, 3]),
+            ("metadata__strain=007", [3]),
+            ('metadata__strain="007"', [3]),
+            ("metadata__culture__od=1.5", [1]),
+            ("metadata__culture__od__gte=1.5", [1, 2]),
+            ("metadata__culture__od__lt=1", [0]),
+            ("metadata__culture__od__range=1,2", [1]),
+            ("metadata__strain__in=K12,BL21", [0, 1]),
+            ("metadata__strain__contains=k12", [0, 2]),
+            ("metadata__culture__od__isnull=true", [3]),
+            ("metadata__strain=K12&metadata__culture__od__lt=1", [0]),
+        ):
+            with self.subTest(query):
+                self.assertEqual(self.ids(query), expected)
+
+        response = self.client.get("/entities/?metadata__culture__od__range=1")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/entities/?metadata__tags__contains=["a"]')
+        if connection.features.supports_json_field_contains:
+            self.assertEqual(self.ids('metadata__tags__contains=["a"]'), [0])
+        else:
+            self.assertEqual(response.status_code, 400)
+
+    @skipUnless(connection.vendor == "sqlite", "generated columns are SQLite only")
+    def test_declared_paths_use_generated_columns(self):
+        self.schema.indexed_paths = ["culture__od"]
+        self.schema.save()
+        self.assertEqual(generated_columns(Entity), set())
+
+        call_command("sync_json_indexes", stdout=io.StringIO())
+        column = generated_column_name("metadata", "culture__od")
+        self.assertEqual(generated_columns(Entity), {column})
+        self.assertEqual(sync_json_indexes(Entity, "metadata", dry_run=True), [])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.ids("metadata__culture__od__gte=1.5"), [1, 2])
+        self.assertTrue(any(column in query["sql"] for query in queries))
+        self.assertEqual(self.ids("metadata__culture__od__isnull=true"), [3])
+
+        # A migration rebuilding the table loses the column; migrate restores it
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DROP INDEX "{index_name(Entity, "metadata", "culture__od")}"'
+            )
+            cursor.execute(f'ALTER TABLE "core_entity" DROP COLUMN "{column}"')
+        out = io.StringIO()
+        emit_post_migrate_signal(1, False, "default", stdout=out)
+        self.assertEqual(generated_columns(Entity), {column})
+        self.assertIn("core.Entity: ran 2 JSON path index statements", out.getvalue())
+
+        self.schema.indexed_paths = []
+        self.schema.save()
+        call_command("sync_json_indexes", stdout=io.StringIO())
+        self.assertEqual(generated_columns(Entity), set())
+        self.assertEqual(self.ids("metadata__culture__od__gte=1.5"), [1, 2])
+
+
+@override_settings(RESPONSE_CACHE_ALIAS=None)
+class ChangeFeedTests(APITestCase):
+    """The change feed replays writes in commit order."""
+
+    def setUp(self):
+        self.schema = MetaSchema.objects.create(
+            title="Any", type=MetaSchema.SchemaType.ENTITY, version=1, definition={}
+        )
+        self.project = Project.objects.create(name="P")
+        self.enterContext(override_settings(CHANGE_FEED_SETTLE_SECONDS=0))
+
+    def feed(self, since=0, **params):
+        response = self.client.get("/changes/", {"since": since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_upserts_and_tombstones(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Entity.objects.create(schema=self.schema, metadata={"v": 1})
+            second = Entity.objects.create(schema=self.schema, metadata={})
+        with self.captureOnCommitCallbacks(execute=True):
+            first.metadata = {"v": 2}
+            first.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            first.projects.add(self.project)
+        deleted = second.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+
+        feed = self.feed()
+        self.assertFalse(feed["has_more"])
+        self.assertEqual(
+            [(c["id"], c["action"]) for c in feed["results"]],
+            [(first.pk, "upsert"), (deleted, "delete")],
+        )
+        entity = self.client.get(f"/entities/{first.pk}/").json()
+        self.assertEqual(feed["results"][0]["object"], entity)
+        self.assertEqual(entity["projects"], [self.project.pk])
+
+        page = self.feed(page_size=1)
+        self.assertTrue(page["has_more"])
+        self.assertEqual(len(page["results"]), 1)
+        while page["has_more"]:
+            page = self.client.get(page["next"]).json()
+        self.assertEqual(page["cursor"], feed["cursor"])
+        self.assertEqual(self.feed(feed["cursor"])["results"], [])
+
+    def test_changes_commit_with_the_write(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Entity.objects.create(schema=self.schema, metadata={})
+            raise RuntimeError
+        self.assertFalse(Change.objects.exists())
+
+        entity = Entity.objects.create(schema=self.schema, metadata={})
+        self.assertTrue(Change.objects.filter(object_id=entity.pk).exists())
+
+    def test_unsettled_changes_hold_the_cursor(self):
+        first = Entity.objects.create(schema=self.schema, metadata={})
+        second = Entity.objects.create(schema=self.schema, metadata={})
+        Change.objects.filter(object_id=first.pk).update(
+            changed_at=timezone.now() - datetime.timedelta(minutes=1)
+        )
+        with override_settings(CHANGE_FEED_SETTLE_SECONDS=30):
+            feed = self.feed()
+            self.assertEqual([c["id"] for c in feed["results"]], [first.pk])
+            self.assertFalse(feed["has_more"])
+            self.assertEqual(self.feed(feed["cursor"])["results"], [])
+        self.assertEqual(
+            [c["id"] for c in self.feed(feed["cursor"])["results"]], [second.pk]
+        )
+
+    def test_bulk_writes_and_model_filter(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "generate_dataset",
+                projects=1,
+                entities=2,
+                batches=1,
+                plate_size=2,
+                analyses=1,
+                results_per_sample=1,
+                stdout=io.StringIO(),
+            )
+        feed = self.feed(models="sample,result")
+        self.assertEqual(
+            sorted(c["model"] for c in feed["results"]),
+            ["result", "result", "sample", "sample"],
+        )
+        self.assertEqual(
+            self.client.get("/changes/", {"models": "project"}).status_code, 400
+        )
+
+    def test_prune_old_changes(self):
+        entity = Entity.objects.create(schema=self.schema, metadata={})
+        Change.objects.update(changed_at=timezone.now() - datetime.timedelta(days=40))
+        entity.save()
+        out = io.StringIO()
+        call_command("prune_changes", batch_size=1, stdout=out)
+        self.assertIn("Deleted 1 change feed entries", out.getvalue())
+        self.assertEqual(
+            [c["cursor"] for c in self.feed()["results"]],
+            list(Change.objects.values_list("id", flat=True)),
+        )
+        call_command("prune_changes", days=0, stdout=io.StringIO())
+        self.assertFalse(Change.objects.exists())
+
+    def test_updated_after_filter(self):
+        entity = Entity.objects.create(schema=self.schema, metadata={})
+        after = entity.updated_at.isoformat()
+        self.assertEqual(
+            self.client.get("/entities/", {"updated_after": after}).json()["results"],
+            [],
+        )
+        Entity.objects.filter(pk=entity.pk).update(
+            updated_at=entity.updated_at + datetime.timedelta(seconds=1)
+        )
+        rows = self.client.get("/entities/", {"updated_after": after}).json()
+        self.assertEqual([row["id"] for row in rows["results"]], [entity.pk])
+        self.assertEqual(
+            self.client.get("/entities/", {"updated_after": "yesterday"}).status_code,
+            400,
+        )
+
+
+class ChangeFeedAtomicityTests(TransactionTestCase):
+    """Under autocommit a save and its feed entry commit together."""
+
+    def test_failed_receiver_rolls_back_the_row(self):
+        schema = MetaSchema.objects.create(
+            title="Any", type=MetaSchema.SchemaType.ENTITY, version=1, definition={}
+        )
+
+        def fail(sender, **kwargs):
+            raise RuntimeError("crash after the feed entry")
+
+        post_save.connect(fail, sender=Entity)
+        self.addCleanup(post_save.disconnect, fail, sender=Entity)
+        with self.assertRaises(RuntimeError):
+            Entity.objects.create(schema=schema, metadata={})
+        self.assertFalse(Entity.objects.exists())
+        self.assertFalse(Change.objects.exists())
+
+
+@override_settings(RESPONSE_CACHE_ALIAS=None)
+class MaterialTests(APITestCase):
+    """Materials are created singly or in bulk, projects assigned in bulk."""
+
+    def setUp(self):
+        self.schema = MetaSchema.objects.create(
+            title="Vial",
+            type=MetaSchema.SchemaType.MATERIAL,
+            version=1,
+            definition={"type": "object", "required": ["volume"]},
+        )
+        self.entity = Entity.objects.create(schema=self.schema, metadata={})
+        self.projects = [Project.objects.create(name=f"P{i}") for i in range(3)]
+
+    def payload(self, **metadata):
+        return {
+            "schema": self.schema.pk,
+            "entity": self.entity.pk,
+            "metadata": metadata,
+            "projects": [self.projects[0].pk],
+        }
+
+    def test_create_and_bulk_create(self):
+        response = self.client.post(
+            "/materials/", self.payload(volume=1), format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["barcode"], f"M{response.json()['id']}")
+        response = self.client.post("/materials/", self.payload(), format="json")
+        self.assertEqual(response.status_code, 400)
+
+        rows = [self.payload(volume=i) for i in range(5)] + [self.payload()]
+        response = self.client.post("/materials/bulk/", rows, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 5)
+        self.assertEqual([f["index"] for f in response.json()["failed"]], [5])
+
+        listed = self.client.get(f"/materials/?entity={self.entity.pk}").json()
+        self.assertEqual(len(listed["results"]), 6)
+        self.assertEqual(listed["results"][0]["projects"], [self.projects[0].pk])
+
+    def test_bulk_project_assignment(self):
+        entities = Entity.objects.bulk_create(
+            Entity(schema=self.schema, metadata={}) for _ in range(50)
+        )
+        ids = [entity.pk for entity in entities]
+        Entity.projects.through.objects.create(
+            entity_id=ids[0], project_id=self.projects[1].pk
+        )
+        body = {"ids": ids, "add": [p.pk for p in self.projects[:2]]}
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post("/entities/projects/", body, format="json")
+        self.assertEqual(response.json(), {"added": 99, "removed": 0})
+        self.assertLess(len(queries), 15)
+        self.assertEqual(
+            Change.objects.filter(model="entity", object_id__in=ids).count(), 50
+        )
+
+        body = {"ids": ids[:10], "remove": [self.projects[0].pk]}
+        response = self.client.post("/entities/projects/", body, format="json")
+        self.assertEqual(response.json(), {"added": 0, "removed": 10})
+        self.assertEqual(
+            list(entities[0].projects.values_list("pk", flat=True)),
+            [self.projects[1].pk],
+        )
+
+        body = {"ids": [0], "add": [self.projects[0].pk, 0]}
+        response = self.client.post("/materials/projects/", body, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("add", response.json())
+
+
+class SchemaMigrationTests(APITestCase):
+    """Queued schema migrations run in checkpointed chunks in a worker."""
+
+    def setUp(self):
+        self.source = MetaSchema.objects.create(
+            title="Well", type=MetaSchema.SchemaType.SAMPLE, version=1, definition={}
+        )
+        self.target = MetaSchema.objects.create(
+            title="Well",
+            type=MetaSchema.SchemaType.SAMPLE,
+            version=2,
+            definition={
+                "type": "object",
+                "required": ["volume"],
+                "properties": {"volume": {"type": "number"}},
+            },
+        )
+        batch = Batch.objects.create(schema=self.source, metadata={})
+        self.samples = [
+            Sample.objects.create(
+                schema=self.source,
+                batch=batch,
+                metadata={"volume": "x" if i == 2 else i},
+            )
+            for i in range(5)
+        ]
+
+    def schemas(self):
+        return [
+            schema
+            for _, schema in Sample.objects.order_by("pk").values_list("pk", "schema")
+        ]
+
+    def migrate(self, **options):
+        call_command(
+            "migrate_schema", once=True, workers=1, stdout=io.StringIO(), **options
+        )
+
+    def test_api_queues_and_worker_migrates(self):
+        response = self.client.post(
+            "/schema-migrations/",
+            {"source": self.source.pk, "target": self.target.pk},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "pending")
+        self.assertEqual(set(self.schemas()), {self.source.pk})
+
+        self.migrate(chunk_size=2)
+        run = SchemaMigration.objects.get(pk=response.json()["id"])
+        self.assertEqual(run.status, SchemaMigration.Status.COMPLETED)
+        self.assertEqual((run.processed, run.migrated, run.failed), (5, 4, 1))
+        self.assertEqual([error["id"] for error in run.errors], [self.samples[2].pk])
+        self.assertEqual(run.last_pk, self.samples[-1].pk)
+        self.assertEqual(
+            self.schemas(),
+            [self.target.pk] * 2 + [self.source.pk] + [self.target.pk] * 2,
+        )
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        SchemaMigration.objects.create(source=self.source, target=self.target)
+        run = claim_run("worker")
+        self.assertIsNone(claim_run("other"))
+
+        def interrupt(_):
+            raise RuntimeError("worker stopped")
+
+        with self.assertRaises(RuntimeError):
+            run_schema_migration(run, workers=1, chunk_size=2, progress=interrupt)
+        run.refresh_from_db()
+        self.assertEqual(run.status, SchemaMigration.Status.FAILED)
+        self.assertEqual((run.last_pk, run.processed), (self.samples[1].pk, 2))
+        self.assertEqual(self.schemas()[:3], [self.target.pk] * 2 + [self.source.pk])
+
+        response = self.client.post(f"/schema-migrations/{run.pk}/resume/")
+        self.assertEqual(response.json()["status"], "pending")
+        resume = self.client.post(f"/schema-migrations/{run.pk}/resume/")
+        self.assertEqual(resume.status_code, 400)
+
+        self.migrate()
+        run.refresh_from_db()
+        self.assertEqual(run.status, SchemaMigration.Status.COMPLETED)
+        self.assertEqual((run.processed, run.migrated, run.failed), (5, 4, 1))
+
+    def test_stale_run_is_taken_over(self):
+        run = SchemaMigration.objects.create(
+            source=self.source,
+            target=self.target,
+            status=SchemaMigration.Status.RUNNING,
+            worker="gone",
+            heartbeat_at=timezone.now(),
+        )
+        self.assertIsNone(claim_run("worker"))
+        run.heartbeat_at = timezone.now() - datetime.timedelta(hours=1)
+        run.save()
+        self.assertEqual(claim_run("worker").worker, "worker")
+
+        # The old worker may not write another chunk
+        run.refresh_from_db()
+        run.worker = "gone"
+        with self.assertRaises(RunLost):
+            run_schema_migration(run, workers=1)
+
+    def test_dry_run_changes_nothing(self):
+        self.migrate(source=self.source.pk, target=self.target.pk, dry_run=True)
+        run = SchemaMigration.objects.get()
+        self.assertEqual((run.status, run.migrated, run.failed), ("completed", 4, 1))
+        self.assertEqual(set(self.schemas()), {self.source.pk})
+
+
+class ImportJobTests(APITestCase):
+    """Uploaded files are imported by a worker in checkpointed chunks."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.schema = MetaSchema.objects.create(
+            title="Plate",
+            type=MetaSchema.SchemaType.SAMPLE,
+            version=1,
+            definition={
+                "type": "object",
+                "required": ["well"],
+                "properties": {"od": {"type": "number"}},
+            },
+        )
+        self.batch = Batch.objects.create(schema=self.schema, metadata={})
+
+    def upload(self, rows):
+        content = "well,od,qc__cv,batch\n" + "".join(f"{row}\n" for row in rows)
+        return self.client.post(
+            "/imports/",
+            {
+                "file": SimpleUploadedFile("plate.csv", content.encode()),
+                "schema": self.schema.pk,
+                "defaults": json.dumps({"batch": self.batch.pk}),
+            },
+            format="multipart",
+        )
+
+    def test_upload_and_import(self):
+        rows = [f"A{i},0.{i},{i}," for i in range(1, 6)]
+        rows += [",0.5,,", "B1,high,,", f"B2,1,,{self.batch.barcode}", "B3,1,,,x"]
+        response = self.upload(rows)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "pending")
+
+        call_command("process_imports", once=True, chunk_size=4, stdout=io.StringIO())
+        job = self.client.get(f"/imports/{response.json()['id']}/").json()
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual((job["total"], job["imported"], job["failed"]), (9, 6, 3))
+        self.assertEqual([error["row"] for error in job["errors"]], [6, 7, 9])
+
+        sample = Sample.objects.get(metadata__well="A2")
+        self.assertEqual(sample.metadata, {"well": "A2", "od": 0.2, "qc": {"cv": "2"}})
+        self.assertEqual(Sample.objects.filter(batch=self.batch).count(), 6)
+        self.assertEqual(BatchSummary.objects.get(pk=self.batch.pk).sample_count, 6)
+
+    def test_stale_job_resumes_from_checkpoint(self):
+        rows = [f"A{i},1,," for i in range(1, 5)]
+        job = ImportJob.objects.get(pk=self.upload(rows).json()["id"])
+        Sample.objects.create(
+            schema=self.schema, batch=self.batch, metadata={"well": "A1"}
+        )
+        stale = timezone.now() - datetime.timedelta(hours=1)
+        ImportJob.objects.filter(pk=job.pk).update(
+            status=ImportJob.Status.RUNNING,
+            worker="gone",
+            heartbeat_at=stale,
+            started_at=stale,
+            total=4,
+            last_row=2,
+            processed=2,
+            imported=1,
+        )
+
+        claimed = claim_job("worker")
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertIsNone(claim_job("other"))
+        run_import(claimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.imported), ("completed", 4, 3))
+        self.assertEqual(
+            sorted(Sample.objects.values_list("metadata__well", flat=True)),
+            ["A1", "A3", "A4"],
+        )
+
+    def test_cells_follow_declared_types(self):
+        self.schema.definition = {
+            "type": "object",
+            "properties": {
+                "well": {"type": "string"},
+                "plate": {"type": "integer"},
+                "od": {"type": ["number", "null"]},
+                "qc": {"properties": {"passed": {"type": "boolean"}}},
+            },
+        }
+        job = ImportJob(schema=self.schema, defaults={})
+        row = {
+            "well": "007",
+            "plate": " 12 ",
+            "od": "1e-3",
+            "qc__passed": "Yes",
+            "clone": "0123",
+            "batch": "",
+        }
+        self.assertEqual(
+            build_payload(job, ("batch",), row)["metadata"],
+            {
+                "well": "007",
+                "plate": 12,
+                "od": 0.001,
+                "qc": {"passed": True},
+                "clone": "0123",
+            },
+        )
+        row = {"plate": "1.5", "od": "nan", "qc__passed": "maybe"}
+        self.assertEqual(
+            build_payload(job, (), row)["metadata"],
+            {"plate": "1.5", "od": "nan", "qc": {"passed": "maybe"}},
+        )
+
+    def test_rejects_other_schema_types(self):
+        self.schema.type = MetaSchema.SchemaType.BATCH
+        self.schema.save()
+        self.assertEqual(self.upload(["A1,1,,"]).status_code, 400)
+
+
+class BulkPatchTests(APITestCase):
+    """JSON Patch operations are applied to many objects in the database."""
+
+    def setUp(self):
+        self.schema = MetaSchema.objects.create(
+            title="Well",
+            type=MetaSchema.SchemaType.SAMPLE,
+            version=1,
+            definition={
+                "type": "object",
+                "properties": {"status": {"enum": ["pending", "discarded"]}},
+            },
+        )
+        self.batch = Batch.objects.create(schema=self.schema, metadata={})
+        self.samples = [
+            Sample.objects.create(
+                schema=self.schema,
+                batch=self.batch,
+                metadata={"status": "pending", "tags": ["a"], "well": i},
+            )
+            for i in range(4)
+        ]
+        Sample.objects.filter(pk=self.samples[0].pk).update(
+            metadata={"status": "discarded", "tags": [], "well": 0}
+        )
+
+    def patch(self, body, query=""):
+        return self.client.patch(f"/samples/bulk-patch/{query}", body, format="json")
+
+    def test_patch_filtered_objects(self):
+        response = self.patch(
+            {
+                "patch": [
+                    {"op": "replace", "path": "/status", "value": "discarded"},
+                    {"op": "add", "path": "/tags/-", "value": "b"},
+                    {"op": "remove", "path": "/well"},
+                ]
+            },
+            "?metadata__status=pending",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["patched"], 3)
+        sample = Sample.objects.get(pk=self.samples[1].pk)
+        self.assertEqual(sample.metadata, {"status": "discarded", "tags": ["a", "b"]})
+        self.assertGreater(sample.updated_at, self.samples[1].updated_at)
+        self.assertEqual(Sample.objects.get(pk=self.samples[0].pk).metadata["tags"], [])
+
+    def test_tests_select_and_invalid_rows_roll_back(self):
+        ids = [sample.pk for sample in self.samples]
+        response = self.patch(
+            {
+                "ids": ids,
+                "patch": [
+                    {"op": "test", "path": "/status", "value": "pending"},
+                    {"op": "add", "path": "/note", "value": None},
+                ],
+            }
+        )
+        self.assertEqual(response.json()["skipped"], 1)
+        self.assertEqual(response.json()["ids"], ids[1:])
+        self.assertIsNone(Sample.objects.get(pk=ids[1]).metadata["note"])
+
+        response = self.patch(
+            {"ids": ids, "patch": [{"op": "replace", "path": "/status", "value": "x"}]}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()["failed"]), 4)
+        self.assertFalse(Sample.objects.filter(metadata__status="x").exists())
+
+    def test_requires_a_selection_and_valid_operations(self):
+        change = {"op": "add", "path": "/note", "value": 1}
+        self.assertEqual(self.patch({"patch": [change]}).status_code, 400)
+        for query in ("?dry_run=true&page_size=1", "?format=json&fields=id&foo=1"):
+            self.assertEqual(self.patch({"patch": [change]}, query).status_code, 400)
+        self.assertFalse(Sample.objects.filter(metadata__has_key="note").exists())
+        response = self.patch({"patch": [change]}, "?schema__version=1&dry_run=1")
+        self.assertEqual(response.json()["patched"], 4)
+        for patch in (
+            [{"op": "test", "path": "/status", "value": "pending"}],
+            [change, {"op": "test", "path": "/status", "value": "pending"}],
+            [{"op": "move", "path": "/note", "from": "/status"}],
+            [{"op": "replace", "path": "status", "value": 1}],
+        ):
+            self.assertEqual(
+                self.patch({"ids": [self.samples[0].pk], "patch": patch}).status_code,
+                400,
+            )
+
+    def test_numeric_tokens_follow_the_container(self):
+        sample = self.samples[1]
+        Sample.objects.filter(pk=sample.pk).update(
+            metadata={"tags": ["a", "b"], "counts": {"1": 5}, "grid": [{"1": 0}]}
+        )
+        response = self.patch(
+            {
+                "ids": [sample.pk],
+                "patch": [
+                    {"op": "replace", "path": "/tags/1", "value": "c"},
+                    {"op": "replace", "path": "/counts/1", "value": 6},
+                    {"op": "add", "path": "/counts/2", "value": 7},
+                    {"op": "replace", "path": "/grid/0/1", "value": 8},
+                    {"op": "remove", "path": "/tags/0"},
+                ],
+            }
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            Sample.objects.get(pk=sample.pk).metadata,
+            {"tags": ["c"], "counts": {"1": 6, "2": 7}, "grid": [{"1": 8}]},
+        )
+
+    def test_missing_targets_fail(self):
+        ids = [self.samples[1].pk]
+        for operation, message in (
+            ({"op": "replace", "path": "/nope", "value": 1}, "Nothing to replace"),
+            ({"op": "remove", "path": "/tags/5"}, "Nothing to remove"),
+            ({"op": "add", "path": "/nope/x", "value": 1}, "parent of /nope/x"),
+            ({"op": "add", "path": "/well/x", "value": 1}, "parent of /well/x"),
+            ({"op": "add", "path": "/status/-", "value": 1}, "parent of /status"),
+        ):
+            with self.subTest(operation=operation):
+                response = self.patch({"ids": ids, "patch": [operation]})
+                self.assertEqual(response.status_code, 400)
+                (error,) = response.json()["failed"][0]["errors"]
+                self.assertTrue(error.startswith("Operation 0: "), error)
+                self.assertIn(message, error)
+        self.assertEqual(
+            Sample.objects.get(pk=ids[0]).metadata,
+            {"status": "pending", "tags": ["a"], "well": 1},
+        )
+
+    def test_later_operations_see_earlier_changes(self):
+        response = self.patch(
+            {
+                "ids": [self.samples[1].pk],
+                "patch": [
+                    {"op": "add", "path": "/plate", "value": {}},
+                    {"op": "add", "path": "/plate/row", "value": "B"},
+                    {"op": "remove", "path": "/tags"},
+                    {"op": "add", "path": "/tags/-", "value": "x"},
+                ],
+            }
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["failed"][0]["errors"],
+            ["Operation 3: The parent of /tags/- is missing or cannot hold it."],
+        )
+
+    def test_unsupported_operations(self):
+        response = self.patch(
+            {
+                "ids": [self.samples[1].pk],
+                "patch": [{"op": "add", "path": "/tags/0", "value": "z"}],
+            }
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("index /tags/0", response.json()["failed"][0]["errors"][0])
+        self.assertEqual(
+            Sample.objects.get(pk=self.samples[1].pk).metadata["tags"], ["a"]
+        )
+        for op in ("move", "copy"):
+            response = self.patch(
+                {
+                    "ids": [self.samples[1].pk],
+                    "patch": [{"op": op, "path": "/x", "from": "/well"}],
+                }
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("not supported", str(response.json()["patch"]))
+
+    def test_entity_barcodes_follow_the_prefix(self):
+        entity = Entity.objects.create(schema=self.schema, metadata={"prefix": "AB"})
+        response = self.client.patch(
+            "/entities/bulk-patch/",
+            {
+                "ids": [entity.pk],
+                "patch": [{"op": "replace", "path": "/prefix", "value": "CD"}],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        entity.refresh_from_db()
+        self.assertEqual(entity.barcode, f"CD{entity.pk}")
+
+
+class SearchTests(APITestCase):
+    """The search index follows writes and returns ranked, faceted hits."""
+
+    def setUp(self):
+        self.cell_line = MetaSchema.objects.create(
+            title="Cell line",
+            type=MetaSchema.SchemaType.ENTITY,
+            version=1,
+            definition={},
+        )
+        self.well = MetaSchema.objects.create(
+            title="Well", type=MetaSchema.SchemaType.SAMPLE, version=1, definition={}
+        )
+        self.entity = Entity.objects.create(
+            schema=self.cell_line,
+            metadata={"prefix": "CL", "name": "CHO-K1 clone 7", "owner": "Müller"},
+        )
+        batch = Batch.objects.create(schema=self.well, metadata={})
+        self.sample = Sample.objects.create(
+            schema=self.well,
+            batch=batch,
+            metadata={"notes": ["clone 7 looks contaminated"], "od": 1.5},
+        )
+
+    def search(self, query):
+        response = self.client.get(f"/search/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranked_hits_and_facets(self):
+        data = self.search("q=clone")
+        self.assertEqual(
+            {(hit["model"], hit["id"]) for hit in data["results"]},
+            {("entity", self.entity.pk), ("sample", self.sample.pk)},
+        )
+        self.assertEqual(data["facets"]["model"], {"entity": 1, "sample": 1})
+        self.assertIn("[clone]", data["results"][0]["snippet"])
+
+        hit = self.search("q=mull")["results"][0]
+        self.assertEqual(hit["barcode"], f"CL{self.entity.pk}")
+        self.assertEqual(hit["schema"]["title"], "Cell line")
+        self.assertEqual(
+            [h["model"] for h in self.search("q=clone&models=sample")["results"]],
+            ["sample"],
+        )
+        self.assertEqual(
+            [
+                h["model"]
+                for h in self.search("q=clone&schema__title=Cell+line")["results"]
+            ],
+            ["entity"],
+        )
+        self.assertEqual(self.client.get("/search/").status_code, 400)
+        self.assertEqual(self.search('q="*')["results"], [])
+
+    def test_index_follows_writes(self):
+        self.entity.metadata = {"prefix": "CL", "name": "HEK293"}
+        self.entity.save()
+        self.sample.delete()
+        self.assertEqual(self.search("q=clone")["results"], [])
+        self.assertEqual(len(self.search("q=hek293")["results"]), 1)
+
+        call_command("rebuild_search_index", stdout=io.StringIO())
+        self.assertEqual(len(self.search("q=hek293")["results"]), 1)
+
+
+class BinaryArrayTests(APITestCase):
+    """Arrays are stored as .npy files and served in slices."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        schema = MetaSchema.objects.create(
+            title="HPLC", type=MetaSchema.SchemaType.ANALYSIS, version=1, definition={}
+        )
+        self.analysis = Analysis.objects.create(schema=schema, metadata={})
+        batch = Batch.objects.create(schema=schema, metadata={})
+        sample = Sample.objects.create(schema=schema, batch=batch, metadata={})
+        self.result = Result.objects.create(
+            schema=schema, analysis=self.analysis, sample=sample, data={}
+        )
+
+    def data(self, pk, query=""):
+        response = self.client.get(f"/arrays/{pk}/data/{query}")
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_json_values_and_slices(self):
+        response = self.client.post(
+            "/arrays/",
+            {
+                "analysis": self.analysis.pk,
+                "name": "trace",
+                "values": [i / 2 for i in range(1000)],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        created = response.json()
+        self.assertEqual(
+            (created["dtype"], created["shape"], created["nbytes"]),
+            ("<f8", [1000], 8000),
+        )
+
+        with override_settings(ARRAY_STREAM_CHUNK_SIZE=20):
+            values = json.loads(self.data(created["id"], "?start=10&stop=20"))
+        self.assertEqual(values["values"], [i / 2 for i in range(10, 20)])
+        self.assertEqual(values["shape"], [10])
+        values = json.loads(self.data(created["id"], "?start=-3"))["values"]
+        self.assertEqual(values, [498.5, 499.0, 499.5])
+        values = json.loads(self.data(created["id"], "?step=300"))["values"]
+        self.assertEqual(values, [0.0, 150.0, 300.0, 450.0])
+        self.assertEqual(
+            self.client.get(f"/arrays/{created['id']}/data/?step=0").status_code, 400
+        )
+
+        duplicate = {"analysis": self.analysis.pk, "name": "trace", "values": [1]}
+        self.assertEqual(
+            self.client.post("/arrays/", duplicate, format="json").status_code, 400
+        )
+
+    def test_npy_upload_and_download(self):
+        channels = array("i", [i for row in range(50) for i in (row, -row)])
+        content = npy_header("<i4", [50, 2]) + channels.tobytes()
+        response = self.client.post(
+            "/arrays/",
+            {
+                "result": self.result.pk,
+                "name": "channels",
+                "file": SimpleUploadedFile("channels.npy", content),
+            },
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 201)
+        pk = response.json()["id"]
+        self.assertEqual(response.json()["shape"], [50, 2])
+
+        body = self.data(pk, "?start=1&stop=50&step=24&format=npy")
+        dtype, shape, offset = read_header(io.BytesIO(body))
+        self.assertEqual((dtype, shape), ("<i4", [3, 2]))
+        self.assertEqual(list(array("i", body[offset:])), [1, -1, 25, -25, 49, -49])
+        self.assertEqual(json.loads(self.data(pk, "?stop=2"))["values"], [0, 0, 1, -1])
+
+        truncated = SimpleUploadedFile("bad.npy", content[:-4])
+        response = self.client.post(
+            "/arrays/",
+            {"result": self.result.pk, "name": "bad", "file": truncated},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 400)
+
+        path = BinaryArray.objects.get(pk=pk).file.path
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f"/arrays/{pk}/").status_code, 204)
+        self.assertFalse(os.path.exists(path))
@@ -1,24 +1,42 @@
 """URLs for the core app."""
 
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
 from .views import (
     AnalysisViewSet,
+    BarcodeViewSet,
     BatchViewSet,
+    BinaryArrayViewSet,
+    ChangeViewSet,
     EntityViewSet,
+    ImportJobViewSet,
+    MaterialViewSet,
     MetaSchemaViewset,
     ProjectViewSet,
     ResultViewSet,
     SampleViewSet,
+    SchemaMigrationViewSet,
+    SearchViewSet,
+    metrics,
 )
 
 router = DefaultRouter()
 router.register(r"projects", ProjectViewSet, basename="project")
 router.register(r"metaschemas", MetaSchemaViewset, basename="metaschema")
 router.register(r"entities", EntityViewSet, basename="entity")
+router.register(r"materials", MaterialViewSet, basename="material")
 router.register(r"batches", BatchViewSet, basename="batch")
 router.register(r"samples", SampleViewSet, basename="sample")
 router.register(r"analyses", AnalysisViewSet, basename="analysis")
 router.register(r"results", ResultViewSet, basename="result")
+router.register(
+    r"schema-migrations", SchemaMigrationViewSet, basename="schemamigration"
+)
+router.register(r"barcodes", BarcodeViewSet, basename="barcode")
+router.register(r"changes", ChangeViewSet, basename="change")
+router.register(r"imports", ImportJobViewSet, basename="importjob")
+router.register(r"search", SearchViewSet, basename="search")
+router.register(r"arrays", BinaryArrayViewSet, basename="binaryarray")
 
-urlpatterns = router.urls
+urlpatterns = router.urls + [path("metrics", metrics, name="metrics")]
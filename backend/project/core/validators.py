@@ -0,0 +1,97 @@
+"""Compiled jsonschema validators cached per MetaSchema."""
+
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
+
+from .instrumentation import timed
+
+DEFAULT_CACHE_SIZE = 256
+
+
+class ValidatorRegistry:
+    """
+    Process-wide LRU cache of compiled jsonschema validators.
+
+    Validators are keyed on ``(MetaSchema.pk, version)``. The meta-schema check
+    runs once when a validator is compiled instead of on every validation.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._validators = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, schema):
+        """Return the compiled validator for a MetaSchema instance"""
+        key = (schema.pk, schema.version)
+        with self._lock:
+            validator = self._validators.get(key)
+            if validator is not None:
+                self._validators.move_to_end(key)
+                self.hits += 1
+                return validator
+            self.misses += 1
+
+        validator = compile_validator(schema.definition)
+
+        with self._lock:
+            self._validators[key] = validator
+            self._validators.move_to_end(key)
+            while len(self._validators) > self.maxsize:
+                self._validators.popitem(last=False)
+                self.evictions += 1
+        return validator
+
+    def evict(self, schema_pk):
+        """Drop every cached validator of a MetaSchema"""
+        with self._lock:
+            for key in [key for key in self._validators if key[0] == schema_pk]:
+                del self._validators[key]
+
+    def clear(self):
+        """Drop all cached validators and reset the counters"""
+        with self._lock:
+            self._validators.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Return cache counters"""
+        with self._lock:
+            return {
+                "size": len(self._validators),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def compile_validator(definition):
+    """Check a schema definition and build its Draft*Validator"""
+    cls = validator_for(definition)
+    cls.check_schema(definition)
+    return cls(definition)
+
+
+def validate_instance(schema, instance):
+    """
+    Validate an instance against a MetaSchema using the cached validator.
+
+    Mirrors ``jsonschema.validate`` and raises the best matching error.
+    """
+    with timed("validation"):
+        error = best_match(registry.get(schema).iter_errors(instance))
+    if error is not None:
+        raise error
+
+
+registry = ValidatorRegistry(
+    maxsize=getattr(settings, "SCHEMA_VALIDATOR_CACHE_SIZE", DEFAULT_CACHE_SIZE)
+)
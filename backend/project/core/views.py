@@ -1,45 +1,146 @@
 """Views for the core app."""
 
-from rest_framework import viewsets
+import tempfile
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.urls import NoReverseMatch
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
-
-from .models import Analysis, Batch, Entity, MetaSchema, Project, Result, Sample
+from rest_framework.reverse import reverse
+
+from .aggregation import AGGREGATES, DEFAULT_AGGREGATES, GROUP_BY, aggregate_json_path
+from .arrays import row_range, stream_json, stream_npy
+from .barcodes import resolve_barcodes
+from .changes import FEED_MODELS, read_changes
+from .columnar import write_snapshot
+from .export import export_columns, iter_result_rows, stream_csv, stream_ndjson
+from .indexes import split_path
+from .instrumentation import metrics as request_metrics
+from .mixins import (
+    BulkCreateMixin,
+    BulkPatchMixin,
+    BulkProjectsMixin,
+    ConditionalGetMixin,
+    FastListMixin,
+    LineageMixin,
+    SparseQuerysetMixin,
+    get_int,
+    get_positive_int,
+)
+from .models import (
+    Analysis,
+    Batch,
+    BinaryArray,
+    Entity,
+    ImportJob,
+    Material,
+    MetaSchema,
+    Project,
+    Result,
+    Sample,
+    SchemaMigration,
+)
+from .pagination import IdCursorPagination
+from .renderers import (
+    ArrowRenderer,
+    CSVRenderer,
+    NDJSONRenderer,
+    NPYRenderer,
+    ORJSONRenderer,
+    ParquetRenderer,
+)
+from .schema_migration import queue_resume
+from .search import SEARCH_MODELS, search
 from .serializers import (
     AnalysisSerializer,
     BatchSerializer,
+    BinaryArraySerializer,
     EntitySerializer,
+    ImportJobSerializer,
+    MaterialSerializer,
     MetaSchemaSerializer,
     ProjectSerializer,
     ResultSerializer,
     SampleSerializer,
+    SchemaMigrationSerializer,
 )
+from .summaries import SUMMARY_LAST_MODIFIED
+from .validators import registry
 
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ProjectViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing projects.
     """
 
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
+    pagination_class = IdCursorPagination
 
 
-class MetaSchemaViewset(viewsets.ModelViewSet):
+class MetaSchemaViewset(SparseQuerysetMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing metadata schemas.
+
+    Indexes for `indexed_paths` are built by the `sync_json_indexes`
+    management command, never while saving a schema.
     """
 
     queryset = MetaSchema.objects.all()
     serializer_class = MetaSchemaSerializer
+    pagination_class = IdCursorPagination
 
+    @action(detail=False, methods=["get"], url_path="validator-cache")
+    def validator_cache(self, request):
+        """
+        Return hit/miss counters of the compiled validator cache.
+        """
+        return Response(registry.stats())
 
-class EntityViewSet(viewsets.ModelViewSet):
+    @action(
+        detail=True, methods=["get"], renderer_classes=[ParquetRenderer, ArrowRenderer]
+    )
+    def snapshot(self, request, pk=None):
+        """
+        Download all rows of this schema as typed columns in a Parquet file,
+        or an Arrow IPC file with `?format=arrow`.
+        """
+        metaschema = self.get_object()
+        file_format = request.accepted_renderer.format
+
+        sink = tempfile.TemporaryFile()
+        write_snapshot(metaschema, sink, file_format=file_format)
+        sink.seek(0)
+
+        return FileResponse(
+            sink,
+            as_attachment=True,
+            filename=f"metaschema-{metaschema.pk}-v{metaschema.version}.{file_format}",
+            content_type=request.accepted_renderer.media_type,
+        )
+
+
+class EntityViewSet(
+    BulkPatchMixin,
+    BulkProjectsMixin,
+    ConditionalGetMixin,
+    FastListMixin,
+    LineageMixin,
+    SparseQuerysetMixin,
+    viewsets.ModelViewSet,
+):
     """
     A viewset for viewing and editing entities.
     """
 
-    queryset = Entity.objects.select_related("schema")
+    queryset = Entity.objects.select_related("schema").prefetch_related(
+        Prefetch("projects", queryset=Project.objects.only("id").order_by("id"))
+    )
     serializer_class = EntitySerializer
 
     def get_queryset(self):
@@ -59,13 +160,56 @@ class EntityViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class BatchViewSet(viewsets.ModelViewSet):
+class MaterialViewSet(
+    BulkCreateMixin,
+    BulkPatchMixin,
+    BulkProjectsMixin,
+    ConditionalGetMixin,
+    FastListMixin,
+    SparseQuerysetMixin,
+    viewsets.ModelViewSet,
+):
+    """
+    A viewset for viewing and editing materials.
+    """
+
+    queryset = Material.objects.select_related("schema").prefetch_related(
+        Prefetch("projects", queryset=Project.objects.only("id").order_by("id"))
+    )
+    serializer_class = MaterialSerializer
+
+    def get_queryset(self):
+        """
+        Optionally restricts the returned materials to an entity, by filtering
+        against the `entity` query parameter in the URL.
+        """
+        queryset = super().get_queryset()
+        entity = self.request.query_params.get("entity")
+
+        if entity:
+            queryset = queryset.filter(entity=entity)
+
+        return queryset
+
+
+class BatchViewSet(
+    BulkPatchMixin,
+    ConditionalGetMixin,
+    FastListMixin,
+    LineageMixin,
+    SparseQuerysetMixin,
+    viewsets.ModelViewSet,
+):
     """
     A viewset for viewing and editing batches.
     """
 
-    queryset = Batch.objects.select_related("schema")
+    queryset = Batch.objects.select_related("schema", "summary").prefetch_related(
+        Prefetch("projects", queryset=Project.objects.only("id").order_by("id")),
+        Prefetch("preparations", queryset=Entity.objects.only("id").order_by("id")),
+    )
     serializer_class = BatchSerializer
+    last_modified = SUMMARY_LAST_MODIFIED
 
     def get_queryset(self):
         """
@@ -84,7 +228,15 @@ class BatchViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class SampleViewSet(viewsets.ModelViewSet):
+class SampleViewSet(
+    BulkCreateMixin,
+    BulkPatchMixin,
+    ConditionalGetMixin,
+    FastListMixin,
+    LineageMixin,
+    SparseQuerysetMixin,
+    viewsets.ModelViewSet,
+):
     """
     A viewset for viewing and editing samples.
     """
@@ -114,25 +266,34 @@ class SampleViewSet(viewsets.ModelViewSet):
         Return all results associated with a sample.
         """
         sample = self.get_object()
-        results = sample.results.all()
+        results = self.paginate_queryset(sample.results.all())
         serializer = ResultSerializer(results, many=True)
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
 
-class AnalysisViewSet(viewsets.ModelViewSet):
+class AnalysisViewSet(
+    BulkPatchMixin,
+    ConditionalGetMixin,
+    FastListMixin,
+    SparseQuerysetMixin,
+    viewsets.ModelViewSet,
+):
     """
     A viewset for viewing and editing analyses.
     """
 
-    queryset = Analysis.objects.select_related("schema")
+    queryset = Analysis.objects.select_related("schema", "summary").prefetch_related(
+        Prefetch("projects", queryset=Project.objects.only("id").order_by("id"))
+    )
     serializer_class = AnalysisSerializer
+    last_modified = SUMMARY_LAST_MODIFIED
 
     def get_queryset(self):
         """
         Optionally restricts the returned analyses to a given schema type or version,
         by filtering against `schema__type` and `schema__version` query parameters in the URL.
         """
-        queryset = self.queryset
+        queryset = super().get_queryset()
         schema_type = self.request.query_params.get("schema__type")
         schema_version = self.request.query_params.get("schema__version")
 
@@ -144,20 +305,28 @@ class AnalysisViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class ResultViewSet(viewsets.ModelViewSet):
+class ResultViewSet(
+    BulkCreateMixin,
+    BulkPatchMixin,
+    ConditionalGetMixin,
+    FastListMixin,
+    SparseQuerysetMixin,
+    viewsets.ModelViewSet,
+):
     """
     A viewset for viewing and editing results associated with samples.
     """
 
     queryset = Result.objects.select_related("schema")
     serializer_class = ResultSerializer
+    patch_field = "data"
 
     def get_queryset(self):
         """
         Optionally restricts the returned results to a given schema type or version,
         by filtering against `schema__type` and `schema__version` query parameters in the URL.
         """
-        queryset = self.queryset
+        queryset = super().get_queryset()
         schema_type = self.request.query_params.get("schema__type")
         schema_version = self.request.query_params.get("schema__version")
 
@@ -167,3 +336,364 @@ class ResultViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(schema__version=schema_version)
 
         return queryset
+
+    @action(
+        detail=False, methods=["get"], renderer_classes=[NDJSONRenderer, CSVRenderer]
+    )
+    def export(self, request):
+        """
+        Stream all matching results as NDJSON or CSV (`?format=csv`), one flat
+        row per result with sample, batch, analysis and schema fields joined in.
+        """
+        rows = iter_result_rows(self.filter_queryset(self.get_queryset()))
+        if request.accepted_renderer.format == "csv":
+            content = stream_csv(rows, export_columns())
+        else:
+            content = stream_ndjson(rows)
+
+        response = StreamingHttpResponse(
+            content, content_type=request.accepted_renderer.media_type
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="results.{request.accepted_renderer.format}"'
+        )
+        return response
+
+    @action(detail=False, methods=["get"])
+    def aggregate(self, request):
+        """
+        Aggregate a numeric path of `data` in the database, optionally per group.
+
+        Query parameters: `path` (e.g. `culture__od`), `group_by` (comma
+        separated, from analysis, sample, sample__batch, sample__batch__projects
+        and schema) and `aggregates` (comma separated, from count, sum, avg,
+        min, max and stddev). Values that are not numbers are ignored.
+        """
+        params = request.query_params
+        keys = split_path(params.get("path", ""))
+        if not keys:
+            raise ValidationError({"path": "A JSON path into data is required."})
+
+        group_by = [name for name in params.get("group_by", "").split(",") if name]
+        unknown = [name for name in group_by if name not in GROUP_BY]
+        if unknown:
+            raise ValidationError({"group_by": f"Expected some of {GROUP_BY}."})
+
+        aggregates = [
+            name for name in params.get("aggregates", "").split(",") if name
+        ] or list(DEFAULT_AGGREGATES)
+        unknown = [name for name in aggregates if name not in AGGREGATES]
+        if unknown:
+            raise ValidationError(
+                {"aggregates": f"Expected some of {tuple(AGGREGATES)}."}
+            )
+
+        max_groups = getattr(settings, "AGGREGATE_MAX_GROUPS", 10000)
+        groups = aggregate_json_path(
+            self.filter_queryset(self.get_queryset()),
+            "data",
+            keys,
+            group_by=list(dict.fromkeys(group_by)),
+            aggregates=list(dict.fromkeys(aggregates)),
+            limit=max_groups + 1,
+        )
+        return Response(
+            {
+                "path": "__".join(keys),
+                "group_by": group_by,
+                "truncated": len(groups) > max_groups,
+                "results": groups[:max_groups],
+            }
+        )
+
+
+class BarcodeViewSet(viewsets.ViewSet):
+    """
+    A viewset resolving scanned barcodes to the objects carrying them.
+    """
+
+    lookup_value_regex = "[^/]+"
+
+    def _describe(self, request, code, matches):
+        for match in matches:
+            try:
+                match["url"] = reverse(
+                    f"{match['type']}-detail", args=[match["id"]], request=request
+                )
+            except NoReverseMatch:
+                pass
+        return {"barcode": code, "objects": matches}
+
+    def retrieve(self, request, pk=None):
+        """
+        Resolve a single barcode.
+        """
+        matches = resolve_barcodes([pk])[pk]
+        if not matches:
+            raise NotFound(f"No object with barcode {pk}.")
+        return Response(self._describe(request, pk, matches))
+
+    @action(detail=False, methods=["post"])
+    def resolve(self, request):
+        """
+        Resolve a list of barcodes posted as `{"barcodes": [...]}`.
+        """
+        codes = request.data.get("barcodes") if isinstance(request.data, dict) else None
+        if not isinstance(codes, list) or not all(isinstance(c, str) for c in codes):
+            raise ValidationError({"barcodes": "Expected a list of barcodes."})
+        max_codes = getattr(settings, "BARCODE_RESOLVE_MAX", 1000)
+        if len(codes) > max_codes:
+            raise ValidationError({"barcodes": f"At most {max_codes} per request."})
+
+        matches = resolve_barcodes(codes)
+        return Response(
+            {
+                "results": [
+                    self._describe(request, code, matches[code])
+                    for code in dict.fromkeys(codes)
+                    if matches[code]
+                ],
+                "unresolved": [
+                    code for code in dict.fromkeys(codes) if not matches[code]
+                ],
+            }
+        )
+
+
+class SchemaMigrationViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    SparseQuerysetMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    A viewset for queueing and inspecting schema migrations.
+
+    Created runs are queued; the `migrate_schema` management command runs
+    them in a separate worker process. Retrieve a run for its progress and
+    the errors of rows that failed.
+    """
+
+    queryset = SchemaMigration.objects.all()
+    serializer_class = SchemaMigrationSerializer
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    @action(detail=True, methods=["post"])
+    def resume(self, request, pk=None):
+        """
+        Queue a failed run again; it continues from its checkpoint.
+        """
+        run = self.get_object()
+        if not queue_resume(run):
+            raise ValidationError("Only failed runs can be resumed.")
+        return Response(self.get_serializer(run).data)
+
+
+class BinaryArrayViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    SparseQuerysetMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    A viewset for numeric arrays (traces, curves) of analyses and results.
+
+    Arrays are stored as .npy files; `data` streams slices of them. Filter
+    the list with `?analysis=`, `?result=` and `?name=`.
+    """
+
+    queryset = BinaryArray.objects.all()
+    serializer_class = BinaryArraySerializer
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for name in ("analysis", "result", "name"):
+            value = self.request.query_params.get(name)
+            if value:
+                try:
+                    queryset = queryset.filter(**{name: value})
+                except ValueError as e:
+                    raise ValidationError({name: str(e)}) from e
+        return queryset
+
+    @action(
+        detail=True, methods=["get"], renderer_classes=[ORJSONRenderer, NPYRenderer]
+    )
+    def data(self, request, pk=None):
+        """
+        Stream rows `?start=`/`?stop=`/`?step=` (first axis, Python slice
+        semantics) as JSON, or as a .npy file with `?format=npy`.
+        """
+        stored = self.get_object()
+        rows = row_range(
+            stored.shape,
+            get_int(request, "start"),
+            get_int(request, "stop"),
+            get_positive_int(request, "step", None),
+        )
+
+        if request.accepted_renderer.format == "npy":
+            content = stream_npy(stored, rows)
+        else:
+            content = stream_json(stored, rows)
+        response = StreamingHttpResponse(
+            content, content_type=request.accepted_renderer.media_type
+        )
+        if request.accepted_renderer.format == "npy":
+            response["Content-Disposition"] = (
+                f'attachment; filename="{stored.name}.npy"'
+            )
+        return response
+
+
+class ImportJobViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    SparseQuerysetMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    A viewset for uploading instrument files and following their import.
+
+    Uploads are stored and queued; the `process_imports` management command
+    imports them in a separate worker process. Retrieve a job for its
+    progress and the errors of rejected rows.
+    """
+
+    queryset = ImportJob.objects.all()
+    serializer_class = ImportJobSerializer
+    parser_classes = [MultiPartParser, FormParser]
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    @action(detail=True, methods=["post"])
+    def retry(self, request, pk=None):
+        """
+        Queue a failed job again; it continues from its checkpoint.
+        """
+        job = self.get_object()
+        if job.status != ImportJob.Status.FAILED:
+            raise ValidationError("Only failed jobs can be retried.")
+        job.status = ImportJob.Status.PENDING
+        job.message = ""
+        job.finished_at = None
+        job.save(update_fields=["status", "message", "finished_at", "updated_at"])
+        return Response(self.get_serializer(job).data)
+
+
+def metrics(request):
+    """
+    Per-endpoint request histograms in the Prometheus text format.
+    """
+    return HttpResponse(
+        request_metrics.render(), content_type="text/plain; version=0.0.4"
+    )
+
+
+class ChangeViewSet(viewsets.ViewSet):
+    """
+    A viewset listing what changed since a cursor, for incremental sync.
+    """
+
+    def list(self, request):
+        """
+        Return upserts and deletes after `?since=<cursor>` in commit order.
+
+        Pass the returned cursor as `since` to continue; `models` limits the
+        feed to a comma separated list of model names and `page_size` sets
+        the number of changes read.
+        """
+        since = request.query_params.get("since", "0")
+        if not since.isdigit():
+            raise ValidationError({"since": "Expected a cursor returned by this feed."})
+        models = [m for m in request.query_params.get("models", "").split(",") if m]
+        unknown = [m for m in models if m not in FEED_MODELS]
+        if unknown:
+            raise ValidationError({"models": f"Unknown models: {', '.join(unknown)}."})
+        limit = min(
+            get_positive_int(
+                request, "page_size", settings.REST_FRAMEWORK.get("PAGE_SIZE", 100)
+            ),
+            getattr(settings, "MAX_PAGE_SIZE", 1000),
+        )
+
+        results, cursor, has_more = read_changes(int(since), limit, models)
+        query = request.query_params.copy()
+        query["since"] = cursor
+        return Response(
+            {
+                "cursor": cursor,
+                "has_more": has_more,
+                "next": request.build_absolute_uri(
+                    f"{request.path}?{query.urlencode()}"
+                ),
+                "results": results,
+            }
+        )
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """
+    A viewset for free-text search over metadata and result data.
+    """
+
+    def list(self, request):
+        """
+        Return the objects best matching `?q=`, ranked, with facet counts.
+
+        `models` limits the search to a comma separated list of model names;
+        `schema`, `schema__title` and `schema__type` to matching MetaSchemas.
+        `limit` sets the number of hits.
+        """
+        params = request.query_params
+        query = params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": "This parameter is required."})
+        models = [m for m in params.get("models", "").split(",") if m] or None
+        unknown = [m for m in models or [] if m not in SEARCH_MODELS]
+        if unknown:
+            raise ValidationError({"models": f"Unknown models: {', '.join(unknown)}."})
+
+        schemas = None
+        schema_filters = {
+            lookup: params[name]
+            for name, lookup in (
+                ("schema", "pk"),
+                ("schema__title", "title"),
+                ("schema__type", "type"),
+            )
+            if params.get(name)
+        }
+        if schema_filters:
+            try:
+                schemas = list(
+                    MetaSchema.objects.filter(**schema_filters).values_list(
+                        "pk", flat=True
+                    )
+                )
+            except ValueError as e:
+                raise ValidationError(str(e)) from e
+        limit = min(
+            get_positive_int(request, "limit", 20),
+            getattr(settings, "SEARCH_MAX_RESULTS", 200),
+        )
+
+        hits, facets = search(query, limit, models=models, schemas=schemas)
+        for hit in hits:
+            hit["url"] = reverse(
+                f"{hit['model']}-detail", args=[hit["id"]], request=request
+            )
+        return Response({"query": query, "results": hits, "facets": facets})